@@ -1,7 +1,10 @@
 from app.database.models import Base  # wherever you declared Base = declarative_base()
 from app.database.database import engine  # your async engine
+from app.database.migrations import run_migrations
 
 async def init_db():
     async with engine.begin() as conn:
         # run the schema creation
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        # bring existing tables up to date
+        await run_migrations(conn)
@@ -0,0 +1,128 @@
+"""
+Idempotent migrations run at startup, after Base.metadata.create_all.
+
+create_all only creates missing tables, so new columns on existing tables
+are added here, followed by any data backfills.
+"""
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.database.models import Base, GameStateModel, PlayerModel, TableModel
+from app.models import Card
+from app.utils.card_codec import encode_cards
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def _add_missing_columns(sync_conn):
+    """Add model columns that are missing from existing tables"""
+    inspector = inspect(sync_conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                ddl += f" DEFAULT {getattr(default, 'text', default)}"
+            print(f"MIGRATION: Adding column {table.name}.{column.name}")
+            sync_conn.execute(text(ddl))
+
+
+def _encode_legacy_cards(cards_json) -> bytes:
+    return encode_cards(Card(**card) for card in cards_json or [])
+
+
+async def backfill_card_codes(conn: AsyncConnection):
+    """Convert legacy JSON hands and piles to the binary card encoding"""
+    players = PlayerModel.__table__
+    while True:
+        result = await conn.execute(
+            select(players.c.id, players.c.hand)
+            .where(players.c.hand_codes.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        await conn.execute(
+            update(players)
+            .where(players.c.id == bindparam("row_id"))
+            .values(hand=None, hand_codes=bindparam("row_hand_codes")),
+            [{"row_id": row.id, "row_hand_codes": _encode_legacy_cards(row.hand)} for row in rows]
+        )
+        print(f"MIGRATION: Encoded {len(rows)} player hands")
+
+    game_states = GameStateModel.__table__
+    while True:
+        result = await conn.execute(
+            select(game_states.c.table_id, game_states.c.draw_pile, game_states.c.discard_pile)
+            .where(game_states.c.draw_pile_codes.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        )
+        rows = result.all()
+        if not rows:
+            break
+        await conn.execute(
+            update(game_states)
+            .where(game_states.c.table_id == bindparam("row_table_id"))
+            .values(
+                draw_pile=None,
+                discard_pile=None,
+                draw_pile_codes=bindparam("row_draw_pile_codes"),
+                discard_pile_codes=bindparam("row_discard_pile_codes")
+            ),
+            [{
+                "row_table_id": row.table_id,
+                "row_draw_pile_codes": _encode_legacy_cards(row.draw_pile),
+                "row_discard_pile_codes": _encode_legacy_cards(row.discard_pile)
+            } for row in rows]
+        )
+        print(f"MIGRATION: Encoded {len(rows)} game state piles")
+
+
+async def backfill_joined_at(conn: AsyncConnection):
+    """
+    Give players from before joined_at a seat order. Their games were seated
+    by player id, so that order is kept (turn indexes stay valid), spaced a
+    millisecond apart from the table's creation.
+    """
+    players = PlayerModel.__table__
+    tables = TableModel.__table__
+    result = await conn.execute(
+        select(players.c.id, players.c.table_id, tables.c.created_at)
+        .join(tables, tables.c.id == players.c.table_id)
+        .where(players.c.joined_at.is_(None))
+        .order_by(players.c.table_id, players.c.id)
+    )
+    rows = result.all()
+    if not rows:
+        return
+
+    seats = {}
+    values = []
+    for row in rows:
+        seat = seats[row.table_id] = seats.get(row.table_id, -1) + 1
+        values.append({"row_id": row.id, "row_joined_at": (row.created_at or 0) + seat / 1000})
+    for start in range(0, len(values), BACKFILL_BATCH_SIZE):
+        await conn.execute(
+            update(players)
+            .where(players.c.id == bindparam("row_id"))
+            .values(joined_at=bindparam("row_joined_at")),
+            values[start:start + BACKFILL_BATCH_SIZE]
+        )
+    print(f"MIGRATION: Seated {len(values)} players by join order")
+
+
+async def run_migrations(conn: AsyncConnection):
+    await conn.run_sync(_add_missing_columns)
+    await backfill_card_codes(conn)
+    await backfill_joined_at(conn)
@@ -1,5 +1,5 @@
 from time import time
-from sqlalchemy import Column, Integer, String, Boolean, JSON, Enum, ForeignKey
+from sqlalchemy import Column, Integer, Float, String, Boolean, JSON, Enum, ForeignKey, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -66,7 +66,10 @@ class TableModel(Base):
     created_at = Column(Integer, nullable=False)
     creator_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True) # <-- ADD THIS
 
-    players = relationship("PlayerModel", back_populates="table")
+    # Seating order (and so turn order) is join order, stable across loads
+    players = relationship(
+        "PlayerModel", back_populates="table", order_by="[PlayerModel.joined_at, PlayerModel.id]"
+    )
     game_state = relationship("GameStateModel", uselist=False, back_populates="table")
 
 class PlayerModel(Base):
@@ -75,10 +78,12 @@ class PlayerModel(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)  # Link to user
     table_id = Column(UUID(as_uuid=True), ForeignKey("tables.id"))
-    hand = Column(JSON, default=[])  
+    hand = Column(JSON, default=[])  # Legacy card dicts, see hand_codes
+    hand_codes = Column(LargeBinary, nullable=True)  # One byte per card (app.utils.card_codec)
     is_online = Column(Boolean, default=True)
     uno_declaration = Column(Enum(UnoDeclarationState), default=UnoDeclarationState.NOT_REQUIRED)
     role = Column(Enum(PlayerRole), default=PlayerRole.PLAYER)
+    joined_at = Column(Float, default=lambda: time())  # Seating order at the table
     
     table = relationship("TableModel", back_populates="players")
     user = relationship("UserModel", back_populates="players")  # Add relationship
@@ -88,16 +93,34 @@ class GameStateModel(Base):
     __tablename__ = "game_states"
     
     table_id = Column(UUID(as_uuid=True), ForeignKey("tables.id"), primary_key=True)
-    draw_pile = Column(JSON, default=[])
+    draw_pile = Column(JSON, default=[])  # Legacy card dicts, see *_codes
     discard_pile = Column(JSON, default=[])
+    draw_pile_codes = Column(LargeBinary, nullable=True)  # One byte per card (app.utils.card_codec)
+    discard_pile_codes = Column(LargeBinary, nullable=True)
     current_player_index = Column(Integer, default=0)
     direction = Column(Enum(GameDirection), default=GameDirection.CLOCKWISE)
     status = Column(Enum(GameStatus), default=GameStatus.WAITING)
     winner = Column(UUID(as_uuid=True), nullable=True)
     last_action = Column(JSON, nullable=True)
+    # This row (with the table's player rows) is a snapshot of the game as of
+    # this event; newer game_events are applied on top when loading
+    event_seq = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped by every snapshot write, used for optimistic concurrency control
+    version = Column(Integer, nullable=False, default=0, server_default="0")
     
     table = relationship("TableModel", back_populates="game_state")
 
+class GameEventModel(Base):
+    """Append-only log of game actions, one row per action"""
+    __tablename__ = "game_events"
+
+    table_id = Column(UUID(as_uuid=True), ForeignKey("tables.id"), primary_key=True)
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    type = Column(String, nullable=False)
+    player_id = Column(UUID(as_uuid=True), nullable=True)
+    payload = Column(JSON, nullable=False)  # Changes made by the action, see app.game_logic.game_events
+    created_at = Column(Integer, nullable=False)
+
 class SessionModel(Base):
     __tablename__ = "sessions"
     
@@ -0,0 +1,93 @@
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+
+_SESSION_KEY = "unit_of_work"
+
+
+class ConcurrentUpdateError(Exception):
+    """Another transaction changed the same rows first; the work can be retried"""
+
+
+class UnitOfWork:
+    """
+    Runs one logical action in one transaction.
+
+    While a unit of work is active on a session, repositories flush instead
+    of committing (see commit_or_flush) and everything is committed once on
+    exit, or rolled back if the block raises. Callbacks registered with
+    after_commit, such as websocket broadcasts, run only after a successful
+    commit. A unit of work opened inside another one joins the outer one.
+
+    A deferred unit of work runs in a savepoint and leaves the commit to
+    whoever owns the session (write-behind, see app.game_logic.table_actor):
+    on success the savepoint is released and the callbacks run right away,
+    on failure only this unit's changes are rolled back.
+    """
+
+    def __init__(self, db: AsyncSession, deferred: bool = False):
+        self.db = db
+        self.deferred = deferred
+        self._outer: Optional["UnitOfWork"] = None
+        self._savepoint = None
+        self._after_commit: List[Tuple[Callable[..., Awaitable[Any]], tuple, dict]] = []
+
+    @staticmethod
+    def active(db: AsyncSession) -> bool:
+        """True if a unit of work owns the session's transaction"""
+        return _SESSION_KEY in db.info
+
+    @property
+    def nested(self) -> bool:
+        """True if this unit joined an outer one and does not own the transaction"""
+        return self._outer is not None
+
+    def after_commit(self, func: Callable[..., Awaitable[Any]], *args, **kwargs):
+        """Schedule `await func(*args, **kwargs)` for after the commit"""
+        if self._outer:
+            self._outer.after_commit(func, *args, **kwargs)
+        else:
+            self._after_commit.append((func, args, kwargs))
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self._outer = self.db.info.get(_SESSION_KEY)
+        if not self._outer:
+            self.db.info[_SESSION_KEY] = self
+            if self.deferred:
+                self._savepoint = await self.db.begin_nested()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._outer:
+            return False
+
+        del self.db.info[_SESSION_KEY]
+        if exc_type:
+            await (self._savepoint.rollback() if self._savepoint else self.db.rollback())
+            return False
+
+        try:
+            if self._savepoint:
+                await self._savepoint.commit()
+            else:
+                await self.db.commit()
+        except Exception:
+            # Leave the session usable; nothing was committed, so nothing is sent
+            self._after_commit = []
+            await (self._savepoint.rollback() if self._savepoint else self.db.rollback())
+            raise
+
+        callbacks, self._after_commit = self._after_commit, []
+        for func, args, kwargs in callbacks:
+            try:
+                await func(*args, **kwargs)
+            except Exception as e:
+                print(f"UNIT OF WORK: after-commit callback {getattr(func, '__name__', func)} failed: {e}")
+        return False
+
+
+async def commit_or_flush(db: AsyncSession):
+    """Commit, unless a unit of work owns the transaction (then just flush)"""
+    if _SESSION_KEY in db.info:
+        await db.flush()
+    else:
+        await db.commit()
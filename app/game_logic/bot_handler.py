@@ -1,7 +1,7 @@
 import asyncio
 import random
 import traceback # <-- Add this import for detailed error logging
-from typing import Optional
+from typing import Any, Dict, Optional
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.game_logic.bot_player import BotPlayer
@@ -16,15 +16,12 @@ async def check_and_handle_bot_turn(table_id: str):
     """
     # Import locally to prevent circular dependency
     from app.game_logic.game_actions import GameActionHandler
+    from app.game_logic.table_actor import table_actors
 
     # --- WRAP THE ENTIRE LOGIC IN A TRY/EXCEPT BLOCK ---
     async with get_db_session_for_task() as db:
         try:
-            table_repo = TableRepository(db)
-            game_state_repo = GameStateRepository(db)
-
-            table = await table_repo.get_table(UUID(table_id))
-            game_state = await game_state_repo.get_game_state(UUID(table_id))
+            table, game_state = await table_actors.load(db, table_id)
 
             if not game_state or game_state.status != GameStatus.IN_PROGRESS:
                 print(f"BOT HANDLER: Aborting for table {table_id}. Game is not in progress.")
@@ -47,30 +44,10 @@ async def check_and_handle_bot_turn(table_id: str):
             
             await asyncio.sleep(random.uniform(1.5, 3.0))
 
-            bot_agent = BotPlayer(current_player, game_state, table)
-            decision = bot_agent.decide_action()
-            
-            action_type = decision.get("action")
-            print(f"BOT ACTION: Bot '{current_player.username}' decided to '{action_type}'.")
-
-            if action_type == "play_card":
-                await GameActionHandler.handle_play_card(
-                    table_id,
-                    current_player,
-                    decision["card_index"],
-                    decision.get("chosen_color"),
-                    db
-                )
-                if decision.get("declare_uno"):
-                    await asyncio.sleep(0.5)
-                    await GameActionHandler.handle_declare_uno(table_id, current_player, db)
-
-            elif action_type == "draw_card":
-                await GameActionHandler.handle_draw_card(
-                    table_id,
-                    current_player,
-                    db
-                )
+            # Decide and act as one action, so a human move cannot land
+            # between the bot reading the game and playing on it; it goes to
+            # the table's owner and is retried on conflicts like any move
+            await GameActionHandler.handle_bot_turn(table_id, str(current_player.id), db)
                 
             print(f"BOT HANDLER: Successfully completed action for '{current_player.username}'.")
 
@@ -78,4 +55,35 @@ async def check_and_handle_bot_turn(table_id: str):
             print("\n--- BOT HANDLER EXCEPTION ---")
             print(f"An error occurred while handling bot turn for table {table_id}: {e}")
             traceback.print_exc()
-            print("---------------------------\n")
\ No newline at end of file
+            print("---------------------------\n")
+
+async def take_bot_turn(uow, table_id: str, bot_id: str) -> Dict[str, Any]:
+    """
+    A game action (see GameActionHandler._bot_turn): play the bot's turn if
+    it is still its turn. The play and the bot's UNO call join its unit of work.
+    """
+    from app.game_logic.game_actions import GameActionHandler
+
+    table, game_state = await TableRepository(uow.db).get_table_with_game_state(UUID(table_id))
+    if not game_state or game_state.status != GameStatus.IN_PROGRESS or not table:
+        return {"success": False, "error": "Game not in progress"}
+    current_player = game_state.get_current_player(table)
+    if not current_player or str(current_player.id) != str(bot_id):
+        print(f"BOT HANDLER: Turn moved on at table {table_id} before the bot acted.")
+        return {"success": False, "error": "Not your turn"}
+
+    decision = BotPlayer(current_player, game_state, table).decide_action()
+    action_type = decision.get("action")
+    print(f"BOT ACTION: Bot '{current_player.username}' decided to '{action_type}'.")
+
+    if action_type == "play_card":
+        result = await GameActionHandler._play_card(
+            uow, table_id, current_player, decision["card_index"], decision.get("chosen_color")
+        )
+        if result.get("success") and decision.get("declare_uno"):
+            await GameActionHandler._declare_uno(uow, table_id, current_player)
+        return result
+
+    if action_type == "draw_card":
+        return await GameActionHandler._draw_card(uow, table_id, current_player)
+    return {"success": False, "error": f"Unknown bot action {action_type}"}
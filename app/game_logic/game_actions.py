@@ -1,14 +1,22 @@
 from asyncio import create_task
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, Optional
+import random
 import uuid
-from app.database.database import get_db
+from app.database.database import AsyncSessionLocal, get_db
+from app.database.unit_of_work import ConcurrentUpdateError, UnitOfWork
 from app.repositories.game_state_repository import GameStateRepository
+from app.repositories.game_event_repository import GameEventRepository
+from app.game_logic.game_events import capture_game, diff_game
+from app.core.config import GAME_ACTION_ATTEMPTS, GAME_SNAPSHOT_INTERVAL
 from app.repositories.player_repository import PlayerRepository
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import GameState, PlayerRole, Table, Player, Card, CardColor, GameStatus, UnoDeclarationState, CardType
 from app.websocket.connection_manager import manager
+from app.websocket.event_batch import EventBatch
+from app.websocket.sharding import table_router
+from app.game_logic.table_actor import table_actors
 from app.session_manager import DBSessionManager as session_manager
 from app.websocket.event_handler import (
     broadcast_card_played,
@@ -21,18 +29,121 @@ from app.websocket.event_handler import (
 )
 import time
 from app.session_manager import DBSessionManager
-from app.game_logic.bot_handler import check_and_handle_bot_turn
+from app.game_logic.bot_handler import check_and_handle_bot_turn, take_bot_turn
 
 
 from app.repositories.table_repository import TableRepository
 
 class GameActionHandler:
+    @staticmethod
+    async def _save_action(
+        db: AsyncSession,
+        table: Table,
+        game_state: GameState,
+        before: Dict[str, Any],
+        event_type: str,
+        player_id: Optional[uuid.UUID]
+    ):
+        """
+        Persist an action as one game event. Every GAME_SNAPSHOT_INTERVAL
+        events, and whenever the game starts or stops, the game state and
+        player rows are rewritten as a new snapshot.
+        """
+        game_state.event_seq += 1
+        await GameEventRepository(db).append_event(
+            game_state.table_id,
+            game_state.event_seq,
+            event_type,
+            player_id,
+            diff_game(before, capture_game(table, game_state))
+        )
+
+        if (
+            event_type == "start_game"
+            or game_state.status != GameStatus.IN_PROGRESS
+            or game_state.event_seq - game_state.snapshot_seq >= GAME_SNAPSHOT_INTERVAL
+        ):
+            await TableRepository(db).update_table(table)
+            await GameStateRepository(db).update_game_state(game_state)
+
+    @staticmethod
+    async def _run_action(
+        db: AsyncSession,
+        action: Callable[..., Awaitable[Dict[str, Any]]],
+        *args,
+        forwarded: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Run an action on the table's actor (see table_actor), after the
+        actions queued on that table before it. If another writer changed
+        the table first, the work is rolled back and retried from a fresh
+        load, up to GAME_ACTION_ATTEMPTS times. An action called inside a
+        unit of work the caller opened joins it instead.
+
+        With several workers, an action on a table owned by another worker
+        is forwarded there (args[0] is always the table id), unless it joins
+        a unit of work the caller already opened or was forwarded already.
+        """
+        table_id = args[0]
+        if not forwarded and not table_router.owns(table_id) and not UnitOfWork.active(db):
+            return await table_router.forward(table_id, action.__name__, list(args))
+
+        if UnitOfWork.active(db):
+            # The outer unit of work owns the transaction (and retries)
+            async with UnitOfWork(db) as uow:
+                return await action(uow, *args)
+
+        for attempt in range(1, GAME_ACTION_ATTEMPTS + 1):
+            try:
+                return await table_actors.submit(db, table_id, action, *args)
+            except ConcurrentUpdateError as e:
+                print(f"GAME ACTION: {action.__name__} conflicted (attempt {attempt}/{GAME_ACTION_ATTEMPTS}): {e}")
+                if attempt < GAME_ACTION_ATTEMPTS:
+                    await asyncio.sleep(random.uniform(0, 0.02 * attempt))
+        return {"success": False, "error": "The table is busy, please try again"}
+
+    @staticmethod
+    async def _run_forwarded(action_name: str, args: list) -> Dict[str, Any]:
+        """Run an action another worker forwarded to this table owner"""
+        async with AsyncSessionLocal() as db:
+            return await GameActionHandler._run_action(
+                db, getattr(GameActionHandler, action_name), *args, forwarded=True
+            )
+
+    @staticmethod
+    async def _resync_table(db: AsyncSession, table_id: str):
+        """After a failed write-behind commit, send the table the persisted game in full"""
+        table, game_state = await TableRepository(db).get_table_with_game_state(uuid.UUID(table_id))
+        if not table or not game_state:
+            return
+        await manager.resync_table(
+            table_id,
+            game_state.to_public_dict(table),
+            {str(p.id): [card.to_dict() for card in p.hand] for p in table.players}
+        )
+
     @staticmethod
     async def _trigger_bot_if_needed(table_id: str): # <-- REMOVE `db` parameter
-        """Helper to create a background task for the bot handler."""
-        await asyncio.sleep(0.1) 
+        """
+        Helper to create a background task for the bot handler. It runs as
+        an after-commit callback on the table's queue, so it must not wait.
+        """
         # The bot handler will now create its own database session.
-        create_task(check_and_handle_bot_turn(table_id))
+        create_task(GameActionHandler._check_bot_turn_later(table_id))
+
+    @staticmethod
+    async def _check_bot_turn_later(table_id: str):
+        await asyncio.sleep(0.1)
+        await check_and_handle_bot_turn(table_id)
+
+    @staticmethod
+    async def handle_bot_turn(table_id: str, bot_id: str, db: AsyncSession) -> Dict[str, Any]:
+        return await GameActionHandler._run_action(db, GameActionHandler._bot_turn, table_id, bot_id)
+
+    @staticmethod
+    async def _bot_turn(uow: UnitOfWork, table_id: str, bot_id: str) -> Dict[str, Any]:
+        """Decide and play a bot's turn in one action (see bot_handler)"""
+        return await take_bot_turn(uow, table_id, bot_id)
 
     @staticmethod
     async def handle_play_card(
@@ -42,12 +153,23 @@ class GameActionHandler:
         chosen_color: Optional[CardColor] = None,
         db: AsyncSession = Depends(get_db)
     ) -> Dict[str, Any]:
+        return await GameActionHandler._run_action(db, GameActionHandler._play_card, table_id, player, card_index, chosen_color)
+
+    @staticmethod
+    async def _play_card(
+        uow: UnitOfWork,
+        table_id: str,
+        player: Player,
+        card_index: int,
+        chosen_color: Optional[CardColor] = None
+    ) -> Dict[str, Any]:
+        db = uow.db
+        batch = EventBatch.for_action(uow, table_id)
         
         table_repo = TableRepository(db)
         game_state_repo = GameStateRepository(db)
         
-        table = await table_repo.get_table(uuid.UUID(table_id))
-        game_state = await game_state_repo.get_game_state(uuid.UUID(table_id))
+        table, game_state = await table_repo.get_table_with_game_state(uuid.UUID(table_id))
 
         # 1. VALIDATION CHECKS
         if not game_state or game_state.status != GameStatus.IN_PROGRESS:
@@ -78,9 +200,10 @@ class GameActionHandler:
             return {"success": False, "error": "Wild card requires a color choice"}
 
         # 2. PERFORM THE ACTION
+        before = capture_game(table, game_state)
         played_card = table_player.play_card(card_index)
         if chosen_color:
-            played_card.color = chosen_color
+            played_card = played_card.model_copy(update={"color": chosen_color})
         
         game_state.discard_pile.append(played_card)
         table_player.uno_declaration = UnoDeclarationState.NOT_REQUIRED
@@ -94,7 +217,8 @@ class GameActionHandler:
 
         # 3. NOTIFY CLIENTS (Initial event)
         await broadcast_card_played(
-            table_id, str(table_player.id), table_player.username, played_card, len(table_player.hand)
+            table_id, str(table_player.id), table_player.username, played_card, len(table_player.hand),
+            batch=batch
         )
         
         # 4. HANDLE GAME LOGIC (Special Cards, Win Condition, Turn Advancement)
@@ -105,53 +229,50 @@ class GameActionHandler:
             game_state.winner = table_player.id
             game_state.status = GameStatus.COMPLETED
             turn_advances = 0 # Stop turn advancement on win
-            await manager.broadcast_to_table({
+            batch.add({
                 "type": "game_over",
                 "data": {"winner_id": str(table_player.id), "winner_name": table_player.username}
-            }, str(table.id))
+            })
         elif len(table_player.hand) == 1:
             table_player.uno_declaration = UnoDeclarationState.PENDING
-            await broadcast_player_one_card(table_id, str(table_player.id), table_player.username)
+            await broadcast_player_one_card(table_id, str(table_player.id), table_player.username, batch=batch)
         
         for _ in range(turn_advances):
             game_state.next_turn(table)
 
         # 5. SAVE STATE TO DATABASE
-        await table_repo.update_table(table)
-        await game_state_repo.update_game_state(game_state)
+        await GameActionHandler._save_action(db, table, game_state, before, "play_card", table_player.id)
         
-        # 6. SYNCHRONIZE CLIENTS (Final State)
-        fresh_table = await table_repo.get_table(uuid.UUID(table_id))
-        session_mgr = DBSessionManager(db)
+        # 6. SYNCHRONIZE CLIENTS (Final State, sent once the action is committed)
 
         # Send updated hand to the player who just played
-        updated_player_obj = next((p for p in fresh_table.players if p.id == table_player.id), None)
+        updated_player_obj = next((p for p in table.players if p.id == table_player.id), None)
         if updated_player_obj:
-            await manager.send_to_player({
+            batch.add_personal(str(updated_player_obj.id), {
                 "type": "your_hand", "data": [c.to_dict() for c in updated_player_obj.hand]
-            }, str(updated_player_obj.id), session_mgr)
+            })
         
         # Send updated hand to any player who was forced to draw
         if action_result.get("drawn_player_id"):
-            drawn_player_obj = next((p for p in fresh_table.players if str(p.id) == action_result["drawn_player_id"]), None)
+            drawn_player_obj = next((p for p in table.players if str(p.id) == action_result["drawn_player_id"]), None)
             if drawn_player_obj:
-                await manager.send_to_player({
+                batch.add_personal(str(drawn_player_obj.id), {
                     "type": "your_hand", "data": [c.to_dict() for c in drawn_player_obj.hand]
-                }, str(drawn_player_obj.id), session_mgr)
+                })
 
         # Broadcast the final, authoritative game state to everyone
-        await manager.broadcast_to_table({
-            "type": "game_state", "data": game_state.to_public_dict(fresh_table)
-        }, str(table.id))
+        batch.add({
+            "type": "game_state", "data": game_state.to_public_dict(table)
+        })
         
         # If the game is still going, notify whose turn it is now
         if game_state.status == GameStatus.IN_PROGRESS:
-            new_current_player = game_state.get_current_player(fresh_table)
+            new_current_player = game_state.get_current_player(table)
             if new_current_player:
-                await broadcast_turn_changed(str(table.id), str(new_current_player.id), new_current_player.username)
+                await broadcast_turn_changed(str(table.id), str(new_current_player.id), new_current_player.username, batch=batch)
 
         # 7. TRIGGER NEXT BOT (if applicable)
-        await GameActionHandler._trigger_bot_if_needed(str(table.id))
+        uow.after_commit(GameActionHandler._trigger_bot_if_needed, str(table.id))
         
         return {"success": True, **action_result}
 
@@ -206,6 +327,16 @@ class GameActionHandler:
         player: Player,
         db: AsyncSession = Depends(get_db)
     ) -> Dict[str, Any]:
+        return await GameActionHandler._run_action(db, GameActionHandler._draw_card, table_id, player)
+
+    @staticmethod
+    async def _draw_card(
+        uow: UnitOfWork,
+        table_id: str,
+        player: Player
+    ) -> Dict[str, Any]:
+        db = uow.db
+        batch = EventBatch.for_action(uow, table_id)
         # Check if player is a spectator
         if hasattr(player, 'role') and player.role == PlayerRole.SPECTATOR:
             return {"success": False, "error": "Spectators cannot draw cards"}
@@ -214,8 +345,7 @@ class GameActionHandler:
         game_state_repo = GameStateRepository(db)
         player_repo = PlayerRepository(db)
         
-        table = await table_repo.get_table(uuid.UUID(table_id))
-        game_state = await game_state_repo.get_game_state(uuid.UUID(table_id))
+        table, game_state = await table_repo.get_table_with_game_state(uuid.UUID(table_id))
         if not game_state or game_state.status != GameStatus.IN_PROGRESS:
             return {"success": False, "error": "Game is not currently in progress."}
         
@@ -239,6 +369,7 @@ class GameActionHandler:
             return {"success": False, "error": "Not your turn"}
 
         # Draw a card
+        before = capture_game(table, game_state)
         drawn_cards = game_state.draw_cards_for_player(player, 1)
         if not drawn_cards:
             return {"success": False, "error": "No cards to draw"}
@@ -249,37 +380,36 @@ class GameActionHandler:
             str(player.id), 
             player.username, 
             len(drawn_cards),
-            len(player.hand)
+            len(player.hand),
+            batch=batch
         )
         
         # Send the drawn card only to the player
-        session_mgr = DBSessionManager(db)
-        await manager.send_to_player({
+        batch.add_personal(str(player.id), {
             "type": "card_drawn",
             "data": {
                 "cards": [card.to_dict() for card in drawn_cards],
                 "new_hand_size": len(player.hand)
             }
-        }, str(player.id), session_mgr)  # Add session_mgr here
+        })
 
         # ========== KEY FIX: Always advance turn after drawing ==========
         game_state.next_turn(table)
         
         # Broadcast turn changed
         new_current_player = game_state.get_current_player(table)
-        await broadcast_turn_changed(str(table.id), str(new_current_player.id), new_current_player.username)
+        await broadcast_turn_changed(str(table.id), str(new_current_player.id), new_current_player.username, batch=batch)
         
         # Update database with all changes
-        await table_repo.update_table(table)
-        await game_state_repo.update_game_state(game_state)
+        await GameActionHandler._save_action(db, table, game_state, before, "draw_card", player.id)
 
         # Broadcast the updated game state to everyone
-        await manager.broadcast_to_table({
+        batch.add({
             "type": "game_state",
             "data": game_state.to_public_dict(table)
-        }, str(table.id))
+        })
 
-        await GameActionHandler._trigger_bot_if_needed(str(table.id)) # <-- Pass table_id only
+        uow.after_commit(GameActionHandler._trigger_bot_if_needed, str(table.id)) # <-- Pass table_id only
 
 
         return {"success": True, "drawn_count": len(drawn_cards)}
@@ -290,14 +420,24 @@ class GameActionHandler:
         player: Player,
         db: AsyncSession = Depends(get_db)
     ) -> Dict[str, Any]:
+        return await GameActionHandler._run_action(db, GameActionHandler._declare_uno, table_id, player)
+
+    @staticmethod
+    async def _declare_uno(
+        uow: UnitOfWork,
+        table_id: str,
+        player: Player
+    ) -> Dict[str, Any]:
+        db = uow.db
+        batch = EventBatch.for_action(uow, table_id)
         # Check if player is a spectator
         if hasattr(player, 'role') and player.role == PlayerRole.SPECTATOR:
             return {"success": False, "error": "Spectators cannot declare UNO"}
         
         table_repo = TableRepository(db)
         
-        table = await table_repo.get_table(uuid.UUID(table_id))
-        if not table:
+        table, game_state = await table_repo.get_table_with_game_state(uuid.UUID(table_id))
+        if not table or not game_state:
             return {"success": False, "error": "Table not found"}
 
         # Find the player in the table's player list
@@ -312,13 +452,14 @@ class GameActionHandler:
             return {"success": False, "error": "Can only declare UNO with exactly 1 card"}
 
         # Set UNO declaration state
+        before = capture_game(table, game_state)
         player.uno_declaration = UnoDeclarationState.DECLARED
 
         # Update database
-        await table_repo.update_table(table)
+        await GameActionHandler._save_action(db, table, game_state, before, "declare_uno", player.id)
 
         # Broadcast UNO declaration
-        await broadcast_uno_declared(table_id, str(player.id), player.username)
+        await broadcast_uno_declared(table_id, str(player.id), player.username, batch=batch)
 
         return {"success": True}
 
@@ -329,6 +470,17 @@ class GameActionHandler:
         target_player_id: str,
         db: AsyncSession = Depends(get_db)
     ) -> Dict[str, Any]:
+        return await GameActionHandler._run_action(db, GameActionHandler._challenge_uno, table_id, challenger, target_player_id)
+
+    @staticmethod
+    async def _challenge_uno(
+        uow: UnitOfWork,
+        table_id: str,
+        challenger: Player,
+        target_player_id: str
+    ) -> Dict[str, Any]:
+        db = uow.db
+        batch = EventBatch.for_action(uow, table_id)
         # Check if challenger is a spectator
         if hasattr(challenger, 'role') and challenger.role == PlayerRole.SPECTATOR:
             return {"success": False, "error": "Spectators cannot challenge UNO"}
@@ -336,8 +488,7 @@ class GameActionHandler:
         table_repo = TableRepository(db)
         game_state_repo = GameStateRepository(db)
         
-        table = await table_repo.get_table(uuid.UUID(table_id))
-        game_state = await game_state_repo.get_game_state(uuid.UUID(table_id))
+        table, game_state = await table_repo.get_table_with_game_state(uuid.UUID(table_id))
         
         if not table or not game_state:
             return {"success": False, "error": "Table or game state not found"}
@@ -353,6 +504,7 @@ class GameActionHandler:
             return {"success": False, "error": "Challenger not found in table"}
         
         challenger = table_challenger
+        before = capture_game(table, game_state)
 
         # Check if target player has 1 card but didn't declare UNO
         if len(target_player.hand) == 1 and target_player.uno_declaration != UnoDeclarationState.DECLARED:
@@ -361,8 +513,7 @@ class GameActionHandler:
             target_player.uno_declaration = UnoDeclarationState.PENALIZED
 
             # Update database
-            await table_repo.update_table(table)
-            await game_state_repo.update_game_state(game_state)
+            await GameActionHandler._save_action(db, table, game_state, before, "challenge_uno", challenger.id)
 
             # Broadcast the penalty
             await broadcast_uno_penalty(
@@ -371,7 +522,8 @@ class GameActionHandler:
                 target_player.username,
                 str(challenger.id),
                 challenger.username,
-                len(drawn_cards)
+                len(drawn_cards),
+                batch=batch
             )
 
             return {"success": True, "penalty_applied": True, "cards_drawn": len(drawn_cards)}
@@ -380,15 +532,15 @@ class GameActionHandler:
             drawn_cards = game_state.draw_cards_for_player(challenger, 2)
 
             # Update database
-            await table_repo.update_table(table)
-            await game_state_repo.update_game_state(game_state)
+            await GameActionHandler._save_action(db, table, game_state, before, "challenge_uno", challenger.id)
 
             # Broadcast failed challenge
             await broadcast_uno_challenge_failed(
                 table_id,
                 str(challenger.id),
                 challenger.username,
-                len(drawn_cards)
+                len(drawn_cards),
+                batch=batch
             )
 
             return {"success": True, "penalty_applied": False, "cards_drawn": len(drawn_cards)}
@@ -400,8 +552,18 @@ class GameActionHandler:
         table_id: str, 
         player: Player, 
         db: AsyncSession = Depends(get_db)
+    ) -> Dict[str, Any]:
+        return await GameActionHandler._run_action(db, GameActionHandler._start_game, table_id, player)
+
+    @staticmethod
+    async def _start_game(
+        uow: UnitOfWork,
+        table_id: str,
+        player: Player
     ) -> Dict[str, Any]:
         """Handle starting a game - DEBUG VERSION"""
+        db = uow.db
+        batch = EventBatch.for_action(uow, table_id)
         print(f"DEBUG: handle_start_game called by {player.username}")
 
         print(f"\n=== GAME START DEBUG ===")
@@ -411,7 +573,7 @@ class GameActionHandler:
         table_repo = TableRepository(db)
         game_state_repo = GameStateRepository(db)
         
-        table = await table_repo.get_table(uuid.UUID(table_id))
+        table, game_state = await table_repo.get_table_with_game_state(uuid.UUID(table_id))
         if not table:
             print(f"ERROR: Table not found")
             return {"success": False, "error": "Table not found"}
@@ -426,7 +588,6 @@ class GameActionHandler:
             return {"success": False, "error": "Player not in table"}
 
         # Check if game is already in progress
-        game_state = await game_state_repo.get_game_state(table.id)
         if game_state and game_state.status == GameStatus.IN_PROGRESS:
             print(f"ERROR: Game already in progress, current player: {game_state.current_player_index}")
             current_player = game_state.get_current_player(table)
@@ -455,6 +616,7 @@ class GameActionHandler:
         
         # Initialize the game
         print("Initializing game...")
+        before = capture_game(table, game_state)
         game_state.initialize_game(table)
         
         print(f"AFTER initialization:")
@@ -480,14 +642,11 @@ class GameActionHandler:
             "timestamp": time.time()
         }
 
+        # A failed save propagates, so the unit of work rolls back and a
+        # conflicting start is retried (see _run_action)
         print("Updating database...")
-        try:
-            await game_state_repo.update_game_state(game_state)
-            await table_repo.update_table(table)
-            print("Database updated successfully")
-        except Exception as e:
-            print(f"ERROR updating database: {e}")
-            return {"success": False, "error": "Database update failed"}
+        await GameActionHandler._save_action(db, table, game_state, before, "start_game", player.id)
+        print("Database updated successfully")
 
         # Verify game state after database update
         print("Verifying final state...")
@@ -502,28 +661,26 @@ class GameActionHandler:
         public_state = game_state.to_public_dict(table)
         print(f"Public state current player ID: {public_state.get('current_player_id')}")
         
-        await manager.broadcast_to_table({
+        batch.add({
             "type": "game_state",
             "data": public_state
-        }, str(table.id))
+        })
 
         print("Sending hands to players...")
-# Create a session manager instance
-        session_mgr = DBSessionManager(db)
         for i, p in enumerate(table.players):
             hand_size = len(p.hand)
             print(f"  Sending {hand_size} cards to {p.username}")
-            await manager.send_to_player({
+            batch.add_personal(str(p.id), {
                 "type": "your_hand",
                 "data": [card.to_dict() for card in p.hand]
-            }, str(p.id), session_mgr)  # Add session_mgr parameter here
+            })
 
         # Broadcast turn for the current player - ONLY ONCE
         print("Broadcasting initial turn...")
         current_player = game_state.get_current_player(table)
         if current_player:
             print(f"Broadcasting turn to: {current_player.username} ({str(current_player.id)[:8]}...)")
-            await broadcast_turn_changed(table_id, str(current_player.id), current_player.username)
+            await broadcast_turn_changed(table_id, str(current_player.id), current_player.username, batch=batch)
         else:
             print("ERROR: No current player to broadcast turn to!")
 
@@ -532,6 +689,11 @@ class GameActionHandler:
         print(f"Final game status: {game_state.status}")
         print(f"Final current player index: {game_state.current_player_index}\n")
 
-        await GameActionHandler._trigger_bot_if_needed(str(table.id)) # <-- Pass table_id only
+        uow.after_commit(GameActionHandler._trigger_bot_if_needed, str(table.id)) # <-- Pass table_id only
+
+        return {"success": True}
 
-        return {"success": True}
\ No newline at end of file
+table_router.executor = GameActionHandler._run_forwarded
+table_actors.on_rollback = GameActionHandler._resync_table
+manager.presence.on_written = table_actors.set_online
+table_router.register_types(Player, CardColor)
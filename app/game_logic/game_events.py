@@ -0,0 +1,113 @@
+"""
+Game event log.
+
+Each game action is stored as one small game_events row holding only what
+the action changed: the hands that changed (as card codes), how many cards
+were taken from the draw pile, the cards added to the discard pile, and the
+turn fields. The game_states/players rows act as a snapshot; the current
+state is that snapshot with the newer events applied in order.
+"""
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from app.models import GameState, Table
+from app.schemas import GameDirection, GameStatus, UnoDeclarationState
+from app.utils.card_codec import decode_cards, encode_cards
+
+TURN_FIELDS = ("current_player_index", "direction", "status", "winner", "last_action")
+
+
+def capture_game(table: Table, game_state: GameState) -> Dict[str, Any]:
+    """Compact copy of everything a game event can change"""
+    return {
+        "hands": {str(p.id): encode_cards(p.hand) for p in table.players},
+        "uno": {str(p.id): p.uno_declaration.value for p in table.players},
+        "draw_pile": encode_cards(game_state.draw_pile),
+        "discard_pile": encode_cards(game_state.discard_pile),
+        "current_player_index": game_state.current_player_index,
+        "direction": game_state.direction.value,
+        "status": game_state.status.value,
+        "winner": str(game_state.winner) if game_state.winner else None,
+        "last_action": game_state.last_action
+    }
+
+
+def diff_game(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Build an event payload holding the changes between two captures"""
+    payload: Dict[str, Any] = {}
+
+    hands = {
+        player_id: codes.hex()
+        for player_id, codes in after["hands"].items()
+        if before["hands"].get(player_id) != codes
+    }
+    if hands:
+        payload["hands"] = hands
+
+    uno = {
+        player_id: state
+        for player_id, state in after["uno"].items()
+        if before["uno"].get(player_id) != state
+    }
+    if uno:
+        payload["uno"] = uno
+
+    # Cards are only ever drawn from the front of the draw pile; anything
+    # else (deal, reshuffle) stores the whole pile
+    old_draw, new_draw = before["draw_pile"], after["draw_pile"]
+    if old_draw != new_draw:
+        taken = len(old_draw) - len(new_draw)
+        if taken > 0 and old_draw[taken:] == new_draw:
+            payload["draw_taken"] = taken
+        else:
+            payload["draw_pile"] = new_draw.hex()
+
+    # Likewise cards are normally only added on top of the discard pile
+    old_discard, new_discard = before["discard_pile"], after["discard_pile"]
+    if old_discard != new_discard:
+        if len(new_discard) > len(old_discard) and new_discard.startswith(old_discard):
+            payload["discard_added"] = new_discard[len(old_discard):].hex()
+        else:
+            payload["discard_pile"] = new_discard.hex()
+
+    for field in TURN_FIELDS:
+        if before[field] != after[field]:
+            payload[field] = after[field]
+
+    return payload
+
+
+def apply_event(table: Optional[Table], game_state: GameState, payload: Dict[str, Any]):
+    """
+    Apply an event payload to a loaded state. Without a table only the
+    game state part is applied.
+    """
+    if table is not None:
+        for player_id, codes in payload.get("hands", {}).items():
+            player = table.get_player(player_id)
+            if player:
+                player.hand = decode_cards(bytes.fromhex(codes))
+        for player_id, state in payload.get("uno", {}).items():
+            player = table.get_player(player_id)
+            if player:
+                player.uno_declaration = UnoDeclarationState(state)
+
+    if "draw_taken" in payload:
+        game_state.draw_pile = game_state.draw_pile[payload["draw_taken"]:]
+    if "draw_pile" in payload:
+        game_state.draw_pile = decode_cards(bytes.fromhex(payload["draw_pile"]))
+    if "discard_added" in payload:
+        game_state.discard_pile = game_state.discard_pile + decode_cards(bytes.fromhex(payload["discard_added"]))
+    if "discard_pile" in payload:
+        game_state.discard_pile = decode_cards(bytes.fromhex(payload["discard_pile"]))
+
+    if "current_player_index" in payload:
+        game_state.current_player_index = payload["current_player_index"]
+    if "direction" in payload:
+        game_state.direction = GameDirection(payload["direction"])
+    if "status" in payload:
+        game_state.status = GameStatus(payload["status"])
+    if "winner" in payload:
+        game_state.winner = UUID(payload["winner"]) if payload["winner"] else None
+    if "last_action" in payload:
+        game_state.last_action = payload["last_action"]
@@ -0,0 +1,234 @@
+"""
+Per-table actors holding the live game in memory.
+
+Every game action on a table is queued on that table's actor and run one
+at a time on the actor's own database session. The session keeps the
+table and game state it loaded pinned (see TableRepository), so an action
+works on the in-memory objects instead of reloading them.
+
+By default every action is committed before its broadcasts, as without
+actors. Setting TABLE_WRITE_BEHIND_LAG above 0 opts in to write-behind:
+each action runs in a deferred unit of work (a savepoint), its broadcasts
+go out as soon as it is applied, and the actor commits everything pending
+at most that many seconds later. A failed commit drops the in-memory
+state, so the next action starts again from what was persisted, and the
+table's clients are sent the persisted game in full (on_rollback).
+
+An actor that gets no work for TABLE_ACTOR_IDLE_TIMEOUT seconds commits
+and leaves memory; the next action loads the table again.
+
+Human moves and bot turns go through the same queue, so actions on one
+table never interleave while different tables run concurrently. Each
+actor counts its queue depth and how long work waited (see stats()).
+"""
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import TABLE_ACTOR_IDLE_TIMEOUT, TABLE_WRITE_BEHIND_LAG
+from app.database.unit_of_work import UnitOfWork
+from app.models import GameState, Table
+from app.repositories.table_repository import PINNED_TABLES_KEY, TableRepository
+
+Action = Callable[..., Awaitable[Dict[str, Any]]]
+RollbackHandler = Callable[[AsyncSession, str], Awaitable[None]]
+
+
+class TableActor:
+    """The queue, session and in-memory state of one table"""
+
+    def __init__(self, table_id: str, session: AsyncSession, registry: "TableActors"):
+        self.table_id = table_id
+        self.db = session
+        self.pinned: Dict[uuid.UUID, Tuple[Table, GameState]] = {}
+        self.db.info[PINNED_TABLES_KEY] = self.pinned
+        self.registry = registry
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.dirty_since: Optional[float] = None  # loop time of the oldest uncommitted action
+        self.jobs = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._task = asyncio.create_task(self._run())
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Queue `func(*args)` to run on the actor and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queue.put_nowait((func, args, future, loop.time()))
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return await future
+
+    async def apply(self, action: Action, *args) -> Dict[str, Any]:
+        """Run a game action (see GameActionHandler) in a unit of work on the actor's session"""
+        deferred = self.registry.write_behind_lag > 0
+        try:
+            async with UnitOfWork(self.db, deferred=deferred) as uow:
+                result = await action(uow, *args)
+        except Exception:
+            # The in-memory objects may be half-changed; reload next time
+            self.pinned.clear()
+            raise
+        if deferred and self.dirty_since is None:
+            self.dirty_since = asyncio.get_running_loop().time()
+        return result
+
+    async def invalidate(self):
+        """Persist what is pending and forget the in-memory state"""
+        await self.commit()
+        self.pinned.clear()
+
+    async def commit(self):
+        if self.dirty_since is None:
+            return
+        self.dirty_since = None
+        try:
+            await self.db.commit()
+        except Exception as e:
+            print(f"TABLE ACTOR: Write-behind commit for table {self.table_id} failed, reloading: {e}")
+            await self.db.rollback()
+            self.pinned.clear()
+            if self.registry.on_rollback is not None:
+                try:
+                    await self.registry.on_rollback(self.db, self.table_id)
+                except Exception as e:
+                    print(f"TABLE ACTOR: Resyncing table {self.table_id} failed: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if self.dirty_since is not None:
+                    timeout = max(0, self.dirty_since + self.registry.write_behind_lag - loop.time())
+                else:
+                    timeout = self.registry.idle_timeout
+                try:
+                    async with asyncio.timeout(timeout):
+                        func, args, future, queued_at = await self.queue.get()
+                except TimeoutError:
+                    if self.dirty_since is not None:
+                        await self.commit()
+                    elif self.queue.empty():
+                        self.registry._retire(self)
+                        return
+                    continue
+
+                if future.cancelled():
+                    continue
+                wait = loop.time() - queued_at
+                self.jobs += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                try:
+                    future.set_result(await func(*args))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            await self.commit()
+            await self.db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "jobs": self.jobs,
+            "avg_wait_ms": round(self.total_wait / self.jobs * 1000, 3) if self.jobs else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "uncommitted": self.dirty_since is not None,
+        }
+
+    async def stop(self):
+        """Finish the queued work, commit and close"""
+        self.registry._retire(self)
+        await self.call(self.commit)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class TableActors:
+    """
+    The actors of the tables this worker is currently running.
+    `on_rollback(db, table_id)` runs after a write-behind commit failed, so
+    clients that were sent uncommitted actions can be resynced
+    (GameActionHandler registers it).
+    """
+
+    def __init__(
+        self,
+        write_behind_lag: float = TABLE_WRITE_BEHIND_LAG,
+        idle_timeout: float = TABLE_ACTOR_IDLE_TIMEOUT
+    ):
+        self.write_behind_lag = write_behind_lag
+        self.idle_timeout = idle_timeout
+        self.on_rollback: Optional[RollbackHandler] = None
+        self.actors: Dict[str, TableActor] = {}
+
+    def get(self, table_id: str, db: AsyncSession) -> TableActor:
+        """The table's actor, started with a session on the same database as `db`"""
+        table_id = str(table_id)
+        actor = self.actors.get(table_id)
+        if actor is None:
+            actor = TableActor(table_id, AsyncSession(db.bind, expire_on_commit=False), self)
+            self.actors[table_id] = actor
+        return actor
+
+    async def submit(self, db: AsyncSession, table_id: str, action: Action, *args) -> Dict[str, Any]:
+        """Run a game action on the table's actor, after the ones queued before it"""
+        actor = self.get(table_id, db)
+        return await actor.call(actor.apply, action, *args)
+
+    def hot_state(self, table_id: str) -> Optional[Tuple[Table, GameState]]:
+        """The live table and game state, if an actor holds them"""
+        actor = self.actors.get(str(table_id))
+        return actor.pinned.get(uuid.UUID(str(table_id))) if actor else None
+
+    async def load(self, db: AsyncSession, table_id: str) -> Tuple[Optional[Table], Optional[GameState]]:
+        """
+        The table and game state as players see them: the live objects if
+        an actor holds them (the database may lag behind), else from `db`.
+        Callers must not change what they get.
+        """
+        return self.hot_state(table_id) or await TableRepository(db).get_table_with_game_state(uuid.UUID(str(table_id)))
+
+    async def invalidate(self, table_id: str):
+        """
+        The table was changed outside its actor (players joined or left):
+        persist pending actions and reload the table for the next one.
+        """
+        actor = self.actors.get(str(table_id))
+        if actor is not None:
+            await actor.call(actor.invalidate)
+
+    def set_online(self, statuses: Dict[str, bool]):
+        """
+        Online status was written to the database (see PresenceTracker):
+        copy it onto the live players, which actors never reload
+        """
+        for actor in self.actors.values():
+            for table, _ in actor.pinned.values():
+                for player in (*table.players, *table.spectators):
+                    is_online = statuses.get(str(player.id))
+                    if is_online is not None:
+                        player.is_online = is_online
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue metrics per table in memory"""
+        return {table_id: actor.stats() for table_id, actor in self.actors.items()}
+
+    async def close(self):
+        """Commit and stop every actor (on shutdown)"""
+        for actor in list(self.actors.values()):
+            await actor.stop()
+
+    def _retire(self, actor: TableActor):
+        if self.actors.get(actor.table_id) is actor:
+            del self.actors[actor.table_id]
+
+
+# Create a global instance
+table_actors = TableActors()
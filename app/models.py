@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from enum import Enum
 from typing import Optional, List, Dict, Any
 import uuid
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 import random
 from uuid import UUID, uuid4
 from typing import Set
@@ -12,6 +12,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from app.schemas import CardColor, CardType, OAuthProvider, PlayerRole,GameDirection, GameStatus, PlayerRole, UnoDeclarationState
+from app.utils.spectators import summarize_spectators
 
 
 SECRET_KEY = "your-secret-key-here"  # Change this in production
@@ -24,6 +25,10 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class Card(BaseModel):
+    # Cards are immutable so decoded cards can be shared (see app.utils.card_codec);
+    # use model_copy(update=...) to get a changed card
+    model_config = ConfigDict(frozen=True)
+
     color: CardColor
     type: CardType
     value: Optional[int] = Field(None, ge=0, le=9)  # Only for number cards
@@ -186,6 +191,8 @@ class Player(BaseModel):
     role: PlayerRole = PlayerRole.PLAYER  # Add this field
     # Updated config for Pydantic V2
     model_config = ConfigDict(extra='ignore')
+    # Values last read from / written to the database (None = never persisted)
+    _persisted_state: Optional[tuple] = PrivateAttr(default=None)
     
     def to_public_dict(self) -> Dict[str, Any]:
         """Return a public representation of the player (without revealing hand contents)"""
@@ -211,6 +218,25 @@ class Player(BaseModel):
     def get_hand_size(self) -> int:
         """Get number of cards in hand"""
         return len(self.hand)
+
+    def _persisted_fields(self) -> tuple:
+        # is_online is written by the presence tracker, not with the game
+        hand = tuple((card.color, card.type, card.value) for card in self.hand)
+        return (hand, self.uno_declaration, self.role)
+
+    def mark_clean(self):
+        """Record the current values as the ones stored in the database"""
+        self._persisted_state = self._persisted_fields()
+
+    @property
+    def is_dirty(self) -> bool:
+        """True if the player changed since it was loaded or last saved"""
+        return self._persisted_state != self._persisted_fields()
+
+    @property
+    def role_changed(self) -> bool:
+        """True if the role differs from the stored one"""
+        return self._persisted_state is not None and self._persisted_state[2] != self.role
     
     
 
@@ -227,6 +253,22 @@ class Table(BaseModel):
     status: GameStatus = GameStatus.WAITING
     created_at: float = Field(default_factory=lambda: time.time())
     creator_id: Optional[UUID] = None # <-- ADD THIS LINE
+    _persisted_state: Optional[tuple] = PrivateAttr(default=None)
+
+    def mark_clean(self):
+        """Record the table and all of its players as saved"""
+        self._persisted_state = (self.status, self.max_players)
+        for player in self.players + self.spectators:
+            player.mark_clean()
+
+    @property
+    def is_dirty(self) -> bool:
+        """True if the table's own columns changed since load/save"""
+        return self._persisted_state != (self.status, self.max_players)
+
+    def dirty_players(self) -> List[Player]:
+        """Players and spectators that need to be written back"""
+        return [player for player in self.players + self.spectators if player.is_dirty]
 
     def add_player(self, player: Player) -> bool:
         """Add a player to the table if there's space"""
@@ -285,6 +327,9 @@ class GameState(BaseModel):
     status: GameStatus = GameStatus.WAITING
     winner: Optional[UUID] = None
     last_action: Optional[Dict[str, Any]] = None
+    event_seq: int = 0  # Last game event applied to this state
+    snapshot_seq: int = 0  # Last game event included in the stored snapshot
+    version: int = 0  # Version of the stored row, checked when writing it back
     
     def initialize_game(self, table: Table):
         """Initialize a new game - only deal cards to players, not spectators"""
@@ -403,16 +448,14 @@ class GameState(BaseModel):
             players_info.append(player_info)
         
         # Create spectator info (limited details)
-        spectators_info = []
-        for spectator in table.spectators:
-            spectator_info = {
+        def spectator_info(spectator: Player) -> Dict[str, Any]:
+            return {
                 "id": str(spectator.id),
                 "username": spectator.username,
                 "is_online": spectator.is_online,
                 "is_you": requesting_player and spectator.id == requesting_player.id,
                 "role": "spectator"
             }
-            spectators_info.append(spectator_info)
         
         return {
             "table_id": str(self.table_id),
@@ -423,6 +466,6 @@ class GameState(BaseModel):
             "status": self.status.value,
             "winner_id": str(self.winner) if self.winner else None,
             "players": players_info,
-            "spectators": spectators_info,
+            **summarize_spectators(table.spectators, spectator_info),
             "last_action": self.last_action
         }
\ No newline at end of file
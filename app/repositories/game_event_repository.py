@@ -0,0 +1,46 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.database.models import GameEventModel
+from app.database.unit_of_work import ConcurrentUpdateError, commit_or_flush
+from typing import Any, Dict, List, Optional
+import uuid
+import time
+
+class GameEventRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def append_event(
+        self,
+        table_id: uuid.UUID,
+        seq: int,
+        event_type: str,
+        player_id: Optional[uuid.UUID],
+        payload: Dict[str, Any]
+    ):
+        """
+        Append the event with the given sequence number. Raises
+        ConcurrentUpdateError if another action already used that number.
+        """
+        self.db.add(GameEventModel(
+            table_id=table_id,
+            seq=seq,
+            type=event_type,
+            player_id=player_id,
+            payload=payload,
+            created_at=int(time.time())
+        ))
+        try:
+            await commit_or_flush(self.db)
+        except IntegrityError as e:
+            raise ConcurrentUpdateError(f"Event {seq} of table {table_id} already exists") from e
+
+    async def get_events_after(self, table_id: uuid.UUID, seq: int) -> List[GameEventModel]:
+        """Events newer than the given sequence number, oldest first"""
+        result = await self.db.execute(
+            select(GameEventModel)
+            .where(GameEventModel.table_id == table_id, GameEventModel.seq > seq)
+            .order_by(GameEventModel.seq)
+        )
+        return list(result.scalars().all())
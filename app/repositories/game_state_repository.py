@@ -1,10 +1,47 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 from app.database.models import GameStateModel
-from app.models import GameState, Card
+from app.database.unit_of_work import ConcurrentUpdateError, commit_or_flush
+from app.game_logic.game_events import apply_event
+from app.models import GameState, Card, Table
+from app.repositories.game_event_repository import GameEventRepository
+from app.schemas import GameStatus
+from app.utils.card_codec import encode_cards, load_cards
 from typing import Optional
 import uuid
 
+
+def game_state_from_model(game_state_model: GameStateModel) -> GameState:
+    """Convert a GameStateModel row to the domain GameState"""
+    return GameState(
+        table_id=game_state_model.table_id,
+        draw_pile=load_cards(game_state_model.draw_pile_codes, game_state_model.draw_pile),
+        discard_pile=load_cards(game_state_model.discard_pile_codes, game_state_model.discard_pile),
+        current_player_index=game_state_model.current_player_index,
+        direction=game_state_model.direction,
+        status=game_state_model.status,
+        winner=game_state_model.winner,
+        last_action=game_state_model.last_action,
+        event_seq=game_state_model.event_seq or 0,
+        snapshot_seq=game_state_model.event_seq or 0,
+        version=game_state_model.version or 0
+    )
+
+
+async def apply_pending_events(db: AsyncSession, table: Optional[Table], game_state: GameState):
+    """Bring a state loaded from its snapshot up to date with the event log"""
+    # Events are only appended while a game is in progress, and any event
+    # that leaves the game in another status writes a snapshot
+    if game_state.status != GameStatus.IN_PROGRESS:
+        return
+
+    events = await GameEventRepository(db).get_events_after(game_state.table_id, game_state.event_seq)
+    for event in events:
+        apply_event(table, game_state, event.payload)
+        game_state.event_seq = event.seq
+
+
 class GameStateRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -19,52 +56,62 @@ class GameStateRepository:
             return None
         
         # Convert database model to domain model
-        return GameState(
-            table_id=game_state_model.table_id,
-            draw_pile=[Card(**card) for card in game_state_model.draw_pile],
-            discard_pile=[Card(**card) for card in game_state_model.discard_pile],
-            current_player_index=game_state_model.current_player_index,
-            direction=game_state_model.direction,
-            status=game_state_model.status,
-            winner=game_state_model.winner,
-            last_action=game_state_model.last_action
-        )
+        game_state = game_state_from_model(game_state_model)
+        await apply_pending_events(self.db, None, game_state)
+        return game_state
     
     async def update_game_state(self, game_state: GameState):
-        # Convert domain model to database model format
-        draw_pile_data = [card.dict() for card in game_state.draw_pile]
-        discard_pile_data = [card.dict() for card in game_state.discard_pile]
-        
-        await self.db.execute(
+        """
+        Write the state if the row is still at the version it was loaded
+        with, otherwise raise ConcurrentUpdateError.
+        """
+        result = await self.db.execute(
             update(GameStateModel)
-            .where(GameStateModel.table_id == game_state.table_id)
+            .where(
+                GameStateModel.table_id == game_state.table_id,
+                GameStateModel.version == game_state.version
+            )
             .values(
-                draw_pile=draw_pile_data,
-                discard_pile=discard_pile_data,
+                draw_pile=None,
+                discard_pile=None,
+                draw_pile_codes=encode_cards(game_state.draw_pile),
+                discard_pile_codes=encode_cards(game_state.discard_pile),
                 current_player_index=game_state.current_player_index,
                 direction=game_state.direction,
                 status=game_state.status,
                 winner=game_state.winner,
-                last_action=game_state.last_action
+                last_action=game_state.last_action,
+                event_seq=game_state.event_seq,
+                version=game_state.version + 1
             )
         )
-        await self.db.commit()
+        if result.rowcount != 1:
+            raise ConcurrentUpdateError(
+                f"Game state of table {game_state.table_id} changed since version {game_state.version}"
+            )
+        await commit_or_flush(self.db)
+        game_state.version += 1
+        game_state.snapshot_seq = game_state.event_seq
     
     async def create_game_state(self, game_state: GameState):
-        # Convert domain model to database model
-        draw_pile_data = [card.dict() for card in game_state.draw_pile]
-        discard_pile_data = [card.dict() for card in game_state.discard_pile]
-        
         game_state_model = GameStateModel(
             table_id=game_state.table_id,
-            draw_pile=draw_pile_data,
-            discard_pile=discard_pile_data,
+            draw_pile=None,
+            discard_pile=None,
+            draw_pile_codes=encode_cards(game_state.draw_pile),
+            discard_pile_codes=encode_cards(game_state.discard_pile),
             current_player_index=game_state.current_player_index,
             direction=game_state.direction,
             status=game_state.status,
             winner=game_state.winner,
-            last_action=game_state.last_action
+            last_action=game_state.last_action,
+            event_seq=game_state.event_seq,
+            version=game_state.version
         )
         
         self.db.add(game_state_model)
-        await self.db.commit()
\ No newline at end of file
+        try:
+            await commit_or_flush(self.db)
+        except IntegrityError as e:
+            raise ConcurrentUpdateError(f"Game state of table {game_state.table_id} already exists") from e
+        game_state.snapshot_seq = game_state.event_seq
\ No newline at end of file
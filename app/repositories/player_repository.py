@@ -2,11 +2,31 @@ from time import time
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, delete
 from app.database.models import PlayerModel, UserModel
+from app.database.unit_of_work import commit_or_flush
 from app.models import Player, Card
+from app.utils.card_codec import encode_cards, load_cards
 from typing import List, Optional
 import uuid
 from app.schemas import PlayerRole, UnoDeclarationState
 from app.repositories.user_repository import UserRepository  # You'll need to create this
+
+
+def player_from_model(player_model: PlayerModel, user_model: UserModel) -> Player:
+    """Convert a PlayerModel row and its UserModel to the domain Player"""
+    hand = load_cards(player_model.hand_codes, player_model.hand)
+
+    return Player(
+        id=player_model.id,
+        user_id=player_model.user_id,
+        username=user_model.username,
+        hand=hand,
+        is_online=player_model.is_online,
+        is_bot=user_model.is_bot,
+        uno_declaration=player_model.uno_declaration,
+        role=player_model.role
+    )
+
+
 class PlayerRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -29,52 +49,47 @@ class PlayerRepository:
         if not user_model:
             return None
         
-        # Convert hand from JSON to Card objects
-        hand = [Card(**card) for card in player_model.hand]
-        
-        return Player(
-            id=player_model.id,
-            user_id=player_model.user_id, # <-- ADD THIS
-            username=user_model.username,
-            hand=hand,
-            is_online=player_model.is_online,
-            is_bot=user_model.is_bot, # <-- ADD FIX HERE
-            uno_declaration=player_model.uno_declaration,
-            role=player_model.role
-        )
+        return player_from_model(player_model, user_model)
     
     async def update_player(self, player: Player):
-        hand_data = [card.dict() for card in player.hand]
-        
         await self.db.execute(
             update(PlayerModel)
             .where(PlayerModel.id == player.id)
             .values(
-                hand=hand_data,
-                is_online=player.is_online,
+                hand=None,
+                hand_codes=encode_cards(player.hand),
                 uno_declaration=player.uno_declaration
             )
         )
-        await self.db.commit()
+        await commit_or_flush(self.db)
+        player.mark_clean()
+
+    async def set_online(self, player_ids: List[uuid.UUID], is_online: bool):
+        """Set the online status of several players in one UPDATE (see PresenceTracker)"""
+        await self.db.execute(
+            update(PlayerModel)
+            .where(PlayerModel.id.in_(player_ids))
+            .values(is_online=is_online)
+        )
+        await commit_or_flush(self.db)
     
     async def create_player(self, player: Player, table_id: uuid.UUID, user_id: uuid.UUID):
-    # Convert hand to JSON-serializable format
-        hand_data = [card.dict() for card in player.hand]
-        
         player_model = PlayerModel(
             id=player.id,
             user_id=user_id,  # Use the user_id instead of username
             table_id=table_id,
-            hand=hand_data,
+            hand=None,
+            hand_codes=encode_cards(player.hand),
             is_online=player.is_online,
             uno_declaration=player.uno_declaration if hasattr(player, 'uno_declaration') else UnoDeclarationState.NOT_REQUIRED,
             role=player.role if hasattr(player, 'role') else PlayerRole.PLAYER
         )
         
         self.db.add(player_model)
-        await self.db.commit()
+        await commit_or_flush(self.db)
+        player.mark_clean()
     async def delete_player(self, player_id: uuid.UUID):
         await self.db.execute(
             delete(PlayerModel).where(PlayerModel.id == player_id)
         )
-        await self.db.commit()
\ No newline at end of file
+        await commit_or_flush(self.db)
\ No newline at end of file
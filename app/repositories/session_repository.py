@@ -1,11 +1,25 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
 from app.database.models import PlayerModel, SessionModel, UserModel
+from app.database.unit_of_work import commit_or_flush
 from app.models import Card, Player
+from app.utils.card_codec import load_cards
+from app.utils.session_cache import CachedSession, session_cache
 from typing import Optional
 import uuid
 import time
 
+# Player fields returned for a session, apart from the hand
+_SESSION_PLAYER_COLUMNS = (
+    PlayerModel.id,
+    PlayerModel.user_id,
+    PlayerModel.is_online,
+    PlayerModel.uno_declaration,
+    PlayerModel.role,
+    UserModel.username,
+    UserModel.is_bot,
+)
+
 class SessionRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -20,49 +34,61 @@ class SessionRepository:
         )
         
         self.db.add(session_model)
-        await self.db.commit()
+        await commit_or_flush(self.db)
+        session_cache.put(session_token, CachedSession(player.id, session_model.table_id, player.role))
         return session_token
     
-    async def get_player_from_session(self, session_token: str) -> Optional[Player]:
+    async def get_player_from_session(self, session_token: str, include_hand: bool = True) -> Optional[Player]:
+        """
+        Resolve a session token to its player in one joined query. Callers
+        that only need the player's identity can pass include_hand=False to
+        skip loading and decoding the hand (the player's hand is then empty).
+        """
+        columns = list(_SESSION_PLAYER_COLUMNS)
+        if include_hand:
+            columns += [PlayerModel.hand_codes, PlayerModel.hand]
+
         result = await self.db.execute(
-            select(SessionModel).where(SessionModel.session_token == session_token)
+            select(*columns)
+            .select_from(SessionModel)
+            .join(PlayerModel, PlayerModel.id == SessionModel.player_id)
+            .join(UserModel, UserModel.id == PlayerModel.user_id)
+            .where(SessionModel.session_token == session_token)
         )
-        session_model = result.scalar_one_or_none()
+        row = result.first()
         
-        if not session_model:
+        if not row:
             return None
         
-        # Get the player
-        result = await self.db.execute(
-            select(PlayerModel).where(PlayerModel.id == session_model.player_id)
+        return Player(
+            id=row.id,
+            user_id=row.user_id,
+            username=row.username,
+            hand=load_cards(row.hand_codes, row.hand) if include_hand else [],
+            is_online=row.is_online,
+            is_bot=row.is_bot,
+            uno_declaration=row.uno_declaration,
+            role=row.role
         )
-        player_model = result.scalar_one_or_none()
-        
-        if not player_model:
-            return None
-        
-        # Get the user associated with this player
+    
+    async def get_session(self, session_token: str) -> Optional[CachedSession]:
+        """Player id, table id and role of a session, served from the session cache when possible"""
+        cached = session_cache.get(session_token)
+        if cached:
+            return cached
+
         result = await self.db.execute(
-            select(UserModel).where(UserModel.id == player_model.user_id)
+            select(SessionModel.player_id, SessionModel.table_id, PlayerModel.role)
+            .join(PlayerModel, PlayerModel.id == SessionModel.player_id)
+            .where(SessionModel.session_token == session_token)
         )
-        user_model = result.scalar_one_or_none()
-        
-        if not user_model:
+        row = result.first()
+        if not row:
             return None
-        
-        # Convert hand from JSON to Card objects
-        hand = [Card(**card) for card in player_model.hand]
-        
-        return Player(
-            id=player_model.id,
-            user_id=player_model.user_id, # <-- ADD THIS
-            username=user_model.username,
-            hand=hand,
-            is_online=player_model.is_online,
-            is_bot=user_model.is_bot, # <-- ADD FIX HERE
-            uno_declaration=player_model.uno_declaration,
-            role=player_model.role
-        )
+
+        cached = CachedSession(row.player_id, row.table_id, row.role)
+        session_cache.put(session_token, cached)
+        return cached
     
     async def get_table_from_session(self, session_token: str) -> Optional[str]:
         result = await self.db.execute(
@@ -76,7 +102,8 @@ class SessionRepository:
         return str(session_model.table_id)
     
     async def remove_session(self, session_token: str):
+        session_cache.invalidate(session_token)
         await self.db.execute(
             delete(SessionModel).where(SessionModel.session_token == session_token)
         )
-        await self.db.commit()
\ No newline at end of file
+        await commit_or_flush(self.db)
\ No newline at end of file
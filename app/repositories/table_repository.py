@@ -1,11 +1,24 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
-from app.database.models import TableModel, PlayerModel, GameStateModel, UserModel
+from sqlalchemy import and_, func, or_, select, update, delete
+from sqlalchemy.orm import joinedload
+from app.database.models import TableModel, PlayerModel, GameStateModel
+from app.database.unit_of_work import commit_or_flush
 from app.models import PlayerRole, Table, Player, GameState, Card
-from typing import List, Optional
+from app.schemas import GameStatus
+from app.repositories.game_state_repository import apply_pending_events, game_state_from_model
+from app.repositories.player_repository import player_from_model
+from app.utils.card_codec import encode_cards
+from app.utils.session_cache import session_cache
+from typing import List, Optional, Tuple
 import uuid
 import time
 
+# Session.info key of a {table_id: (Table, GameState)} dict. A session that
+# has one keeps every table it loads in memory and returns the same objects
+# from later loads (the per-table actors do this).
+PINNED_TABLES_KEY = "pinned_tables"
+
+
 class TableRepository:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -26,9 +39,9 @@ class TableRepository:
         game_state_model = GameStateModel(table_id=table_id)
         self.db.add(game_state_model)
         
-        await self.db.commit()
+        await commit_or_flush(self.db)
         
-        return Table(
+        table = Table(
             id=table_id,
             name=name,
             players=[],
@@ -38,51 +51,57 @@ class TableRepository:
             created_at=table_model.created_at,
             creator_id=creator_id # <-- ADD THIS
         )
+        table.mark_clean()
+        return table
     
     async def get_table(self, table_id: uuid.UUID) -> Optional[Table]:
+        table, _ = await self.get_table_with_game_state(table_id)
+        return table
+
+    async def get_table_with_game_state(self, table_id: uuid.UUID) -> Tuple[Optional[Table], Optional[GameState]]:
+        """
+        Load a table, its players and spectators (with their users) and its
+        game state in a single SELECT. For a game in progress, one more
+        query fetches the game events newer than the stored snapshot.
+
+        Sessions that keep tables in memory (see PINNED_TABLES_KEY) get the
+        pinned objects back without a query.
+        """
+        pinned = self.db.info.get(PINNED_TABLES_KEY)
+        if pinned is not None and table_id in pinned:
+            return pinned[table_id]
+
         result = await self.db.execute(
-            select(TableModel).where(TableModel.id == table_id)
+            select(TableModel)
+            .where(TableModel.id == table_id)
+            .options(
+                joinedload(TableModel.players).joinedload(PlayerModel.user),
+                joinedload(TableModel.game_state),
+            )
+            # Rows may already be in the identity map from an earlier load in
+            # this session; always refresh them so callers see fresh data.
+            .execution_options(populate_existing=True)
         )
-        table_model = result.scalar_one_or_none()
+        table_model = result.unique().scalar_one_or_none()
         
         if not table_model:
-            return None
-        
-        # Get all players for this table
-        result = await self.db.execute(
-            select(PlayerModel).where(PlayerModel.table_id == table_id)
-        )
-        player_models = result.scalars().all()
+            return None, None
         
         players = []
         spectators = []
-        for player_model in player_models:
-            # Get the user associated with this player
-            result = await self.db.execute(
-                select(UserModel).where(UserModel.id == player_model.user_id)
-            )
-            user_model = result.scalar_one_or_none()
-            
-            if user_model:
-                hand = [Card(**card) for card in player_model.hand]
-                player = Player(
-                    id=player_model.id,
-                    user_id=player_model.user_id, # <-- ADD THIS
-                    username=user_model.username,
-                    hand=hand,
-                    is_online=player_model.is_online,
-                    is_bot=user_model.is_bot, # <-- THE CRITICAL FIX
-                    uno_declaration=player_model.uno_declaration,
-                    role=player_model.role
-                )
-                
-                # Separate players and spectators based on role
-                if player_model.role == PlayerRole.SPECTATOR:
-                    spectators.append(player)
-                else:
-                    players.append(player)
+        for player_model in table_model.players:
+            if not player_model.user:
+                continue
+
+            player = player_from_model(player_model, player_model.user)
+
+            # Separate players and spectators based on role
+            if player_model.role == PlayerRole.SPECTATOR:
+                spectators.append(player)
+            else:
+                players.append(player)
         
-        return Table(
+        table = Table(
             id=table_model.id,
             name=table_model.name,
             players=players,
@@ -90,106 +109,131 @@ class TableRepository:
             max_players=table_model.max_players,
             status=table_model.status,
             created_at=table_model.created_at,
-            creator_id=table_model.creator_id # <-- ADD THIS
+            creator_id=table_model.creator_id
         )
+        # Players changed by newer events stay dirty until the next snapshot
+        table.mark_clean()
+        game_state = None
+        if table_model.game_state:
+            game_state = game_state_from_model(table_model.game_state)
+            await apply_pending_events(self.db, table, game_state)
+        if pinned is not None:
+            pinned[table_id] = (table, game_state)
+        return table, game_state
     
     async def update_table(self, table: Table):
-        # Update table metadata
-        await self.db.execute(
-            update(TableModel)
-            .where(TableModel.id == table.id)
-            .values(
-                status=table.status,
-                max_players=table.max_players
+        """
+        Write back only what changed since the table was loaded: the table
+        row if its status/size changed, and all modified players in one
+        batched (executemany) UPDATE.
+        """
+        if table.is_dirty:
+            await self.db.execute(
+                update(TableModel)
+                .where(TableModel.id == table.id)
+                .values(
+                    status=table.status,
+                    max_players=table.max_players
+                )
             )
-        )
         
         # Update players (both regular players and spectators)
-        for player in table.players + table.spectators:
-            hand_data = [card.dict() for card in player.hand]
+        dirty_players = table.dirty_players()
+        if dirty_players:
             await self.db.execute(
-                update(PlayerModel)
-                .where(PlayerModel.id == player.id)
-                .values(
-                    hand=hand_data,
-                    is_online=player.is_online,
-                    uno_declaration=player.uno_declaration,
-                    role=player.role  # Update role as well
-                )
+                update(PlayerModel),
+                [{
+                    "id": player.id,
+                    "hand": None,
+                    "hand_codes": encode_cards(player.hand),
+                    "uno_declaration": player.uno_declaration,
+                    "role": player.role
+                } for player in dirty_players]
             )
+            for player in dirty_players:
+                if player.role_changed:
+                    session_cache.invalidate_player(player.id)
         
-        await self.db.commit()
+        await commit_or_flush(self.db)
+        table.mark_clean()
     
     async def delete_table(self, table_id: uuid.UUID):
         await self.db.execute(
             delete(TableModel).where(TableModel.id == table_id)
         )
-        await self.db.commit()
-    async def get_all_tables(self) -> List[Table]:
-        result = await self.db.execute(select(TableModel))
-        table_models = result.scalars().all()
-
-        tables: List[Table] = []
-        for table_model in table_models:
-            # Fetch players for this table
-            result = await self.db.execute(
-                select(PlayerModel).where(PlayerModel.table_id == table_model.id)
-            )
-            player_models = result.scalars().all()
+        await commit_or_flush(self.db)
 
-            players = []
-            for player_model in player_models:
-                # Get the user associated with this player
-                result = await self.db.execute(
-                    select(UserModel).where(UserModel.id == player_model.user_id)
-                )
-                user_model = result.scalar_one_or_none()
-                
-                if user_model:
-                    hand = [Card(**card) for card in player_model.hand]
-                    player = Player(
-                        id=player_model.id,
-                        username=user_model.username,  # Get username from UserModel
-                        hand=hand,
-                        is_online=player_model.is_online,
-                        is_bot=user_model.is_bot,  # <-- THE CRITICAL FIX
-                        uno_declaration=player_model.uno_declaration,
-                        role=player_model.role
-                    )
-                    players.append(player)
-
-            tables.append(
-                Table(
-                    id=table_model.id,
-                    name=table_model.name,
-                    players=players,
-                    max_players=table_model.max_players,
-                    status=table_model.status,
-                    created_at=table_model.created_at,
-                )
-            )
+    async def list_tables(
+        self,
+        status: Optional[GameStatus] = None,
+        include_completed: bool = False,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Lobby listing: one aggregate query with player/spectator counts per
+        table, newest first. Hands are never loaded.
 
-        return tables
+        Pagination is keyset based; pass the returned cursor back to get the
+        next page. Returns (tables, next_cursor).
+        """
+        player_count = func.count(PlayerModel.id).filter(PlayerModel.role != PlayerRole.SPECTATOR)
+        spectator_count = func.count(PlayerModel.id).filter(PlayerModel.role == PlayerRole.SPECTATOR)
 
-    
-    async def list_tables(self) -> List[dict]:
-        result = await self.db.execute(select(TableModel))
-        table_models = result.scalars().all()
-        
-        tables = []
-        for table_model in table_models:
-            # Get player count
-            result = await self.db.execute(
-                select(PlayerModel).where(PlayerModel.table_id == table_model.id)
+        query = (
+            select(
+                TableModel.id,
+                TableModel.name,
+                TableModel.max_players,
+                TableModel.status,
+                TableModel.created_at,
+                player_count.label("player_count"),
+                spectator_count.label("spectator_count")
             )
-            player_count = len(result.scalars().all())
-            
-            tables.append({
-                "id": str(table_model.id),
-                "name": table_model.name,
-                "player_count": player_count,
-                "max_players": table_model.max_players,
-                "status": table_model.status.value
-            })
-        
-        return tables
\ No newline at end of file
+            .outerjoin(PlayerModel, PlayerModel.table_id == TableModel.id)
+            .group_by(TableModel.id)
+            .order_by(TableModel.created_at.desc(), TableModel.id.desc())
+            .limit(limit + 1)
+        )
+
+        if status is not None:
+            query = query.where(TableModel.status == status)
+        elif not include_completed:
+            query = query.where(TableModel.status != GameStatus.COMPLETED)
+
+        if cursor:
+            cursor_created_at, cursor_id = _decode_lobby_cursor(cursor)
+            query = query.where(or_(
+                TableModel.created_at < cursor_created_at,
+                and_(TableModel.created_at == cursor_created_at, TableModel.id < cursor_id)
+            ))
+
+        result = await self.db.execute(query)
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_lobby_cursor(rows[-1].created_at, rows[-1].id)
+
+        tables = [{
+            "id": str(row.id),
+            "name": row.name,
+            "player_count": row.player_count,
+            "spectator_count": row.spectator_count,
+            "max_players": row.max_players,
+            "status": row.status.value
+        } for row in rows]
+
+        return tables, next_cursor
+
+
+def _encode_lobby_cursor(created_at, table_id: uuid.UUID) -> str:
+    return f"{created_at}_{table_id}"
+
+
+def _decode_lobby_cursor(cursor: str):
+    """Parse a lobby cursor; raises ValueError if it is malformed"""
+    created_at, _, table_id = cursor.partition("_")
+    created_at_value = float(created_at) if "." in created_at else int(created_at)
+    return created_at_value, uuid.UUID(table_id)
@@ -7,6 +7,7 @@ from fastapi import Depends
 
 from app.database.database import get_db
 from app.models import Player
+from app.utils.session_cache import CachedSession
 
 class DBSessionManager:
     def __init__(self, db: AsyncSession):
@@ -17,8 +18,11 @@ class DBSessionManager:
     async def create_session(self, player: Player, table_id: str) -> str:
         return await self.session_repo.create_session(player, table_id)
     
-    async def get_player_from_session(self, session_token: str) -> Optional[Player]:
-        return await self.session_repo.get_player_from_session(session_token)
+    async def get_player_from_session(self, session_token: str, include_hand: bool = True) -> Optional[Player]:
+        return await self.session_repo.get_player_from_session(session_token, include_hand)
+    
+    async def get_session(self, session_token: str) -> Optional[CachedSession]:
+        return await self.session_repo.get_session(session_token)
     
     async def get_table_from_session(self, session_token: str) -> Optional[str]:
         return await self.session_repo.get_table_from_session(session_token)
@@ -28,13 +32,8 @@ class DBSessionManager:
         
 
     async def update_player_online_status(self, player_id: UUID, is_online: bool):
-        """Update a player's online status"""
-        from app.repositories.player_repository import PlayerRepository
-        player_repo = PlayerRepository(self.db)
-        player = await player_repo.get_player(player_id)
-        if player:
-            player.is_online = is_online
-            await player_repo.update_player(player)
+        """Update a player's online status right away (websockets go through PresenceTracker)"""
+        await self.player_repo.set_online([player_id], is_online)
 
 # Factory function to get session manager
 async def get_session_manager(db: AsyncSession = Depends(get_db)):
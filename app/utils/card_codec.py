@@ -0,0 +1,87 @@
+"""
+Compact binary encoding for cards: one byte per card.
+
+Duplicate cards in the 108-card deck are interchangeable, so each distinct
+card face gets a code:
+
+    0-51   coloured cards: color_index * 13 + face
+           (face 0-9 = number, 10 = skip, 11 = reverse, 12 = draw two)
+    52-61  wild cards: 52 + type_index * 5 + color_index, where the color is
+           WILD until a player chooses one when playing it
+
+A hand or pile is stored as the bytes of its codes, in order. Cards are
+immutable, so decoding hands out one shared Card instance per code.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.models import Card
+from app.schemas import CardColor, CardType
+
+_COLORS = [CardColor.RED, CardColor.YELLOW, CardColor.GREEN, CardColor.BLUE]
+_FACES: List[Tuple[CardType, Optional[int]]] = (
+    [(CardType.NUMBER, value) for value in range(10)]
+    + [(CardType.SKIP, None), (CardType.REVERSE, None), (CardType.DRAW_TWO, None)]
+)
+_WILD_TYPES = [CardType.WILD, CardType.WILD_DRAW_FOUR]
+_WILD_COLORS = [CardColor.WILD] + _COLORS
+
+_CODE_TO_FIELDS: List[Tuple[CardColor, CardType, Optional[int]]] = (
+    [(color, card_type, value) for color in _COLORS for card_type, value in _FACES]
+    + [(color, card_type, None) for card_type in _WILD_TYPES for color in _WILD_COLORS]
+)
+_FIELDS_TO_CODE: Dict[Tuple[CardColor, CardType, Optional[int]], int] = {
+    fields: code for code, fields in enumerate(_CODE_TO_FIELDS)
+}
+
+_CODE_TO_CARD: List[Card] = [
+    Card(color=color, type=card_type, value=value) for color, card_type, value in _CODE_TO_FIELDS
+]
+
+CARD_CODE_COUNT = len(_CODE_TO_FIELDS)
+
+
+def card_to_code(card: Card) -> int:
+    """Return the one-byte code for a card"""
+    try:
+        return _FIELDS_TO_CODE[(CardColor(card.color), CardType(card.type), card.value)]
+    except (KeyError, ValueError):
+        raise ValueError(f"Cannot encode card {card!r}")
+
+
+def card_dict_to_code(card: dict) -> int:
+    """Return the code for a card in its dict form ({"color", "type", "value"})"""
+    try:
+        return _FIELDS_TO_CODE[(CardColor(card["color"]), CardType(card["type"]), card.get("value"))]
+    except (KeyError, ValueError):
+        raise ValueError(f"Cannot encode card {card!r}")
+
+
+def code_to_card(code: int) -> Card:
+    """Return the Card for a code"""
+    try:
+        return _CODE_TO_CARD[code]
+    except IndexError:
+        raise ValueError(f"Invalid card code {code}")
+
+
+def encode_cards(cards: Iterable[Card]) -> bytes:
+    """Encode a hand or pile as bytes"""
+    return bytes(card_to_code(card) for card in cards)
+
+
+def decode_cards(data: bytes) -> List[Card]:
+    """Decode bytes produced by encode_cards"""
+    try:
+        return [_CODE_TO_CARD[code] for code in data]
+    except IndexError:
+        raise ValueError("Invalid card code in encoded cards")
+
+
+def load_cards(codes: Optional[bytes], legacy_json: Optional[list]) -> List[Card]:
+    """
+    Read cards from a row, preferring the binary column and falling back to
+    the legacy JSON column for rows that have not been migrated yet.
+    """
+    if codes is not None:
+        return decode_cards(codes)
+    return [Card(**card) for card in legacy_json or []]
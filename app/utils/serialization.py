@@ -1,6 +1,12 @@
-from typing import Dict
+import json
+from typing import Any, Dict
 from app.models import Player
 
+try:
+    import orjson
+except ImportError:  # optional, the standard json module is used instead
+    orjson = None
+
 
 from app.models import GameState, Table
 
@@ -41,3 +47,24 @@ def game_state_to_public_dict(game_state: GameState, table: Table) -> dict:
         "winner": str(game_state.winner) if game_state.winner else None,
         "players": [player_to_public_dict(p) for p in table.players]
     }
+
+
+def _to_json_value(obj: Any) -> Any:
+    """Fallback for values the JSON encoder does not know (models, UUIDs, ...)"""
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump(mode="json")
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+    return str(obj)
+
+
+def encode_message(message: Any) -> str:
+    """
+    Encode a websocket message to its text frame. Broadcasts call this once
+    and send the same frame to every recipient. Uses orjson when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(message, default=_to_json_value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(message, default=_to_json_value)
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set
+import time
+import uuid
+
+from app.core.config import SESSION_CACHE_SIZE, SESSION_CACHE_TTL
+from app.schemas import PlayerRole
+
+
+class CachedSession(NamedTuple):
+    """What a session token resolves to"""
+    player_id: uuid.UUID
+    table_id: uuid.UUID
+    role: PlayerRole
+
+
+class SessionCache:
+    """
+    In-process LRU cache of session token -> CachedSession. Entries expire
+    after `ttl` seconds; the least recently used entry is dropped once
+    `max_size` tokens are cached. Writers must invalidate tokens whose
+    session, player or role changes.
+    """
+
+    def __init__(self, max_size: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (CachedSession, expires_at)
+        self._tokens_by_player: Dict[uuid.UUID, Set[str]] = {}
+
+    def get(self, session_token: str) -> Optional[CachedSession]:
+        entry = self._entries.get(session_token)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        session, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.invalidate(session_token)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_token)
+        self.hits += 1
+        return session
+
+    def put(self, session_token: str, session: CachedSession):
+        self.invalidate(session_token)
+        self._entries[session_token] = (session, time.monotonic() + self.ttl)
+        self._tokens_by_player.setdefault(session.player_id, set()).add(session_token)
+
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self.invalidate(oldest)
+
+    def invalidate(self, session_token: str):
+        entry = self._entries.pop(session_token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_player.get(entry[0].player_id)
+        if tokens is not None:
+            tokens.discard(session_token)
+            if not tokens:
+                del self._tokens_by_player[entry[0].player_id]
+
+    def invalidate_player(self, player_id: uuid.UUID):
+        """Drop every cached session of a player"""
+        for session_token in list(self._tokens_by_player.get(player_id, ())):
+            self.invalidate(session_token)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_player.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by every repository and connection in this process
+session_cache = SessionCache()
@@ -0,0 +1,16 @@
+from typing import Any, Callable, Dict, Sequence, TypeVar
+
+from app.core.config import SPECTATOR_SAMPLE_SIZE
+
+T = TypeVar("T")
+
+
+def summarize_spectators(spectators: Sequence[T], describe: Callable[[T], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    A table's spectators for clients: the count, and only the first
+    SPECTATOR_SAMPLE_SIZE of them described, since audiences can be large
+    """
+    return {
+        "spectators": [describe(spectator) for spectator in spectators[:SPECTATOR_SAMPLE_SIZE]],
+        "spectator_count": len(spectators),
+    }
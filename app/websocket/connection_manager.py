@@ -1,150 +1,332 @@
-from typing import Dict, List, Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 from app.models import Card, Player
+from app.schemas import PlayerRole
 from app.database.database import get_db
 from fastapi import WebSocket
 from fastapi.websockets import WebSocketDisconnect
-import json
+import asyncio
+import uuid
+from app.core.config import WS_SEND_TIMEOUT
 from app.session_manager import DBSessionManager as session_manager
+from app.websocket.event_bus import EventBus, player_channel, table_channel
+from app.websocket.event_log import TableEventLog
+from app.websocket.outbox import BatchFrame, Outbox
+from app.websocket.presence import PresenceTracker
+from app.websocket.spectators import SpectatorFeed
+from app.websocket.protocol import decode_frame, encode_frame, select_subprotocol
+from app.websocket.state_sync import FULL, SyncedStream, diff_hand, diff_public_state
 import time
 from starlette.websockets import WebSocketState
 
 
+# Message types where only the newest unsent one matters
+CONFLATED_MESSAGE_TYPES = {"game_state", "your_hand"}
+
+
+def _encode_batch(messages: List[dict], protocol: Optional[str] = None):
+    """A batch frame, or the lone message once superseded ones were taken out"""
+    message = messages[0] if len(messages) == 1 else {"type": "batch", "data": messages}
+    return encode_frame(message, protocol)
+
+
+class ConnectionRecord:
+    """Everything the manager knows about one socket"""
+
+    __slots__ = (
+        "websocket", "session_token", "table_id", "player_id", "spectator", "protocol", "outbox", "state", "detached"
+    )
+
+    def __init__(self, websocket: WebSocket, session_token: str, table_id: str):
+        self.websocket = websocket
+        self.session_token = session_token
+        self.table_id = table_id
+        self.player_id: Optional[str] = None
+        self.spectator = False  # served by the throttled spectator feed
+        self.protocol: Optional[str] = None  # negotiated subprotocol, None = JSON
+        self.outbox: Optional[Outbox] = None
+        self.state = "connecting"  # "connecting"|"connected"|"disconnecting"|"evicted"
+        self.detached = False  # removed from the indexes, gets no more messages
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
-        self.websocket_to_session: Dict[WebSocket, str] = {}
-        self.websocket_to_table: Dict[WebSocket, str] = {}
-        # CRITICAL FIX: Track connection states to prevent duplicate processing
-        self.connection_states: Dict[WebSocket, str] = {}  # websocket -> "connecting"|"connected"|"disconnecting"
+        # One record per socket, plus indexes of the sockets by table,
+        # player and session; every socket is in them once, so removing it
+        # is O(1)
+        self.connections: Dict[WebSocket, ConnectionRecord] = {}
+        self.active_connections: Dict[str, Set[WebSocket]] = {}  # table_id -> sockets of players
+        self.spectator_connections: Dict[str, Set[WebSocket]] = {}  # table_id -> sockets of spectators
+        self.player_connections: Dict[str, Set[WebSocket]] = {}  # player_id -> sockets
+        self.session_connections: Dict[str, Set[WebSocket]] = {}  # session token -> sockets
+        # Delta sync: game_state per table and your_hand per player, sent as
+        # deltas to sockets that acknowledged a version
+        self.state_stream = SyncedStream("game_state", "game_state_delta", "seq", diff_public_state)
+        self.hand_stream = SyncedStream("your_hand", "hand_delta", "version", diff_hand)
+        # Recent messages per table, replayed to clients that reconnect
+        self.event_log = TableEventLog()
+        # Players' online status, written to the database in debounced batches
+        self.presence = PresenceTracker()
+        # Spectators get a table's public messages conflated and rate limited
+        self.spectator_feed = SpectatorFeed(self._send_to_spectators)
+        # Pub/sub with other workers serving the same tables (see use_bus)
+        self.bus: Optional[EventBus] = None
+        self.worker_id = uuid.uuid4().hex
+        self.bus_listeners: List[Callable[[str, dict], Awaitable[None]]] = []  # other message kinds
     
     async def get_session_manager(self):
         # Create a new session manager instance with a database session
         async for db in get_db():
             return session_manager(db)
         
-    async def connect(self, websocket: WebSocket, session_token: str, table_id: str, session_manager: session_manager):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        session_token: str,
+        table_id: str,
+        session_manager: session_manager,
+        last_seq: Optional[int] = None
+    ) -> bool:
+        """
+        Accept and register a socket. A reconnecting client passes the last
+        event_seq it saw and is sent the messages it missed; returns False
+        if they are no longer logged and the client needs a snapshot.
+        """
         # CRITICAL FIX: Prevent duplicate connections
-        if websocket in self.connection_states:
-            print(f"WebSocket already in connection state: {self.connection_states[websocket]}")
-            return
+        if websocket in self.connections:
+            print(f"WebSocket already in connection state: {self.connections[websocket].state}")
+            return False
             
         print(f"CONNECT: Setting up connection for session {session_token[:8]}... to table {table_id}")
-        self.connection_states[websocket] = "connecting"
+        record = self.connections[websocket] = ConnectionRecord(websocket, session_token, table_id)
+        try:
+            replayed = await self._register(record, session_manager, last_seq)
+        except Exception:
+            # Never keep a socket that failed half way through connecting
+            await self._detach(record)
+            self.connections.pop(websocket, None)
+            raise
+        
+        # Mark as connected, unless the socket failed meanwhile
+        if record.state == "connecting":
+            record.state = "connected"
+        print(f"CONNECT: Successfully connected session {session_token[:8]}...")
+        return replayed
+
+    async def _register(self, record: ConnectionRecord, session_manager: session_manager, last_seq: Optional[int]) -> bool:
+        websocket, session_token, table_id = record.websocket, record.session_token, record.table_id
         
-        await websocket.accept()
+        # Clients may offer the binary subprotocol; everyone else gets JSON
+        record.protocol = select_subprotocol(getattr(websocket, "scope", {}).get("subprotocols", ()))
+        await websocket.accept(subprotocol=record.protocol)
+        record.outbox = Outbox(websocket, self._evict)
         
         # CRITICAL FIX: Remove any existing connection for this session WITHOUT triggering events
-        await self._silent_remove_session_connections(session_token, session_manager)
-        
-        # Store the connection
-        if table_id not in self.active_connections:
-            self.active_connections[table_id] = []
+        await self._silent_remove_session_connections(session_token)
         
-        # Check if this websocket is already in the connections
-        if websocket not in self.active_connections[table_id]:
-            self.active_connections[table_id].append(websocket)
+        session = await session_manager.get_session(session_token)
+        record.spectator = session is not None and session.role == PlayerRole.SPECTATOR
         
-        # Map WebSocket to session token and table
-        self.websocket_to_session[websocket] = session_token
-        self.websocket_to_table[websocket] = table_id
+        # Store the connection, indexed by table (players and spectators
+        # apart), session and player
+        if not self._has_sockets(table_id):
+            self.event_log.retain(table_id)
+            await self._bus_call("subscribe", table_channel(table_id))
+        table_index = self.spectator_connections if record.spectator else self.active_connections
+        table_index.setdefault(table_id, set()).add(websocket)
+        self.session_connections.setdefault(session_token, set()).add(websocket)
         
         # CRITICAL FIX: Only mark as online, don't broadcast anything yet
-        player = await session_manager.get_player_from_session(session_token)
-        if player:
-            await session_manager.update_player_online_status(player.id, True)
+        if session:
+            player_id = str(session.player_id)
+            if player_id not in self.player_connections:
+                await self._bus_call("subscribe", player_channel(player_id))
+            self.player_connections.setdefault(player_id, set()).add(websocket)
+            record.player_id = player_id
+            self.presence.set(player_id, True)
         
-        # Mark as connected
-        self.connection_states[websocket] = "connected"
-        print(f"CONNECT: Successfully connected session {session_token[:8]}...")
+        # Replay before marking as connected, so no batch falls in between
+        return last_seq is not None and self._replay(record, last_seq)
+
+    def _replay(self, record: ConnectionRecord, last_seq: int) -> bool:
+        """Queue the logged messages after `last_seq` for a reconnecting socket"""
+        messages = self.event_log.since(record.table_id, last_seq, record.player_id)
+        if messages is None:
+            return False
+        self._put_frame(record, self._encode_frame(messages, (FULL, FULL), (FULL, FULL), record.protocol))
+        return True
         
-    async def _silent_remove_session_connections(self, session_token: str, session_manager: session_manager):
+    async def _silent_remove_session_connections(self, session_token: str):
         """Remove all connections for a session silently (no broadcasts)"""
-        websockets_to_remove = []
-        
-        for ws, token in list(self.websocket_to_session.items()):
-            if token == session_token and ws in self.connection_states:
-                print(f"CLEANUP: Found existing connection for session {token[:8]}...")
-                websockets_to_remove.append(ws)
+        websockets_to_remove = [
+            ws for ws in self.session_connections.get(session_token, ())
+            if ws in self.connections
+        ]
         
         for ws in websockets_to_remove:
-            await self._silent_disconnect(ws, session_manager)
+            print(f"CLEANUP: Found existing connection for session {session_token[:8]}...")
+            await self._silent_disconnect(ws)
 
-    async def disconnect(self, websocket: WebSocket, session_manager: session_manager):
-        """Public disconnect method"""
-        if websocket not in self.connection_states:
+    async def disconnect(self, websocket: WebSocket, session_manager: session_manager = None):
+        """
+        Public disconnect method. It needs no database session;
+        session_manager is only kept for existing callers.
+        """
+        record = self.connections.get(websocket)
+        if record is None:
             return
             
-        if self.connection_states[websocket] == "disconnecting":
+        if record.state == "disconnecting":
             print("Already disconnecting this WebSocket")
             return
             
-        self.connection_states[websocket] = "disconnecting"
-        
-        # Get session info before cleanup
-        session_token = self.websocket_to_session.get(websocket)
-        table_id = self.websocket_to_table.get(websocket)
-        
-        if session_token:
-            print(f"DISCONNECT: Disconnecting session {session_token[:8]}... from table {table_id}")
-        
-        await self._cleanup_connection(websocket, session_manager)
-        
-        # Remove from connection states last
-        if websocket in self.connection_states:
-            del self.connection_states[websocket]
+        record.state = "disconnecting"
+        print(f"DISCONNECT: Disconnecting session {record.session_token[:8]}... from table {record.table_id}")
+        await self._cleanup_connection(record)
 
-    async def _silent_disconnect(self, websocket: WebSocket, session_manager: session_manager):
+    async def _silent_disconnect(self, websocket: WebSocket):
         """Silent disconnect (no broadcasts, used for cleanup)"""
-        if websocket not in self.connection_states:
+        record = self.connections.get(websocket)
+        if record is None:
             return
             
-        self.connection_states[websocket] = "disconnecting"
-        await self._cleanup_connection(websocket, session_manager)
-        
-        if websocket in self.connection_states:
-            del self.connection_states[websocket]
+        record.state = "disconnecting"
+        await self._cleanup_connection(record)
     
-    async def _cleanup_connection(self, websocket: WebSocket, session_manager: session_manager):
-        """Clean up connection mappings and update player status"""
-        session_token = self.websocket_to_session.get(websocket)
-        table_id = self.websocket_to_table.get(websocket)
-        
-        # Remove from active connections
-        if table_id and table_id in self.active_connections:
-            if websocket in self.active_connections[table_id]:
-                self.active_connections[table_id].remove(websocket)
-            if not self.active_connections[table_id]:
-                del self.active_connections[table_id]
-        
-        # Remove from mappings
-        if websocket in self.websocket_to_session:
-            del self.websocket_to_session[websocket]
-        if websocket in self.websocket_to_table:
-            del self.websocket_to_table[websocket]
+    async def _cleanup_connection(self, record: ConnectionRecord):
+        """Forget the socket and update player status"""
+        await self._detach(record)
+        if self.connections.get(record.websocket) is record:
+            del self.connections[record.websocket]
         
         # CRITICAL FIX: Only mark as offline if no other connections exist for this session
-        if session_token:
-            has_other_connections = any(
-                token == session_token and ws != websocket 
-                for ws, token in self.websocket_to_session.items()
-            )
-            
-            if not has_other_connections:
-                print(f"CLEANUP: Marking player offline for session {session_token[:8]}...")
-                player = await session_manager.get_player_from_session(session_token)
-                if player:
-                    await session_manager.update_player_online_status(player.id, False)
-            else:
-                print(f"CLEANUP: Player still has other connections, keeping online")
+        if record.session_token not in self.session_connections:
+            print(f"CLEANUP: Marking player offline for session {record.session_token[:8]}...")
+            if record.player_id:
+                self.presence.set(record.player_id, False)
+        else:
+            print(f"CLEANUP: Player still has other connections, keeping online")
+
+    async def _detach(self, record: ConnectionRecord):
+        """Take a socket out of the indexes and stop its outbox, once"""
+        if record.detached:
+            return
+        record.detached = True
+        websocket = record.websocket
+        if record.outbox is not None:
+            record.outbox.close()
+        self.state_stream.bases.pop(websocket, None)
+        self.hand_stream.bases.pop(websocket, None)
+        
+        if record.spectator:
+            self._unindex(self.spectator_connections, record.table_id, websocket)
+            if record.table_id not in self.spectator_connections:
+                self.spectator_feed.forget(record.table_id)
+        else:
+            self._unindex(self.active_connections, record.table_id, websocket)
+        if not self._has_sockets(record.table_id):
+            self.state_stream.history.forget(record.table_id)
+            self.event_log.release(record.table_id)
+            await self._bus_call("unsubscribe", table_channel(record.table_id))
+        self._unindex(self.session_connections, record.session_token, websocket)
+        self._unindex(self.player_connections, record.player_id, websocket)
+        if record.player_id and record.player_id not in self.player_connections:
+            self.hand_stream.history.forget(record.player_id)
+            await self._bus_call("unsubscribe", player_channel(record.player_id))
+    
+    def _has_sockets(self, table_id: str) -> bool:
+        return table_id in self.active_connections or table_id in self.spectator_connections
+
+    @staticmethod
+    def _unindex(index: Dict[str, Set[WebSocket]], key: Optional[str], websocket: WebSocket):
+        """Remove a socket from one index entry, dropping the entry once empty"""
+        connections = index.get(key) if key else None
+        if connections is None:
+            return
+        connections.discard(websocket)
+        if not connections:
+            del index[key]
     
+    async def use_bus(self, bus: Optional[EventBus]):
+        """
+        Share broadcasts with other workers through `bus` (None to stop).
+        Subscribes to the tables and players this worker has sockets for.
+        """
+        if self.bus is not None:
+            await self.bus.close()
+        self.bus = bus
+        if bus is None:
+            return
+        await bus.start(self._on_bus_message)
+        for table_id in {*self.active_connections, *self.spectator_connections}:
+            await bus.subscribe(table_channel(table_id))
+        for player_id in tuple(self.player_connections):
+            await bus.subscribe(player_channel(player_id))
+
+    async def _bus_call(self, method: str, *args):
+        """Call the bus if there is one; a bus failure only costs remote delivery"""
+        if self.bus is None:
+            return
+        try:
+            await getattr(self.bus, method)(*args)
+        except Exception as e:
+            print(f"EVENT BUS: {method} failed: {e}")
+
+    async def _on_bus_message(self, channel: str, message: dict):
+        """Deliver what another worker published to this worker's sockets"""
+        if message.get("origin") == self.worker_id:
+            return
+        if message.get("kind") == "batch":
+            await self._deliver_batch(message["table_id"], message["entries"], message.get("seqs"))
+        elif message.get("kind") == "player":
+            await self._deliver_to_player(message["message"], message["player_id"])
+        else:
+            for listener in tuple(self.bus_listeners):
+                await listener(channel, message)
+
+    async def _evict(self, websocket: WebSocket, reason: str):
+        """
+        Drop a client whose sends fail or cannot keep up: it leaves the
+        indexes right away, whether or not closing it works, and its
+        endpoint's disconnect forgets it.
+        """
+        record = self.connections.get(websocket)
+        if record is not None and record.state != "disconnecting":
+            record.state = "evicted"
+            await self._detach(record)
+        try:
+            await asyncio.wait_for(websocket.close(code=1013, reason="Too slow"), WS_SEND_TIMEOUT)
+        except Exception as e:
+            print(f"EVICT: Error closing slow connection: {e}")
+
+    def connection_state(self, websocket: WebSocket) -> Optional[str]:
+        """"connecting", "connected", "disconnecting", "evicted", or None for an unknown socket"""
+        record = self.connections.get(websocket)
+        return record.state if record else None
+
+    async def drain(self):
+        """Wait until every outbox has been flushed"""
+        await asyncio.gather(*(
+            record.outbox.drain() for record in list(self.connections.values()) if record.outbox is not None
+        ))
+
+    @staticmethod
+    def _conflation_key(message: dict) -> Optional[str]:
+        message_type = message.get("type") if isinstance(message, dict) else None
+        return message_type if message_type in CONFLATED_MESSAGE_TYPES else None
+
     async def send_personal_message(self, message: dict, websocket: WebSocket):
+        self._send_frame(self._encode(message, websocket), websocket, self._conflation_key(message))
+
+    def _send_frame(self, frame: Union[str, bytes], websocket: WebSocket, key: Optional[str] = None):
+        """Queue an already encoded message on one socket's outbox"""
         try:
             # CRITICAL FIX: Check connection state before sending
-            if websocket not in self.connection_states:
+            record = self.connections.get(websocket)
+            if record is None:
                 print("SEND: WebSocket not in connection states, skipping")
                 return
                 
-            if self.connection_states[websocket] == "disconnecting":
+            if record.state in ("disconnecting", "evicted"):
                 print("SEND: WebSocket is disconnecting, skipping message")
                 return
                 
@@ -153,50 +335,254 @@ class ConnectionManager:
                 # Don't call disconnect here to avoid recursion
                 return
             
-            # Ensure all objects in the message are JSON serializable
-            serializable_message = self._make_serializable(message)
-            await websocket.send_text(json.dumps(serializable_message))
+            if record.outbox is not None:
+                record.outbox.put(frame, key)
             
-        except (RuntimeError, WebSocketDisconnect):
-            print("SEND: Connection closed during send")
-            # Don't call disconnect here to avoid recursion issues
         except Exception as e:
             print(f"SEND: Error sending message: {e}")
 
     async def broadcast_to_table(self, message: dict, table_id: str, exclude: WebSocket = None):
-        if table_id not in self.active_connections:
+        # Encode once, every recipient gets the same frame. Frames are only
+        # queued here; each connection's writer task sends them, so a slow
+        # client cannot hold up the table (or the action that broadcast).
+        await self.send_batch(table_id, [(None, message)], exclude=exclude)
+
+    async def send_batch(
+        self,
+        table_id: str,
+        entries: List[Tuple[Optional[str], dict]],
+        exclude: WebSocket = None
+    ):
+        """
+        Deliver the messages of one action as a single frame per socket.
+        `entries` are (player_id, message) pairs in order, player_id None
+        meaning everyone. A frame holding several messages is sent as
+        {"type": "batch", "data": [...]}, a lone message is sent as is.
+
+        game_state messages get the table's next sequence number and
+        personal your_hand messages the player's next hand version. Sockets
+        that acknowledged a version receive a game_state_delta / hand_delta
+        against it instead (see acknowledge_state and acknowledge_hand).
+
+        Every message carries the table's event_seq, which a client can
+        reconnect with to be sent what it missed (see connect).
+
+        Spectators are not sent the frames: the public messages go to the
+        spectator feed, which sends them conflated and rate limited. They
+        keep their event_seq, so spectators can reconnect with it too.
+
+        With a bus, the entries are also published for the sockets other
+        workers hold (`exclude` only applies to this worker).
+        """
+        seqs = self.event_log.number(table_id, len(entries))
+        if self.bus is not None:
+            await self._bus_call("publish", table_channel(table_id), {
+                "kind": "batch", "origin": self.worker_id, "table_id": table_id, "entries": entries, "seqs": seqs
+            })
+        await self._deliver_batch(table_id, entries, seqs, exclude)
+
+    async def _deliver_batch(
+        self,
+        table_id: str,
+        entries: List[Tuple[Optional[str], dict]],
+        seqs: Optional[List[int]] = None,
+        exclude: WebSocket = None
+    ):
+        """send_batch to the sockets of this worker"""
+        seqs = seqs or self.event_log.number(table_id, len(entries))
+        connections = self.active_connections.get(table_id)
+        if self._has_sockets(table_id):
+            entries = [(target, self._stamp(table_id, target, message)) for target, message in entries]
+        # Logged while the table's sockets are away too, for their reconnect
+        self.event_log.record(table_id, seqs, entries)
+        if table_id in self.spectator_connections:
+            self.spectator_feed.publish(table_id, [
+                {**message, "event_seq": seq} for seq, (target, message) in zip(seqs, entries) if target is None
+            ])
+        if not connections:
             return
-            
-        # Ensure all objects in the message are JSON serializable
-        serializable_message = self._make_serializable(message)
-        
-        # Create a list of connections to remove if they fail
-        connections_to_remove = []
-        
-        for connection in self.active_connections[table_id]:
-            if connection != exclude:
-                # CRITICAL FIX: Check connection state before broadcasting
-                if (connection in self.connection_states and 
-                    self.connection_states[connection] == "connected"):
-                    try:
-                        await connection.send_text(json.dumps(serializable_message))
-                    except (RuntimeError, WebSocketDisconnect):
-                        print("BROADCAST: Connection failed, marking for removal")
-                        connections_to_remove.append(connection)
-                    except Exception as e:
-                        print(f"BROADCAST: Error broadcasting message: {e}")
-                        connections_to_remove.append(connection)
-
-        # CRITICAL FIX: Clean up failed connections without causing cascading disconnects
-        for connection in connections_to_remove:
-            if connection in self.connection_states:
-                self.connection_states[connection] = "disconnecting"
+
+        personal_ids = {player_id for player_id, _ in entries if player_id is not None}
+        frames: Dict[tuple, Optional[Tuple[str, Optional[str], tuple]]] = {}
+
+        def frame_for(player_id: Optional[str], bases: tuple, protocol: Optional[str]):
+            if (player_id, bases, protocol) not in frames:
+                messages = []
+                state_base, hand_base = bases
+                for seq, (target, message) in zip(seqs, entries):
+                    if target is not None and target != player_id:
+                        continue
+                    message, state_base = self.state_stream.message_for(table_id, message, state_base)
+                    if message is not None and target is not None:
+                        message, hand_base = self.hand_stream.message_for(target, message, hand_base)
+                    if message is not None:
+                        messages.append({**message, "event_seq": seq})
+
+                frames[player_id, bases, protocol] = self._encode_frame(
+                    messages, bases, (state_base, hand_base), protocol
+                )
+            return frames[player_id, bases, protocol]
+
+        for connection in tuple(connections):
+            record = self.connections.get(connection)
+            if connection is exclude or record is None or record.state != "connected":
+                continue
+            player_id = record.player_id
+            bases = (self.state_stream.base(connection), self.hand_stream.base(connection))
+            frame = frame_for(player_id if player_id in personal_ids else None, bases, record.protocol)
+            self._put_frame(record, frame)
+
+    async def resync_table(self, table_id: str, state: dict, hands: Dict[str, list]):
+        """
+        Send a table's sockets the game state and every player's hand in
+        full, whatever versions they hold: the messages before were wrong
+        (their action was rolled back after being sent). Sockets follow
+        deltas again once they acknowledge the new versions.
+        """
+        for websocket in self.active_connections.get(table_id, ()):
+            self.state_stream.bases.pop(websocket, None)
+            self.hand_stream.bases.pop(websocket, None)
+        await self.send_batch(table_id, [
+            (None, {"type": "game_state", "data": state}),
+            *((player_id, {"type": "your_hand", "data": hand}) for player_id, hand in hands.items()),
+        ])
+
+    def _send_to_spectators(self, table_id: str, messages: List[dict]):
+        """Send a table's spectators one frame of conflated messages (see SpectatorFeed)"""
+        frames = {}
+        for websocket in tuple(self.spectator_connections.get(table_id, ())):
+            record = self.connections.get(websocket)
+            if record is None or record.state != "connected":
+                continue
+            if record.protocol not in frames:
+                frames[record.protocol] = self._encode_frame(messages, (FULL, FULL), (FULL, FULL), record.protocol)
+            self._put_frame(record, frames[record.protocol])
+
+    def _stamp(self, table_id: str, target: Optional[str], message: dict) -> dict:
+        """Give a game_state its sequence number and a personal your_hand its version"""
+        message = self.state_stream.stamp(table_id, message)
+        if target is not None:
+            message = self.hand_stream.stamp(target, message)
+        return message
+
+    def _protocol(self, websocket: WebSocket) -> Optional[str]:
+        record = self.connections.get(websocket)
+        return record.protocol if record else None
+
+    def _encode(self, message: dict, websocket: WebSocket):
+        """Encode a message in the protocol the socket negotiated"""
+        return encode_frame(message, self._protocol(websocket))
+
+    async def receive_message(self, websocket: WebSocket) -> dict:
+        """
+        Read and decode the next message from a socket, in the protocol it
+        negotiated. Raises FrameDecodeError for a malformed frame.
+        """
+        protocol = self._protocol(websocket)
+        frame = await (websocket.receive_bytes() if protocol else websocket.receive_text())
+        return decode_frame(frame, protocol)
+
+    def _encode_frame(self, messages: List[dict], bases: tuple, new_bases: tuple, protocol: Optional[str] = None):
+        """
+        (frame, conflation key, bases after it) for the messages one socket
+        gets. Several messages make a BatchFrame, which the outbox conflates
+        per message (unless they are deltas).
+        """
+        if not messages:
+            return None
+        # Deltas build on each other, so they are never conflated
+        conflated = bases == (FULL, FULL)
+        if len(messages) > 1:
+            if not conflated:
+                return encode_frame({"type": "batch", "data": messages}, protocol), None, new_bases
+            encode = lambda batch: _encode_batch(batch, protocol)
+            keys = [self._conflation_key(message) for message in messages]
+            return BatchFrame(messages, keys, encode, encode(messages)), None, new_bases
+        key = self._conflation_key(messages[0]) if conflated else None
+        return encode_frame(messages[0], protocol), key, new_bases
+
+    def _put_frame(self, record: ConnectionRecord, frame):
+        """Queue a frame from _encode_frame and move the socket's sync bases"""
+        if frame is None or record.outbox is None:
+            return
+        record.outbox.put(frame[0], frame[1])
+        for stream, base in zip((self.state_stream, self.hand_stream), frame[2]):
+            if base is not FULL:
+                stream.bases[record.websocket] = base
+
+    async def send_state_snapshot(self, websocket: WebSocket, table_id: str, state: dict):
+        """Send one socket the full public game state, with its sequence number"""
+        self._send_snapshot(self.state_stream, websocket, table_id, state)
+
+    async def send_hand_snapshot(self, websocket: WebSocket, player_id: str, hand: list):
+        """Send one socket the player's full hand, with its version"""
+        self._send_snapshot(self.hand_stream, websocket, str(player_id), hand)
+
+    def _send_snapshot(self, stream: SyncedStream, websocket: WebSocket, key: str, data):
+        message = stream.snapshot(key, data)
+        syncing = websocket in stream.bases
+        if syncing:
+            stream.bases[websocket] = message[stream.version_field]
+        self._send_frame(self._encode(message, websocket), websocket, None if syncing else stream.message_type)
+
+    async def acknowledge_state(self, websocket: WebSocket, table_id: str, seq: Optional[int]) -> bool:
+        """
+        A client reports it holds game state `seq` and wants deltas from now
+        on. Returns False if the client needs a snapshot that is not in
+        memory.
+        """
+        if self.state_stream.acknowledge(websocket, table_id, seq):
+            return True
+        return await self.resync_state(websocket, table_id)
+
+    async def resync_state(self, websocket: WebSocket, table_id: str) -> bool:
+        """
+        Send the newest recorded state in full (on a gap or on request).
+        Returns False if none is recorded and the caller must load one.
+        """
+        return self._resync(self.state_stream, websocket, table_id)
+
+    async def acknowledge_hand(self, websocket: WebSocket, version: Optional[int]) -> bool:
+        """
+        A client reports it holds hand `version` and wants hand_delta
+        messages from now on. Returns False if the client needs a hand that
+        is not in memory.
+        """
+        player_id = self._player_id(websocket)
+        if player_id is None:
+            return True
+        if self.hand_stream.acknowledge(websocket, player_id, version):
+            return True
+        return await self.resync_hand(websocket)
+
+    async def resync_hand(self, websocket: WebSocket) -> bool:
+        """
+        Send the player's newest recorded hand in full (on a version
+        mismatch or on request). Returns False if none is recorded and the
+        caller must load it.
+        """
+        player_id = self._player_id(websocket)
+        if player_id is None:
+            return True
+        return self._resync(self.hand_stream, websocket, player_id)
+
+    def _player_id(self, websocket: WebSocket) -> Optional[str]:
+        record = self.connections.get(websocket)
+        return record.player_id if record else None
+
+    def _resync(self, stream: SyncedStream, websocket: WebSocket, key: str) -> bool:
+        latest = stream.history.latest(key)
+        stream.bases[websocket] = None
+        if latest is None:
+            return False
+        self._send_snapshot(stream, websocket, key, latest[1])
+        return True
 
     async def get_table_connections(self, table_id: str) -> List[WebSocket]:
         """Get all WebSocket connections for a table"""
-        connections = self.active_connections.get(table_id, [])
+        connections = [*self.active_connections.get(table_id, ()), *self.spectator_connections.get(table_id, ())]
         # Only return connections that are actually connected
-        return [ws for ws in connections if ws in self.connection_states and self.connection_states[ws] == "connected"]
+        return [ws for ws in connections if self.connection_state(ws) == "connected"]
 
     
 
@@ -204,41 +590,44 @@ class ConnectionManager:
         """Check if a player is currently connected"""
         return await self.get_player_connection(player_id) is not None
 
-    def _make_serializable(self, obj):
-        """Recursively convert objects to JSON-serializable forms"""
-        if isinstance(obj, (str, int, float, bool, type(None))):
-            return obj
-        elif isinstance(obj, dict):
-            return {k: self._make_serializable(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._make_serializable(item) for item in obj]
-        elif hasattr(obj, 'to_dict'):
-            return obj.to_dict()
-        elif hasattr(obj, 'dict'):
-            return obj.dict()
-        elif hasattr(obj, '__dict__'):
-            return self._make_serializable(obj.__dict__)
-        else:
-            return str(obj)  # Fallback to string representation
-        
-    async def get_player_connection(self, player_id: str, session_manager) -> Optional[WebSocket]:
+    def _player_sockets(self, player_id: str) -> List[ConnectionRecord]:
+        """Records of a player's connected sockets, from the player index"""
+        records = (self.connections.get(ws) for ws in self.player_connections.get(str(player_id), ()))
+        return [record for record in records if record is not None and record.state == "connected"]
+
+    async def get_player_connection(self, player_id: str, session_manager=None) -> Optional[WebSocket]:
         """Get WebSocket connection for a specific player"""
-        for websocket, session_token in self.websocket_to_session.items():
-            if (websocket in self.connection_states and 
-                self.connection_states[websocket] == "connected"):
-                player = await session_manager.get_player_from_session(session_token)
-                if player and str(player.id) == player_id:
-                    return websocket
-        return None
-
-    # And update the send_to_player method:
-    async def send_to_player(self, message: dict, player_id: str, session_manager):
-        """Send a message to a specific player across all their connections"""
-        for websocket, session_token in self.websocket_to_session.items():
-            if (websocket in self.connection_states and 
-                self.connection_states[websocket] == "connected"):
-                player = await session_manager.get_player_from_session(session_token)
-                if player and str(player.id) == player_id:
-                    await self.send_personal_message(message, websocket)
+        records = self._player_sockets(player_id)
+        return records[0].websocket if records else None
+
+    async def send_to_player(self, message: dict, player_id: str, session_manager=None):
+        """
+        Send a message to a specific player across all their connections.
+        session_manager is no longer needed and only kept for existing callers.
+        """
+        if self.bus is not None:
+            await self._bus_call("publish", player_channel(str(player_id)), {
+                "kind": "player", "origin": self.worker_id, "player_id": str(player_id), "message": message
+            })
+        await self._deliver_to_player(message, player_id)
+
+    async def _deliver_to_player(self, message: dict, player_id: str):
+        """send_to_player to the sockets of this worker"""
+        records = self._player_sockets(player_id)
+        if not records:
+            return
+        player_id = str(player_id)
+        message = self.hand_stream.stamp(player_id, message)
+        frames = {}
+        for record in records:
+            base = self.hand_stream.base(record.websocket)
+            protocol = record.protocol
+            if (base, protocol) not in frames:
+                update, new_base = self.hand_stream.message_for(player_id, message, base)
+                frames[base, protocol] = self._encode_frame(
+                    [update] if update is not None else [], (FULL, base), (FULL, new_base), protocol
+                )
+            self._put_frame(record, frames[base, protocol])
+
 # Create a global instance
 manager = ConnectionManager()
\ No newline at end of file
@@ -0,0 +1,37 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.database.unit_of_work import UnitOfWork
+from app.websocket.connection_manager import manager
+
+
+class EventBatch:
+    """
+    Collects every message one game action sends to a table, so each client
+    receives a single frame for the action instead of one per event.
+    Messages for one player (like your_hand) are merged into that player's
+    frame; everyone else shares one frame. Order is preserved.
+    """
+
+    def __init__(self, table_id: str):
+        self.table_id = table_id
+        self.entries: List[Tuple[Optional[str], Dict[str, Any]]] = []  # (player_id or None for everyone, message)
+
+    @classmethod
+    def for_action(cls, uow: UnitOfWork, table_id: str) -> "EventBatch":
+        """A batch that is sent once the action's unit of work commits"""
+        batch = cls(table_id)
+        uow.after_commit(batch.send)
+        return batch
+
+    def add(self, message: Dict[str, Any]):
+        """Queue a message for everyone at the table"""
+        self.entries.append((None, message))
+
+    def add_personal(self, player_id: str, message: Dict[str, Any]):
+        """Queue a message for one player only"""
+        self.entries.append((str(player_id), message))
+
+    async def send(self):
+        if self.entries:
+            await manager.send_batch(self.table_id, self.entries)
+            self.entries = []
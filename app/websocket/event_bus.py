@@ -0,0 +1,153 @@
+"""
+Pub/sub between worker processes serving the same tables.
+
+A worker only holds the sockets of the clients connected to it, so the
+ConnectionManager publishes every table broadcast and player message on
+the bus and delivers what other workers publish to its own sockets. Each
+worker subscribes to the channels of the tables and players it has
+sockets for.
+
+RedisEventBus is the real backend; InMemoryEventBus connects managers in
+one process (tests, or a single worker). Without a bus (EVENT_BUS_URL
+unset) nothing is published, as before.
+"""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from app.utils.serialization import encode_message
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # only needed for RedisEventBus
+    redis_asyncio = None
+
+MessageHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+def table_channel(table_id: str) -> str:
+    return f"table:{table_id}"
+
+
+def player_channel(player_id: str) -> str:
+    return f"player:{player_id}"
+
+
+class EventBus:
+    """Interface of a pub/sub backend; messages are JSON-compatible dicts"""
+
+    async def start(self, handler: MessageHandler):
+        """Start delivering messages of subscribed channels to `handler(channel, message)`"""
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+
+class InMemoryBroker:
+    """The shared 'server' of InMemoryEventBus instances"""
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set["InMemoryEventBus"]] = {}
+
+
+class InMemoryEventBus(EventBus):
+    """
+    Bus between managers of one process. Messages go through JSON like on
+    Redis, so they arrive in the same shape.
+    """
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None):
+        self.broker = broker or InMemoryBroker()
+        self.channels: Set[str] = set()
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+        self.broker.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+        subscribers = self.broker.subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.broker.subscribers[channel]
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        payload = encode_message(message)
+        for bus in tuple(self.broker.subscribers.get(channel, ())):
+            if bus._handler is not None:
+                await bus._handler(channel, json.loads(payload))
+
+    async def close(self):
+        for channel in tuple(self.channels):
+            await self.unsubscribe(channel)
+        self._handler = None
+
+
+class RedisEventBus(EventBus):
+    """Bus over Redis pub/sub, one Redis channel per table and per player"""
+
+    def __init__(self, url: str, prefix: str = "uno:"):
+        if redis_asyncio is None:
+            raise RuntimeError("RedisEventBus needs the redis package")
+        self.prefix = prefix
+        self._redis = redis_asyncio.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._handler: Optional[MessageHandler] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: MessageHandler):
+        self._handler = handler
+        # A pubsub connection stops listening when it has no channels, so
+        # keep one subscription for the lifetime of the bus
+        await self._pubsub.subscribe(f"{self.prefix}bus")
+        self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        async for message in self._pubsub.listen():
+            if message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            channel = channel.decode() if isinstance(channel, bytes) else channel
+            try:
+                await self._handler(channel[len(self.prefix):], json.loads(message["data"]))
+            except Exception as e:
+                print(f"EVENT BUS: Error handling message on {channel}: {e}")
+
+    async def subscribe(self, channel: str):
+        await self._pubsub.subscribe(self.prefix + channel)
+
+    async def unsubscribe(self, channel: str):
+        await self._pubsub.unsubscribe(self.prefix + channel)
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self._redis.publish(self.prefix + channel, encode_message(message))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+
+
+def create_event_bus(url: Optional[str]) -> Optional[EventBus]:
+    """The bus for EVENT_BUS_URL: redis://... or memory://, None if unset"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return InMemoryEventBus()
+    return RedisEventBus(url)
@@ -8,16 +8,20 @@ from app.websocket.connection_manager import manager
 
 class EventHandler:
     @staticmethod
-    async def broadcast_game_event(table_id: str, event_type: str, data: dict, exclude=None):
+    async def broadcast_game_event(table_id: str, event_type: str, data: dict, exclude=None, batch=None):
+        """Broadcast an event now, or add it to an action's EventBatch if given"""
         event_message = {
             "type": event_type,
             "data": data,
             "timestamp": time.time()
         }
+        if batch is not None:
+            batch.add(event_message)
+            return
         await manager.broadcast_to_table(event_message, table_id, exclude=exclude)
 
 # Specific event functions
-async def broadcast_card_played(table_id: str, player_id: str, username: str, card, hand_count: int):
+async def broadcast_card_played(table_id: str, player_id: str, username: str, card, hand_count: int, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "card_played",
@@ -26,10 +30,11 @@ async def broadcast_card_played(table_id: str, player_id: str, username: str, ca
             "player_name": username,
             "card": card.to_dict() if hasattr(card, 'to_dict') else card,
             "hand_count": hand_count
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_card_drawn(table_id: str, player_id: str, username: str, count: int, hand_count: int):
+async def broadcast_card_drawn(table_id: str, player_id: str, username: str, count: int, hand_count: int, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "card_drawn",
@@ -38,20 +43,22 @@ async def broadcast_card_drawn(table_id: str, player_id: str, username: str, cou
             "player_name": username,
             "count": count,
             "hand_count": hand_count
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_turn_changed(table_id: str, player_id: str, username: str):
+async def broadcast_turn_changed(table_id: str, player_id: str, username: str, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "turn_changed",
         {
             "player_id": player_id,
             "player_name": username
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_player_joined(table_id: str, player, hand_count: int):
+async def broadcast_player_joined(table_id: str, player, hand_count: int, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "player_joined",
@@ -60,30 +67,33 @@ async def broadcast_player_joined(table_id: str, player, hand_count: int):
             "username": player.username,
             "hand_count": hand_count,
             "is_online": player.is_online
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_player_left(table_id: str, player_id: str, username: str):
+async def broadcast_player_left(table_id: str, player_id: str, username: str, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "player_left",
         {
             "player_id": player_id,
             "username": username
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_uno_declared(table_id: str, player_id: str, username: str):
+async def broadcast_uno_declared(table_id: str, player_id: str, username: str, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "uno_declared",
         {
             "player_id": player_id,
             "player_name": username
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_uno_penalty(table_id: str, target_player_id: str, target_player_name: str, challenger_id: str, challenger_name: str, cards_drawn: int):
+async def broadcast_uno_penalty(table_id: str, target_player_id: str, target_player_name: str, challenger_id: str, challenger_name: str, cards_drawn: int, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "uno_penalty",
@@ -93,10 +103,11 @@ async def broadcast_uno_penalty(table_id: str, target_player_id: str, target_pla
             "challenger_id": challenger_id,
             "challenger_name": challenger_name,
             "cards_drawn": cards_drawn
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_uno_challenge_failed(table_id: str, challenger_id: str, challenger_name: str, cards_drawn: int):
+async def broadcast_uno_challenge_failed(table_id: str, challenger_id: str, challenger_name: str, cards_drawn: int, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "uno_challenge_failed",
@@ -104,15 +115,17 @@ async def broadcast_uno_challenge_failed(table_id: str, challenger_id: str, chal
             "challenger_id": challenger_id,
             "challenger_name": challenger_name,
             "cards_drawn": cards_drawn
-        }
+        },
+        batch=batch
     )
 
-async def broadcast_player_one_card(table_id: str, player_id: str, username: str):
+async def broadcast_player_one_card(table_id: str, player_id: str, username: str, batch=None):
     await EventHandler.broadcast_game_event(
         table_id,
         "player_one_card",
         {
             "player_id": player_id,
             "player_name": username
-        }
+        },
+        batch=batch
     )
\ No newline at end of file
@@ -0,0 +1,81 @@
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import time
+
+from app.core.config import EVENT_REPLAY_BUFFER_SIZE, EVENT_REPLAY_RETENTION
+
+# (event_seq, player_id or None for everyone, message)
+LoggedEvent = Tuple[int, Optional[str], Dict[str, Any]]
+
+
+class TableEventLog:
+    """
+    The last `size` messages sent to each table with local sockets, so a
+    client that reconnects with the last event_seq it saw can be sent just
+    what it missed instead of a snapshot.
+
+    Every batch sent to a table is numbered (see number) by the worker that
+    publishes it, and other workers log it under the same numbers. Numbers
+    start from the current time in milliseconds, so a seq from before a
+    restart is never mistaken for a recent one. A table's log is started
+    by its first socket and kept for `retention` seconds after its last
+    socket closed, so everyone can reconnect after a network blip.
+    """
+
+    def __init__(self, size: int = EVENT_REPLAY_BUFFER_SIZE, retention: float = EVENT_REPLAY_RETENTION):
+        self.size = size
+        self.retention = retention
+        self._events: Dict[str, Deque[LoggedEvent]] = {}
+        self._next_seq: Dict[str, int] = {}
+        self._released: Dict[str, float] = {}  # table_id -> when its last socket closed
+
+    def number(self, table_id: str, count: int) -> List[int]:
+        """Sequence numbers for the next `count` messages sent to a table"""
+        seq = max(self._next_seq.get(table_id, 0), int(time.time() * 1000))
+        self._next_seq[table_id] = seq + count
+        return list(range(seq, seq + count))
+
+    def record(self, table_id: str, seqs: List[int], entries: List[Tuple[Optional[str], Dict[str, Any]]]):
+        """Keep a numbered batch of (player_id, message) entries if the table is logged"""
+        events = self._events.get(table_id)
+        if events is None or not seqs:
+            return
+        events.extend((seq, target, message) for seq, (target, message) in zip(seqs, entries))
+        self._next_seq[table_id] = max(self._next_seq.get(table_id, 0), seqs[-1] + 1)
+
+    def since(self, table_id: str, last_seq: int, player_id: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        The messages for `player_id` after `last_seq`, each with its
+        event_seq. None if `last_seq` is no longer (or never was) in the
+        log, so the client needs a snapshot instead.
+        """
+        events = self._events.get(table_id)
+        if not events or not events[0][0] <= last_seq < self._next_seq[table_id]:
+            return None
+        return [
+            {**message, "event_seq": seq}
+            for seq, target, message in events
+            if seq > last_seq and (target is None or target == player_id)
+        ]
+
+    def retain(self, table_id: str):
+        """A socket joined the table: log it from now on"""
+        self._expire()
+        self._released.pop(table_id, None)
+        self._events.setdefault(table_id, deque(maxlen=self.size))
+
+    def release(self, table_id: str):
+        """The table's last socket closed: drop its log after the retention time"""
+        self._released[table_id] = time.monotonic()
+        self._expire()
+
+    def forget(self, table_id: str):
+        self._events.pop(table_id, None)
+        self._next_seq.pop(table_id, None)
+        self._released.pop(table_id, None)
+
+    def _expire(self):
+        deadline = time.monotonic() - self.retention
+        for table_id, released_at in list(self._released.items()):
+            if released_at <= deadline:
+                self.forget(table_id)
@@ -0,0 +1,157 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Set, Tuple, Union
+
+from fastapi import WebSocket
+
+from app.core.config import WS_OUTBOX_SIZE, WS_SEND_TIMEOUT
+
+
+class BatchFrame:
+    """
+    A frame of several messages (see ConnectionManager.send_batch), kept
+    with the messages and their conflation keys so an outbox can take out
+    the ones a newer frame supersedes. It is shared by every socket that
+    gets the same frame, so it is never changed; without() makes a copy.
+    """
+
+    __slots__ = ("messages", "keys", "_encode", "_frame")
+
+    def __init__(
+        self,
+        messages: List[Any],
+        keys: List[Optional[str]],
+        encode: Callable[[List[Any]], Union[str, bytes]],
+        frame: Optional[Union[str, bytes]] = None
+    ):
+        self.messages = messages
+        self.keys = keys  # conflation key of each message, or None
+        self._encode = encode
+        self._frame = frame  # encoded when first needed unless given
+
+    @property
+    def frame(self) -> Union[str, bytes]:
+        if self._frame is None:
+            self._frame = self._encode(self.messages)
+        return self._frame
+
+    def without(self, keys: Set[str]) -> Optional["BatchFrame"]:
+        """This batch minus the messages with one of `keys`; None if nothing is left"""
+        kept = [(key, message) for key, message in zip(self.keys, self.messages) if key not in keys]
+        if not kept:
+            return None
+        return BatchFrame([message for _, message in kept], [key for key, _ in kept], self._encode)
+
+
+Frame = Union[str, bytes, BatchFrame]
+
+
+class Outbox:
+    """
+    Bounded queue of encoded frames (text, or bytes for the binary
+    subprotocol) for one websocket, drained by its own writer task so a
+    slow client never blocks the sender.
+
+    A frame put with a key replaces any unsent frame with the same key (a
+    newer game_state makes an older one pointless). Batches are conflated
+    per message: the superseded messages are taken out of unsent batches,
+    and a batch left empty is dropped. If the queue is full or
+    a send takes longer than `send_timeout`, the client is too slow: the
+    outbox closes and `on_evict` is called to drop the connection.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_evict: Callable[[WebSocket, str], Awaitable[None]],
+        max_size: int = WS_OUTBOX_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT
+    ):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._on_evict = on_evict
+        self._frames: Deque[Tuple[Optional[str], Frame]] = deque()
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._evict_task: Optional[asyncio.Task] = None
+        self._task = asyncio.create_task(self._run())
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, frame: Frame, key: Optional[str] = None) -> bool:
+        """Queue a frame without waiting; False if the outbox is closed or overflowed"""
+        if self.closed:
+            return False
+
+        keys = {key} if key is not None else set()
+        if isinstance(frame, BatchFrame):
+            keys.update(batch_key for batch_key in frame.keys if batch_key is not None)
+        if keys:
+            self._conflate(keys)
+
+        if len(self._frames) >= self.max_size:
+            self._evict(f"outbox full ({self.max_size} frames)")
+            return False
+
+        self._frames.append((key, frame))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def _conflate(self, keys: Set[str]):
+        """Take what a new frame with `keys` supersedes out of the unsent frames"""
+        kept: Deque[Tuple[Optional[str], Frame]] = deque()
+        for queued_key, queued in self._frames:
+            if queued_key in keys:
+                continue
+            if isinstance(queued, BatchFrame) and keys.intersection(queued.keys):
+                queued = queued.without(keys)
+                if queued is None:
+                    continue
+            kept.append((queued_key, queued))
+        self._frames = kept
+
+    async def drain(self):
+        """Wait until every queued frame was sent (or the outbox closed)"""
+        await self._idle.wait()
+
+    def close(self):
+        """Stop the writer and drop unsent frames"""
+        if self.closed:
+            return
+        self.closed = True
+        self._frames.clear()
+        self._idle.set()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def _run(self):
+        while not self.closed:
+            if not self._frames:
+                self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            _, frame = self._frames.popleft()
+            if isinstance(frame, BatchFrame):
+                frame = frame.frame
+            try:
+                async with asyncio.timeout(self.send_timeout):
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+            except asyncio.TimeoutError:
+                self._evict(f"send took longer than {self.send_timeout}s")
+            except Exception as e:
+                self._evict(f"send failed: {e}")
+
+    def _evict(self, reason: str):
+        print(f"OUTBOX: Evicting slow consumer, {reason}")
+        self.close()
+        self._evict_task = asyncio.create_task(self._on_evict(self.websocket, reason))
@@ -0,0 +1,129 @@
+"""
+Debounced player presence.
+
+Connecting and disconnecting only record the player's new status in
+memory. A background task writes the changes that have held for
+PRESENCE_DEBOUNCE seconds every PRESENCE_FLUSH_INTERVAL seconds, as one
+UPDATE of is_online per status. An online player whose connection drops
+and comes back within the debounce window (a flaky mobile network) is
+not written at all.
+"""
+import asyncio
+import time
+import uuid
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import PRESENCE_DEBOUNCE, PRESENCE_FLUSH_INTERVAL
+from app.database.database import AsyncSessionLocal
+from app.database.unit_of_work import UnitOfWork
+from app.repositories.player_repository import PlayerRepository
+
+
+class PresenceTracker:
+    """
+    Online status changes of players, written to the database in batches.
+    `on_written(statuses)` is called with what each flush wrote, for copies
+    of players kept in memory (see TableActors.set_online).
+    """
+
+    def __init__(
+        self,
+        debounce: float = PRESENCE_DEBOUNCE,
+        flush_interval: float = PRESENCE_FLUSH_INTERVAL,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self.debounce = debounce
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        # player_id -> (is_online, changed at, status before the change if known)
+        self._pending: Dict[str, Tuple[bool, float, Optional[bool]]] = {}
+        self._online: Set[str] = set()  # players last written as online
+        self._task: Optional[asyncio.Task] = None
+        self.on_written: Optional[Callable[[Dict[str, bool]], None]] = None
+
+    def set(self, player_id: str, is_online: bool):
+        """Record a player's new status; it is written once it has held for the debounce time"""
+        player_id = str(player_id)
+        pending = self._pending.get(player_id)
+        if pending is None:
+            before = True if player_id in self._online else None
+            if is_online != before:
+                self._pending[player_id] = (is_online, time.monotonic(), before)
+        elif is_online == pending[2]:
+            # Back to what the database already says
+            del self._pending[player_id]
+        elif is_online != pending[0]:
+            self._pending[player_id] = (is_online, time.monotonic(), pending[2])
+
+    def pending(self) -> Dict[str, bool]:
+        """Status changes not written yet"""
+        return {player_id: is_online for player_id, (is_online, _, _) in self._pending.items()}
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Write the changes that have held for the debounce time (all of them
+        with `force`). Returns how many players were written.
+        """
+        settled_before = time.monotonic() - self.debounce
+        due = {
+            player_id: is_online for player_id, (is_online, changed_at, _) in self._pending.items()
+            if force or changed_at <= settled_before
+        }
+        if not due:
+            return 0
+
+        # Count the changes as written before writing them, so changes made
+        # meanwhile compare against them
+        was_online = {player_id: player_id in self._online for player_id in due}
+        for player_id, is_online in due.items():
+            del self._pending[player_id]
+            if is_online:
+                self._online.add(player_id)
+            else:
+                self._online.discard(player_id)
+        try:
+            async with self.session_factory() as db:
+                async with UnitOfWork(db):
+                    repo = PlayerRepository(db)
+                    for is_online in (True, False):
+                        player_ids = [uuid.UUID(player_id) for player_id, status in due.items() if status is is_online]
+                        if player_ids:
+                            await repo.set_online(player_ids, is_online)
+        except Exception:
+            # Try again next time, unless the status changed meanwhile
+            for player_id, is_online in due.items():
+                if was_online[player_id]:
+                    self._online.add(player_id)
+                else:
+                    self._online.discard(player_id)
+                self._pending.setdefault(player_id, (is_online, 0.0, None))
+            raise
+        if self.on_written is not None:
+            self.on_written(due)
+        return len(due)
+
+    def start(self):
+        """Start writing changes in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background writer and write everything pending (on shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(force=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"PRESENCE: Writing online status failed: {e}")
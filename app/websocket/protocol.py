@@ -0,0 +1,70 @@
+"""
+Wire formats of the table websocket.
+
+JSON text frames are the default. Clients that offer the MSGPACK_PROTOCOL
+subprotocol when connecting get binary MessagePack frames instead, with the
+same message types, and every card ({"color", "type", "value"}) replaced by
+its integer code from app.utils.card_codec. Messages from such clients are
+MessagePack too. The binary protocol is only offered when msgpack is
+installed.
+"""
+import json
+from typing import Any, Iterable, Optional, Union
+
+from app.utils.card_codec import card_dict_to_code
+from app.utils.serialization import _to_json_value, encode_message
+
+try:
+    import msgpack
+except ImportError:  # optional, clients then always get JSON
+    msgpack = None
+
+MSGPACK_PROTOCOL = "uno.msgpack.v1"
+
+_CARD_KEYS = {"color", "type", "value"}
+
+
+class FrameDecodeError(ValueError):
+    """An incoming frame is not a valid message in the socket's protocol"""
+
+
+def select_subprotocol(offered: Iterable[str]) -> Optional[str]:
+    """The subprotocol to accept from those a client offered, None for JSON"""
+    if msgpack is not None and MSGPACK_PROTOCOL in offered:
+        return MSGPACK_PROTOCOL
+    return None
+
+
+def compact_cards(value: Any) -> Any:
+    """A message with every card dict replaced by its card code"""
+    if isinstance(value, dict):
+        if value.keys() == _CARD_KEYS:
+            try:
+                return card_dict_to_code(value)
+            except ValueError:
+                pass
+        return {key: compact_cards(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [compact_cards(item) for item in value]
+    return value
+
+
+def _to_msgpack_value(obj: Any) -> Any:
+    return compact_cards(_to_json_value(obj))
+
+
+def encode_frame(message: Any, protocol: Optional[str] = None) -> Union[str, bytes]:
+    """Encode a message for a socket speaking `protocol`"""
+    if protocol == MSGPACK_PROTOCOL:
+        return msgpack.packb(compact_cards(message), default=_to_msgpack_value)
+    return encode_message(message)
+
+
+def decode_frame(frame: Union[str, bytes], protocol: Optional[str] = None) -> Any:
+    """Decode a message received from a socket speaking `protocol`"""
+    try:
+        if protocol == MSGPACK_PROTOCOL:
+            return msgpack.unpackb(frame, strict_map_key=False)
+        return json.loads(frame)
+    except (ValueError, TypeError) as e:
+        raise FrameDecodeError(str(e)) from e
@@ -0,0 +1,255 @@
+"""
+Table affinity across workers.
+
+Every table is owned by one worker, chosen by consistent hashing of the
+table id over the live workers. Game actions that arrive at another worker
+are forwarded to the owner over the event bus and its result is sent back,
+so each table's actions run in one process. Workers announce themselves on
+the bus with heartbeats; when one shuts down (or stops answering) it drops
+out of the ring and only its tables move to other workers.
+
+A forwarded action that times out is reported to the client as failed and
+is never run again elsewhere: the owner may only be slow and still run it,
+and actions are not idempotent. Owners leave the ring only by announcing it
+or by missing heartbeats. Two workers can still briefly disagree about an
+owner while membership changes; each reloads the game state and the
+version check rejects the second writer of the same state, but actions in
+flight on both during that window can both apply.
+Without a bus every table is local.
+"""
+import asyncio
+import bisect
+import hashlib
+import uuid
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.core.config import ACTION_FORWARD_TIMEOUT, WORKER_HEARTBEAT_INTERVAL
+from app.websocket.connection_manager import ConnectionManager, manager
+
+WORKERS_CHANNEL = "workers"
+
+# A worker missing this many heartbeats is presumed dead
+_MISSED_HEARTBEATS = 3
+
+ActionExecutor = Callable[[str, list], Awaitable[Dict[str, Any]]]
+
+
+def worker_channel(worker_id: str) -> str:
+    return f"worker:{worker_id}"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, with virtual nodes for balance"""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._points: List[Tuple[int, str]] = []
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for replica in range(self.replicas):
+            bisect.insort(self._points, (_hash(f"{node}#{replica}"), node))
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        self._points = [point for point in self._points if point[1] != node]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, (_hash(key), ""))
+        return self._points[index % len(self._points)][1]
+
+
+class TableRouter:
+    """
+    Decides which worker runs a table's actions and forwards them there.
+    `executor(action_name, args)` runs a forwarded action on the owner
+    (GameActionHandler registers it); `wire_types` are the model and enum
+    classes that may appear in forwarded arguments.
+    """
+
+    def __init__(
+        self,
+        connections: ConnectionManager,
+        heartbeat_interval: float = WORKER_HEARTBEAT_INTERVAL,
+        forward_timeout: float = ACTION_FORWARD_TIMEOUT
+    ):
+        self.connections = connections
+        self.heartbeat_interval = heartbeat_interval
+        self.forward_timeout = forward_timeout
+        self.executor: Optional[ActionExecutor] = None
+        self.wire_types: Dict[str, type] = {}
+        self.ring = HashRing([self.worker_id])
+        self.last_seen: Dict[str, float] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._in_flight: set = set()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.running = False
+
+    @property
+    def worker_id(self) -> str:
+        return self.connections.worker_id
+
+    def register_types(self, *types: type):
+        for cls in types:
+            self.wire_types[cls.__name__] = cls
+
+    def owner(self, table_id: str) -> str:
+        return self.ring.owner(str(table_id)) or self.worker_id
+
+    def owns(self, table_id: str) -> bool:
+        return not self.running or self.owner(table_id) == self.worker_id
+
+    async def start(self):
+        """Join the ring of the workers on the connection manager's bus"""
+        if self.connections.bus is None or self.running:
+            return
+        self.running = True
+        self.connections.bus_listeners.append(self._on_bus_message)
+        await self.connections.bus.subscribe(WORKERS_CHANNEL)
+        await self.connections.bus.subscribe(worker_channel(self.worker_id))
+        await self._announce("worker_join")
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        """
+        Leave the ring: other workers take over this worker's tables from
+        now on, and actions already running here are allowed to finish.
+        """
+        if not self.running:
+            return
+        await self._announce("worker_leave")
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        self.running = False
+        self.ring = HashRing([self.worker_id])
+        self.last_seen.clear()
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        if self._on_bus_message in self.connections.bus_listeners:
+            self.connections.bus_listeners.remove(self._on_bus_message)
+        bus = self.connections.bus
+        if bus is not None:
+            await bus.unsubscribe(WORKERS_CHANNEL)
+            await bus.unsubscribe(worker_channel(self.worker_id))
+
+    async def forward(self, table_id: str, action_name: str, args: list) -> Dict[str, Any]:
+        """
+        Run an action on the table's owner and return its result, or a
+        failure if the owner did not answer in time. The action is not run
+        anywhere else then, since the owner may still run it; the client's
+        next attempt goes to whichever worker owns the table by then.
+        """
+        owner = self.owner(table_id)
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self.connections.bus.publish(worker_channel(owner), {
+                "kind": "action",
+                "origin": self.worker_id,
+                "request_id": request_id,
+                "action": action_name,
+                "args": [self._encode_arg(arg) for arg in args],
+            })
+            async with asyncio.timeout(self.forward_timeout):
+                return await future
+        except asyncio.TimeoutError:
+            print(f"TABLE ROUTER: Worker {owner} did not answer {action_name} on table {table_id} in time")
+            return {"success": False, "error": "The table did not respond, please try again"}
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _on_bus_message(self, channel: str, message: dict):
+        kind = message.get("kind")
+        origin = message.get("origin")
+        if kind in ("worker_join", "worker_alive"):
+            known = origin in self.ring.nodes
+            self.ring.add(origin)
+            self.last_seen[origin] = asyncio.get_running_loop().time()
+            if kind == "worker_join" and not known:
+                # Let the newcomer know about this worker right away
+                await self._announce("worker_alive")
+        elif kind == "worker_leave":
+            self._drop(origin)
+        elif kind == "action":
+            task = asyncio.create_task(self._run_forwarded(message))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        elif kind == "action_result":
+            future = self._pending.get(message.get("request_id"))
+            if future is not None and not future.done():
+                future.set_result(message["result"])
+
+    async def _run_forwarded(self, message: dict):
+        try:
+            args = [self._decode_arg(arg) for arg in message["args"]]
+            result = await self.executor(message["action"], args)
+        except Exception as e:
+            print(f"TABLE ROUTER: Forwarded {message.get('action')} failed: {e}")
+            result = {"success": False, "error": "The table is busy, please try again"}
+        await self.connections.bus.publish(worker_channel(message["origin"]), {
+            "kind": "action_result",
+            "origin": self.worker_id,
+            "request_id": message["request_id"],
+            "result": result,
+        })
+
+    async def _announce(self, kind: str):
+        await self.connections.bus.publish(WORKERS_CHANNEL, {"kind": kind, "origin": self.worker_id})
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._announce("worker_alive")
+            except Exception as e:
+                print(f"TABLE ROUTER: Heartbeat failed: {e}")
+            deadline = asyncio.get_running_loop().time() - self.heartbeat_interval * _MISSED_HEARTBEATS
+            for worker_id, seen in list(self.last_seen.items()):
+                if seen < deadline:
+                    print(f"TABLE ROUTER: Worker {worker_id} stopped sending heartbeats")
+                    self._drop(worker_id)
+
+    def _drop(self, worker_id: str):
+        if worker_id != self.worker_id:
+            self.ring.remove(worker_id)
+            self.last_seen.pop(worker_id, None)
+
+    def _encode_arg(self, arg: Any) -> Any:
+        if isinstance(arg, BaseModel):
+            return {"__model__": type(arg).__name__, "data": arg.model_dump(mode="json")}
+        if isinstance(arg, Enum):
+            return {"__enum__": type(arg).__name__, "value": arg.value}
+        if isinstance(arg, uuid.UUID):
+            return str(arg)
+        return arg
+
+    def _decode_arg(self, arg: Any) -> Any:
+        if isinstance(arg, dict) and "__model__" in arg:
+            return self.wire_types[arg["__model__"]].model_validate(arg["data"])
+        if isinstance(arg, dict) and "__enum__" in arg:
+            return self.wire_types[arg["__enum__"]](arg["value"])
+        return arg
+
+
+# Create a global instance
+table_router = TableRouter(manager)
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from app.core.config import SPECTATOR_MAX_RATE
+
+
+class SpectatorFeed:
+    """
+    The throttled tier of a table's broadcasts, for spectators.
+
+    Public messages sent to a table are conflated per message type (a newer
+    game_state replaces the one not sent yet), and each table's spectators
+    are sent what accumulated at most `max_rate` times per second: right
+    away if the table was quiet, otherwise when the interval is up. So a
+    move on a table with a large audience costs one frame per spectator at
+    most every 1 / max_rate seconds, however busy the table is. Messages
+    keep their event_seq, so the last one a spectator got is what it
+    reconnects with; the replay then sends what happened after it.
+    `send(table_id, messages)` delivers the conflated messages.
+    """
+
+    def __init__(self, send: Callable[[str, List[dict]], None], max_rate: float = SPECTATOR_MAX_RATE):
+        self.send = send
+        self.interval = 1 / max_rate
+        self._latest: Dict[str, Dict[Optional[str], dict]] = {}  # table_id -> message type -> newest message
+        self._last_sent: Dict[str, float] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    def publish(self, table_id: str, messages: List[dict]):
+        """Queue a table's public messages for its spectators"""
+        if not messages:
+            return
+        latest = self._latest.setdefault(table_id, {})
+        for message in messages:
+            # Re-inserted, so messages go out in the order they last occurred
+            latest.pop(message.get("type"), None)
+            latest[message.get("type")] = message
+        if table_id in self._timers:
+            return
+
+        loop = asyncio.get_running_loop()
+        delay = self._last_sent.get(table_id, float("-inf")) + self.interval - loop.time()
+        if delay <= 0:
+            self._flush(table_id)
+        else:
+            self._timers[table_id] = loop.call_later(delay, self._flush, table_id)
+
+    def forget(self, table_id: str):
+        """The table has no spectators left"""
+        timer = self._timers.pop(table_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._latest.pop(table_id, None)
+        self._last_sent.pop(table_id, None)
+
+    def _flush(self, table_id: str):
+        self._timers.pop(table_id, None)
+        messages = list(self._latest.pop(table_id, {}).values())
+        if not messages:
+            return
+        self._last_sent[table_id] = asyncio.get_running_loop().time()
+        try:
+            self.send(table_id, messages)
+        except Exception as e:
+            print(f"SPECTATORS: Sending to table {table_id} failed: {e}")
@@ -0,0 +1,181 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import time
+
+from app.core.config import STATE_HISTORY_SIZE
+
+# List fields of the public game state that are diffed entry by entry
+_ENTRY_LISTS = ("players", "spectators")
+
+
+def diff_public_state(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Patch turning one GameState.to_public_dict() into another. Changed keys
+    carry their new value. The players/spectators lists become
+    {id: {changed fields}}, or the whole new list if anyone joined, left or
+    moved.
+    """
+    patch = {}
+    for key, value in new.items():
+        if key in _ENTRY_LISTS:
+            changes = _diff_entries(old.get(key) or [], value or [])
+            if changes:
+                patch[key] = changes
+        elif key not in old or old[key] != value:
+            patch[key] = value
+    return patch
+
+
+def _diff_entries(old: List[Dict[str, Any]], new: List[Dict[str, Any]]):
+    if [entry["id"] for entry in old] != [entry["id"] for entry in new]:
+        return new
+    changes = {}
+    for old_entry, new_entry in zip(old, new):
+        changed = {k: v for k, v in new_entry.items() if old_entry.get(k) != v}
+        if changed:
+            changes[new_entry["id"]] = changed
+    return changes
+
+
+def apply_public_state_patch(state: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """What a client does with a game_state_delta: returns the patched state"""
+    result = dict(state)
+    for key, value in patch.items():
+        if key in _ENTRY_LISTS and isinstance(value, dict):
+            result[key] = [
+                {**entry, **value[entry["id"]]} if entry["id"] in value else entry
+                for entry in state.get(key) or []
+            ]
+        else:
+            result[key] = value
+    return result
+
+
+def diff_hand(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    hand_delta payload turning one hand into another: positions removed from
+    the old hand and cards appended at the end. None if no card of the old
+    hand survives (a new deal), where the full hand is just as small.
+    """
+    removed = []
+    j = 0
+    for i, card in enumerate(old):
+        if j < len(new) and new[j] == card:
+            j += 1
+        else:
+            removed.append(i)
+    if j == 0 and old and new:
+        return None
+    return {"removed": removed, "added": new[j:]}
+
+
+def apply_hand_delta(hand: List[Dict[str, Any]], delta: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """What a client does with a hand_delta: returns the new hand"""
+    removed = set(delta["removed"])
+    return [card for i, card in enumerate(hand) if i not in removed] + list(delta["added"])
+
+
+class VersionHistory:
+    """
+    The last STATE_HISTORY_SIZE versions of a value per key (a table's
+    public state, a player's hand). Version numbers start from the current
+    time in milliseconds, so numbers handed out before a restart are never
+    reused for a different value.
+    """
+
+    def __init__(self, size: int = STATE_HISTORY_SIZE):
+        self.size = size
+        self._versions: Dict[Any, Deque[Tuple[int, Any]]] = {}
+
+    def record(self, key: Any, value: Any) -> int:
+        """Version number of `value`, adding it as a new version if it changed"""
+        history = self._versions.setdefault(key, deque(maxlen=self.size))
+        if history and history[-1][1] == value:
+            return history[-1][0]
+        version = max(history[-1][0] + 1 if history else 0, int(time.time() * 1000))
+        history.append((version, value))
+        return version
+
+    def latest(self, key: Any) -> Optional[Tuple[int, Any]]:
+        history = self._versions.get(key)
+        return history[-1] if history else None
+
+    def get(self, key: Any, version: Optional[int]) -> Optional[Any]:
+        for recorded, value in reversed(self._versions.get(key, ())):
+            if recorded == version:
+                return value
+        return None
+
+    def forget(self, key: Any):
+        self._versions.pop(key, None)
+
+
+# Base of sockets that receive full messages rather than deltas
+FULL = "full"
+
+
+class SyncedStream:
+    """
+    A versioned message (game_state per table, your_hand per player) that
+    sockets can follow as deltas. Messages of `message_type` are stamped
+    with a version; a socket that acknowledged a version gets `delta_type`
+    messages against the version it holds instead, or the full message if
+    that version is gone or `diff` returns None.
+    """
+
+    def __init__(
+        self,
+        message_type: str,
+        delta_type: str,
+        version_field: str,
+        diff: Callable[[Any, Any], Optional[Any]]
+    ):
+        self.message_type = message_type
+        self.delta_type = delta_type
+        self.version_field = version_field
+        self.base_field = f"base_{version_field}"
+        self.history = VersionHistory()
+        self.bases: Dict[Any, Optional[int]] = {}  # socket -> version it holds
+        self._diff = diff
+
+    def stamp(self, key: Any, message: Dict[str, Any]) -> Dict[str, Any]:
+        """The message with its version number, if it is of this stream's type"""
+        if not isinstance(message, dict) or message.get("type") != self.message_type or self.version_field in message:
+            return message
+        return {**message, self.version_field: self.history.record(key, message.get("data"))}
+
+    def snapshot(self, key: Any, data: Any) -> Dict[str, Any]:
+        return {"type": self.message_type, self.version_field: self.history.record(key, data), "data": data}
+
+    def base(self, socket: Any):
+        return self.bases.get(socket, FULL)
+
+    def message_for(self, key: Any, message: Dict[str, Any], base) -> Tuple[Optional[Dict[str, Any]], Any]:
+        """
+        What to send a socket holding version `base`, and the version it
+        holds afterwards. None if it already has this version.
+        """
+        if base is FULL or message.get("type") != self.message_type:
+            return message, base
+        version = message[self.version_field]
+        if base == version:
+            return None, base
+        old = self.history.get(key, base)
+        patch = self._diff(old, message.get("data")) if old is not None else None
+        if patch is None:
+            return message, version
+        return {"type": self.delta_type, self.version_field: version, self.base_field: base, "data": patch}, version
+
+    def acknowledge(self, socket: Any, key: Any, version: Optional[int]) -> bool:
+        """
+        Start sending deltas to a socket holding `version`. Messages reach a
+        socket in order, so once following, its base moves with every
+        message sent and later acks change nothing. False if the version is
+        unknown and the socket needs a snapshot first.
+        """
+        if socket in self.bases:
+            return True
+        if version is not None and self.history.get(key, version) is not None:
+            self.bases[socket] = version
+            return True
+        return False
@@ -0,0 +1,107 @@
+"""
+Cost of encoding one game_state broadcast, by number of recipients.
+
+Compares the old path (serialize + json.dumps for every recipient) with
+ConnectionManager.broadcast_to_table, which encodes the message once and
+queues the same frame on every socket's outbox. "queued" is how long the
+broadcasting action waits, "delivered" includes draining every outbox.
+Run from the repository root:
+
+    python -m benchmarks.bench_broadcast_encode
+"""
+import asyncio
+import json
+import time
+import uuid
+
+from app.models import GameState, Player, Table
+from app.utils import serialization
+from app.utils.serialization import encode_message
+from app.websocket.connection_manager import ConnectionManager, ConnectionRecord
+from app.websocket.outbox import Outbox
+
+RECIPIENT_COUNTS = [1, 10, 50, 200, 1000]
+ROUNDS = 20
+
+
+class NullWebSocket:
+    """A socket that accepts frames and drops them"""
+
+    async def send_text(self, text):
+        pass
+
+
+def legacy_make_serializable(obj):
+    """ConnectionManager._make_serializable before this change"""
+    if isinstance(obj, (str, int, float, bool, type(None))):
+        return obj
+    elif isinstance(obj, dict):
+        return {k: legacy_make_serializable(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [legacy_make_serializable(item) for item in obj]
+    elif hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    elif hasattr(obj, 'dict'):
+        return obj.dict()
+    elif hasattr(obj, '__dict__'):
+        return legacy_make_serializable(obj.__dict__)
+    return str(obj)
+
+
+async def legacy_broadcast(message, sockets):
+    serializable_message = legacy_make_serializable(message)
+    for socket in sockets:
+        await socket.send_text(json.dumps(serializable_message))
+
+
+def game_state_message():
+    table = Table(name="bench", players=[Player(username=f"player-{i}") for i in range(4)])
+    game_state = GameState(table_id=table.id)
+    game_state.initialize_game(table)
+    for _ in range(30):
+        game_state.discard_pile.append(game_state.draw_pile.pop())
+    return {"type": "game_state", "data": game_state.to_public_dict(table)}
+
+
+def table_manager(recipients: int):
+    manager = ConnectionManager()
+    table_id = str(uuid.uuid4())
+    sockets = [NullWebSocket() for _ in range(recipients)]
+    manager.active_connections[table_id] = set(sockets)
+    for socket in sockets:
+        record = manager.connections[socket] = ConnectionRecord(socket, str(uuid.uuid4()), table_id)
+        record.state = "connected"
+        record.outbox = Outbox(socket, manager._evict)
+    return manager, table_id, sockets
+
+
+async def broadcast_and_drain(manager, message, table_id, queued: list):
+    start = time.perf_counter()
+    await manager.broadcast_to_table(message, table_id)
+    queued.append(time.perf_counter() - start)
+    await manager.drain()
+
+
+async def time_per_broadcast(broadcast) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await broadcast()
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+async def main():
+    message = game_state_message()
+    print(f"frame size: {len(encode_message(message))} bytes, orjson: {serialization.orjson is not None}")
+    print(f"{'recipients':>10} {'before us':>10} {'queued us':>10} {'delivered us':>13}")
+    for recipients in RECIPIENT_COUNTS:
+        manager, table_id, sockets = table_manager(recipients)
+        queued = []
+        before = await time_per_broadcast(lambda: legacy_broadcast(message, sockets))
+        delivered = await time_per_broadcast(lambda: broadcast_and_drain(manager, message, table_id, queued))
+        print(f"{recipients:>10} {before:>10.0f} {sum(queued) / len(queued) * 1e6:>10.0f} {delivered:>13.0f}")
+        for record in manager.connections.values():
+            record.outbox.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Statements sent by TableRepository.update_table for one game action.
+
+Compares the old write path (one UPDATE per player and spectator) with the
+dirty-only batched write. Run from the repository root:
+
+    python -m benchmarks.bench_table_writes
+"""
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import event, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base, PlayerModel, TableModel, UserModel
+from app.models import CardDeck, Player
+from app.repositories.player_repository import PlayerRepository
+from app.repositories.table_repository import TableRepository
+from app.schemas import PlayerRole
+
+PLAYERS = 4
+SPECTATOR_COUNTS = [0, 10, 100, 500]
+
+
+async def legacy_update_table(db: AsyncSession, table):
+    """The write path before change tracking: every row, every time"""
+    await db.execute(
+        update(TableModel)
+        .where(TableModel.id == table.id)
+        .values(status=table.status, max_players=table.max_players)
+    )
+    for player in table.players + table.spectators:
+        await db.execute(
+            update(PlayerModel)
+            .where(PlayerModel.id == player.id)
+            .values(
+                hand=[card.dict() for card in player.hand],
+                is_online=player.is_online,
+                uno_declaration=player.uno_declaration,
+                role=player.role
+            )
+        )
+    await db.commit()
+
+
+async def seed_table(db: AsyncSession, spectators: int):
+    table = await TableRepository(db).create_table(f"bench-{uuid.uuid4()}")
+    player_repo = PlayerRepository(db)
+    deck = CardDeck.create_deck()
+    for i in range(PLAYERS + spectators):
+        role = PlayerRole.PLAYER if i < PLAYERS else PlayerRole.SPECTATOR
+        name = f"bench-{uuid.uuid4()}"
+        user = UserModel(id=uuid.uuid4(), username=name, email=f"{name}@bench.uno", created_at=int(time.time()))
+        db.add(user)
+        hand = deck[i * 7:(i + 1) * 7] if role == PlayerRole.PLAYER else []
+        await player_repo.create_player(Player(username=name, hand=hand, role=role), table.id, user.id)
+    return table.id
+
+
+async def measure(db: AsyncSession, statements: list, table_id, writer) -> int:
+    table = await TableRepository(db).get_table(table_id)
+    # One card played: a single hand changes
+    table.players[0].play_card(0)
+    statements.clear()
+    await writer(db, table)
+    return len(statements)
+
+
+async def main():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    print(f"{'spectators':>10} {'before':>8} {'after':>8}")
+    async with session_factory() as db:
+        for spectators in SPECTATOR_COUNTS:
+            table_id = await seed_table(db, spectators)
+            before = await measure(db, statements, table_id, legacy_update_table)
+            after = await measure(db, statements, table_id, lambda db, table: TableRepository(db).update_table(table))
+            print(f"{spectators:>10} {before:>8} {after:>8}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
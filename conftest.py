@@ -0,0 +1,92 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base
+
+
+@pytest_asyncio.fixture
+async def db_engine():
+    """In-memory database with the full schema, for repository tests"""
+    pytest.importorskip("aiosqlite")
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def db(db_engine):
+    session_factory = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        yield session
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def table_actors(monkeypatch):
+    """
+    Game actions commit before broadcasting (no write-behind) unless a test
+    changes the lag, and no table actor outlives its test
+    """
+    from app.game_logic.table_actor import table_actors
+
+    monkeypatch.setattr(table_actors, "write_behind_lag", 0)
+    yield table_actors
+    await table_actors.close()
+
+
+@pytest.fixture
+def statement_counter(db_engine):
+    """Collects every SQL statement sent to the database"""
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", on_execute)
+    yield statements
+    event.remove(db_engine.sync_engine, "before_cursor_execute", on_execute)
+
+
+@pytest.fixture
+def commits(db_engine):
+    """Counts committed transactions"""
+    committed = []
+
+    def on_commit(conn):
+        committed.append(conn)
+
+    event.listen(db_engine.sync_engine, "commit", on_commit)
+    yield committed
+    event.remove(db_engine.sync_engine, "commit", on_commit)
+
+
+@pytest.fixture
+def sent(monkeypatch, commits):
+    """Records websocket sends together with the commit count at send time"""
+    from app.game_logic.game_actions import GameActionHandler
+    from app.websocket.connection_manager import manager
+
+    messages = []
+
+    async def broadcast_to_table(message, table_id, exclude=None):
+        messages.append((message["type"], len(commits)))
+
+    async def send_to_player(message, player_id, session_manager):
+        messages.append((message["type"], len(commits)))
+
+    async def send_batch(table_id, entries):
+        for _, message in entries:
+            messages.append((message["type"], len(commits)))
+
+    async def trigger_bot(table_id):
+        messages.append(("bot", len(commits)))
+
+    monkeypatch.setattr(manager, "broadcast_to_table", broadcast_to_table)
+    monkeypatch.setattr(manager, "send_to_player", send_to_player)
+    monkeypatch.setattr(manager, "send_batch", send_batch)
+    monkeypatch.setattr(GameActionHandler, "_trigger_bot_if_needed", staticmethod(trigger_bot))
+    return messages
@@ -0,0 +1,98 @@
+import uuid
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+
+from app.database.migrations import run_migrations
+from app.database.models import GameStateModel, PlayerModel, TableModel, UserModel
+from app.models import Card, CardDeck
+from app.repositories.game_state_repository import GameStateRepository
+from app.repositories.player_repository import PlayerRepository
+from app.schemas import CardColor, CardType
+from app.utils.card_codec import (
+    CARD_CODE_COUNT,
+    card_to_code,
+    code_to_card,
+    decode_cards,
+    encode_cards,
+)
+
+
+def test_full_deck_round_trip():
+    deck = CardDeck.shuffle(CardDeck.create_deck())
+
+    encoded = encode_cards(deck)
+
+    assert isinstance(encoded, bytes)
+    assert len(encoded) == 108
+    assert decode_cards(encoded) == deck
+
+
+def test_every_code_round_trips():
+    assert CARD_CODE_COUNT <= 256
+    for code in range(CARD_CODE_COUNT):
+        assert card_to_code(code_to_card(code)) == code
+
+
+def test_played_wild_keeps_chosen_color():
+    wild = Card(color=CardColor.WILD, type=CardType.WILD_DRAW_FOUR)
+    wild = wild.model_copy(update={"color": CardColor.GREEN})
+
+    decoded = decode_cards(encode_cards([wild]))[0]
+
+    assert decoded.type == CardType.WILD_DRAW_FOUR
+    assert decoded.color == CardColor.GREEN
+
+
+def test_decoded_cards_are_immutable():
+    card = decode_cards(encode_cards([Card(color=CardColor.WILD, type=CardType.WILD)]))[0]
+    with pytest.raises(ValidationError):
+        card.color = CardColor.RED
+
+
+def test_invalid_cards_are_rejected():
+    with pytest.raises(ValueError):
+        card_to_code(Card(color=CardColor.WILD, type=CardType.NUMBER, value=3))
+    with pytest.raises(ValueError):
+        code_to_card(CARD_CODE_COUNT)
+
+
+@pytest.mark.asyncio
+async def test_migration_encodes_legacy_json_rows(db_engine, db):
+    deck = CardDeck.create_deck()
+    hand, draw_pile, discard_pile = deck[:7], deck[7:100], deck[100:101]
+    table_id, user_id, player_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+    # A database created before the binary columns existed
+    async with db_engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE players DROP COLUMN hand_codes"))
+        await conn.execute(insert(UserModel.__table__).values(
+            id=user_id, username="legacy", email="legacy@test.uno", created_at=0
+        ))
+        await conn.execute(insert(TableModel.__table__).values(id=table_id, name="legacy", created_at=0))
+        # Columns without a value or default (hand_codes) are left out of the INSERT
+        await conn.execute(insert(PlayerModel.__table__).values(
+            id=player_id, user_id=user_id, table_id=table_id, hand=[c.dict() for c in hand]
+        ))
+        await conn.execute(insert(GameStateModel.__table__).values(
+            table_id=table_id,
+            draw_pile=[c.dict() for c in draw_pile],
+            discard_pile=[c.dict() for c in discard_pile]
+        ))
+
+    async with db_engine.begin() as conn:
+        await run_migrations(conn)
+        # Running again is a no-op
+        await run_migrations(conn)
+
+    async with db_engine.connect() as conn:
+        row = (await conn.execute(select(PlayerModel.__table__).where(PlayerModel.__table__.c.id == player_id))).one()
+    assert row.hand_codes == encode_cards(hand)
+    assert row.hand is None
+
+    player = await PlayerRepository(db).get_player(player_id)
+    assert player.hand == hand
+    game_state = await GameStateRepository(db).get_game_state(table_id)
+    assert game_state.draw_pile == draw_pile
+    assert game_state.discard_pile == discard_pile
@@ -0,0 +1,715 @@
+import asyncio
+import functools
+import gc
+import json
+import uuid
+
+import pytest
+
+from app.core.config import SPECTATOR_SAMPLE_SIZE
+from app.models import Card, GameState, Player, Table
+from app.schemas import CardColor, CardType, PlayerRole
+from app.utils import serialization
+from app.utils.session_cache import CachedSession
+from app.utils.spectators import summarize_spectators
+from app.websocket import connection_manager as connection_manager_module
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.outbox import Outbox
+from app.websocket.protocol import MSGPACK_PROTOCOL, FrameDecodeError, compact_cards, decode_frame
+from app.websocket.state_sync import apply_hand_delta, apply_public_state_patch, diff_hand
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+needs_msgpack = pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+
+
+class FakeWebSocket:
+    """Records sent messages, with the event_seq of each kept apart in event_seqs"""
+
+    def __init__(self, subprotocols=()):
+        self.sent = []
+        self.event_seqs = []
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, text):
+        self.sent.append(self._take_seqs(json.loads(text)))
+
+    async def send_bytes(self, data):
+        self.sent.append(self._take_seqs(msgpack.unpackb(data, strict_map_key=False)))
+
+    def _take_seqs(self, message):
+        for item in message["data"] if message.get("type") == "batch" else [message]:
+            if "event_seq" in item:
+                self.event_seqs.append(item.pop("event_seq"))
+        return message
+
+
+class FakeSessionManager:
+    """Resolves tokens from a dict and counts lookups"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lookups = 0
+
+    def add(self, table_id, role=PlayerRole.PLAYER):
+        token = str(uuid.uuid4())
+        self.sessions[token] = CachedSession(uuid.uuid4(), uuid.UUID(table_id), role)
+        return token
+
+    async def get_session(self, session_token):
+        self.lookups += 1
+        return self.sessions.get(session_token)
+
+
+async def connect(manager, sessions, token, table_id, subprotocols=()):
+    websocket = FakeWebSocket(subprotocols)
+    await manager.connect(websocket, token, table_id, sessions)
+    return websocket
+
+
+@pytest.mark.asyncio
+async def test_send_to_player_uses_the_index():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    tokens = [sessions.add(table_id) for _ in range(3)]
+    sockets = [await connect(manager, sessions, token, table_id) for token in tokens]
+    target = sessions.sessions[tokens[1]].player_id
+
+    sessions.lookups = 0
+    await manager.send_to_player({"type": "your_hand", "data": []}, str(target))
+    await manager.drain()
+
+    assert sessions.lookups == 0
+    assert [len(ws.sent) for ws in sockets] == [0, 1, 0]
+    assert await manager.get_player_connection(str(target)) is sockets[1]
+
+
+@pytest.mark.asyncio
+async def test_disconnect_clears_every_index():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = sessions.sessions[token].player_id
+    websocket = await connect(manager, sessions, token, table_id)
+
+    await manager.disconnect(websocket, sessions)
+
+    assert manager.active_connections == {}
+    assert manager.player_connections == {}
+    assert manager.session_connections == {}
+    assert manager.connections == {}
+    assert manager.presence.pending() == {str(player_id): False}
+    assert not await manager.is_player_connected(str(player_id))
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_session_replaces_its_old_socket():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    old = await connect(manager, sessions, token, table_id)
+    new = await connect(manager, sessions, token, table_id)
+
+    await manager.send_to_player({"type": "ping"}, player_id)
+    await manager.broadcast_to_table({"type": "game_state"}, table_id)
+    await manager.drain()
+
+    assert manager.player_connections[player_id] == {new}
+    assert manager.active_connections[table_id] == {new}
+    assert old.sent == []
+    assert [message["type"] for message in new.sent] == ["ping", "game_state"]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_once_for_all_recipients(monkeypatch):
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    sockets = [await connect(manager, sessions, sessions.add(table_id), table_id) for _ in range(5)]
+    encoded = []
+
+    def counting_encode(message, protocol=None):
+        encoded.append(message)
+        return json.dumps(message)
+
+    monkeypatch.setattr(connection_manager_module, "encode_frame", counting_encode)
+    await manager.broadcast_to_table({"type": "card_played", "data": {"n": 1}}, table_id)
+    await manager.drain()
+
+    assert len(encoded) == 1
+    assert all(ws.sent == [{"type": "card_played", "data": {"n": 1}}] for ws in sockets)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_encode_message_handles_models_and_ids(monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    player_id = uuid.uuid4()
+    card = Card(color=CardColor.RED, type=CardType.NUMBER, value=7)
+
+    frame = serialization.encode_message({"player_id": player_id, "card": card, "role": PlayerRole.SPECTATOR})
+
+    assert json.loads(frame) == {"player_id": str(player_id), "card": card.to_dict(), "role": "spectator"}
+
+
+class SlowWebSocket(FakeWebSocket):
+    """Blocks every send until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+        self.closed_with = None
+
+    async def send_text(self, text):
+        await self.release.wait()
+        await super().send_text(text)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = code
+
+
+@pytest.mark.asyncio
+async def test_slow_client_does_not_hold_up_the_table():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    slow = SlowWebSocket()
+    await manager.connect(slow, sessions.add(table_id), table_id, sessions)
+    fast = await connect(manager, sessions, sessions.add(table_id), table_id)
+
+    await asyncio.wait_for(manager.broadcast_to_table({"type": "card_played"}, table_id), 0.1)
+    await manager.connections[fast].outbox.drain()
+
+    assert fast.sent == [{"type": "card_played"}]
+    assert slow.sent == []
+    slow.release.set()
+    await manager.drain()
+    assert slow.sent == [{"type": "card_played"}]
+
+
+@pytest.mark.asyncio
+async def test_only_the_latest_unsent_game_state_is_sent():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = SlowWebSocket()
+    await manager.connect(websocket, sessions.add(table_id), table_id, sessions)
+
+    for n in range(3):
+        await manager.broadcast_to_table({"type": "game_state", "data": {"n": n}}, table_id)
+        await manager.broadcast_to_table({"type": "card_played", "data": {"n": n}}, table_id)
+    websocket.release.set()
+    await manager.drain()
+
+    game_states = [m["data"]["n"] for m in websocket.sent if m["type"] == "game_state"]
+    card_plays = [m["data"]["n"] for m in websocket.sent if m["type"] == "card_played"]
+    assert game_states[-1] == 2 and len(game_states) <= 2
+    assert card_plays == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_slow_client_gets_action_batches_conflated():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    websocket = SlowWebSocket()
+    await manager.connect(websocket, token, table_id, sessions)
+
+    for n in range(5):
+        await manager.send_batch(table_id, [
+            (None, {"type": "card_played", "data": {"n": n}}),
+            (None, {"type": "game_state", "data": {"n": n}}),
+            (player_id, {"type": "your_hand", "data": [n]}),
+        ])
+    websocket.release.set()
+    await manager.drain()
+
+    messages = [m for frame in websocket.sent for m in (frame["data"] if frame["type"] == "batch" else [frame])]
+    assert [m["data"]["n"] for m in messages if m["type"] == "card_played"] == [0, 1, 2, 3, 4]
+    game_states = [m["data"]["n"] for m in messages if m["type"] == "game_state"]
+    hands = [m["data"] for m in messages if m["type"] == "your_hand"]
+    # The first batch may already be on its way; the rest lose superseded entries
+    assert game_states[-1] == 4 and len(game_states) <= 2
+    assert hands[-1] == [4] and len(hands) <= 2
+    assert len(websocket.event_seqs) == len(messages)
+
+@pytest.mark.asyncio
+async def test_overflowing_client_is_evicted():
+    outbox_closed = []
+    websocket = SlowWebSocket()
+
+    async def on_evict(ws, reason):
+        outbox_closed.append(reason)
+
+    outbox = Outbox(websocket, on_evict, max_size=2, send_timeout=5)
+    assert outbox.put("a") and outbox.put("b")
+    await asyncio.sleep(0)  # the writer takes "a" and blocks on it
+    assert outbox.put("c")
+    assert not outbox.put("d")
+    await asyncio.sleep(0)
+
+    assert outbox.closed
+    assert outbox_closed and "full" in outbox_closed[0]
+
+
+@pytest.mark.asyncio
+async def test_send_timeout_evicts_and_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(connection_manager_module, "Outbox", functools.partial(Outbox, send_timeout=0.01))
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = SlowWebSocket()
+    token = sessions.add(table_id)
+    await manager.connect(websocket, token, table_id, sessions)
+
+    await manager.broadcast_to_table({"type": "game_state"}, table_id)
+    await asyncio.sleep(0.05)
+
+    assert websocket.closed_with == 1013
+    assert manager.connection_state(websocket) == "evicted"
+    assert manager.active_connections == {} and manager.player_connections == {}
+    await manager.broadcast_to_table({"type": "game_state"}, table_id)
+    await manager.disconnect(websocket, sessions)
+    assert manager.connections == {}
+    assert manager.presence.pending() == {str(sessions.sessions[token].player_id): False}
+
+
+@pytest.mark.asyncio
+async def test_action_batch_is_one_frame_per_client():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    tokens = [sessions.add(table_id) for _ in range(3)]
+    sockets = [await connect(manager, sessions, token, table_id) for token in tokens]
+    player_ids = [str(sessions.sessions[token].player_id) for token in tokens]
+
+    await manager.send_batch(table_id, [
+        (None, {"type": "card_played"}),
+        (player_ids[0], {"type": "your_hand", "data": [1]}),
+        (None, {"type": "turn_changed"}),
+    ])
+    await manager.drain()
+
+    assert [len(ws.sent) for ws in sockets] == [1, 1, 1]
+    version = manager.hand_stream.history.latest(player_ids[0])[0]
+    assert sockets[0].sent[0] == {"type": "batch", "data": [
+        {"type": "card_played"}, {"type": "your_hand", "version": version, "data": [1]}, {"type": "turn_changed"}
+    ]}
+    assert sockets[1].sent == sockets[2].sent == [{"type": "batch", "data": [
+        {"type": "card_played"}, {"type": "turn_changed"}
+    ]}]
+
+
+@pytest.mark.asyncio
+async def test_single_message_batch_is_sent_unwrapped():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = await connect(manager, sessions, sessions.add(table_id), table_id)
+
+    await manager.send_batch(table_id, [(None, {"type": "uno_declared"})])
+    await manager.drain()
+
+    assert websocket.sent == [{"type": "uno_declared"}]
+
+
+def public_state(current_player, hand_counts):
+    return {
+        "current_player_id": current_player,
+        "discard_top": {"color": "red", "type": "number", "value": current_player},
+        "players": [{"id": f"p{i}", "hand_count": count} for i, count in enumerate(hand_counts)],
+        "spectators": [{"id": f"s{i}", "username": f"spectator {i}"} for i in range(50)],
+    }
+
+
+@pytest.mark.asyncio
+async def test_acknowledged_clients_get_deltas():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    syncing = await connect(manager, sessions, sessions.add(table_id), table_id)
+    legacy = await connect(manager, sessions, sessions.add(table_id), table_id)
+
+    await manager.broadcast_to_table({"type": "game_state", "data": public_state(0, [7, 7])}, table_id)
+    await manager.drain()
+    snapshot = syncing.sent[-1]
+    assert await manager.acknowledge_state(syncing, table_id, snapshot["seq"])
+
+    client_state = snapshot["data"]
+    for turn, counts in [(1, [6, 7]), (0, [6, 6])]:
+        await manager.broadcast_to_table({"type": "game_state", "data": public_state(turn, counts)}, table_id)
+        await manager.drain()
+        delta = syncing.sent[-1]
+        assert delta["type"] == "game_state_delta"
+        assert delta["base_seq"] == snapshot["seq"]
+        assert "spectators" not in delta["data"]
+        client_state = apply_public_state_patch(client_state, delta["data"])
+        snapshot = {"seq": delta["seq"]}
+
+    assert client_state == public_state(0, [6, 6])
+    assert [message["type"] for message in legacy.sent] == ["game_state"] * 3
+    assert legacy.sent[-1]["seq"] == snapshot["seq"]
+    assert len(json.dumps(syncing.sent[-1])) * 5 < len(json.dumps(legacy.sent[-1]))
+
+
+@pytest.mark.asyncio
+async def test_unknown_base_gets_a_full_snapshot():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = await connect(manager, sessions, sessions.add(table_id), table_id)
+    await manager.broadcast_to_table({"type": "game_state", "data": public_state(0, [7, 7])}, table_id)
+    await manager.drain()
+    websocket.sent.clear()
+
+    assert await manager.acknowledge_state(websocket, table_id, 12345)
+    await manager.drain()
+
+    assert websocket.sent == [{"type": "game_state", "seq": manager.state_stream.history.latest(table_id)[0],
+                               "data": public_state(0, [7, 7])}]
+
+
+@pytest.mark.asyncio
+async def test_resync_without_history_asks_the_caller_for_a_snapshot():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = await connect(manager, sessions, sessions.add(table_id), table_id)
+
+    assert not await manager.resync_state(websocket, table_id)
+    await manager.send_state_snapshot(websocket, table_id, public_state(1, [3, 4]))
+    await manager.broadcast_to_table({"type": "game_state", "data": public_state(0, [3, 3])}, table_id)
+    await manager.drain()
+
+    first, second = websocket.sent
+    assert first["type"] == "game_state"
+    assert second == {"type": "game_state_delta", "seq": second["seq"], "base_seq": first["seq"], "data": {
+        "current_player_id": 0,
+        "discard_top": {"color": "red", "type": "number", "value": 0},
+        "players": {"p1": {"hand_count": 3}},
+    }}
+
+
+def hand(*values):
+    return [{"color": "red", "type": "number", "value": value} for value in values]
+
+
+@pytest.mark.parametrize("old, new", [
+    (hand(1, 2, 3), hand(1, 3)),
+    (hand(1, 2, 3), hand(1, 2, 3, 4, 5)),
+    (hand(1, 2, 3), hand(2, 4)),
+    (hand(), hand(1)),
+    (hand(1, 2), hand()),
+])
+def test_hand_delta_round_trips(old, new):
+    assert apply_hand_delta(old, diff_hand(old, new)) == new
+
+
+def test_new_deal_is_not_a_delta():
+    assert diff_hand(hand(1, 2, 3), hand(4, 5, 6, 7)) is None
+
+
+@pytest.mark.asyncio
+async def test_acknowledged_hands_get_deltas():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    websocket = await connect(manager, sessions, token, table_id)
+
+    await manager.send_hand_snapshot(websocket, player_id, hand(1, 2, 3))
+    await manager.drain()
+    snapshot = websocket.sent[-1]
+    assert await manager.acknowledge_hand(websocket, snapshot["version"])
+
+    # Played the second card, then was forced to draw two
+    client_hand = snapshot["data"]
+    await manager.send_batch(table_id, [(player_id, {"type": "your_hand", "data": hand(1, 3)})])
+    await manager.send_to_player({"type": "your_hand", "data": hand(1, 3, 4, 5)}, player_id)
+    await manager.drain()
+
+    played, drawn = websocket.sent[-2:]
+    assert played == {"type": "hand_delta", "version": played["version"], "base_version": snapshot["version"],
+                      "data": {"removed": [1], "added": []}}
+    assert drawn["base_version"] == played["version"]
+    assert drawn["data"] == {"removed": [], "added": hand(4, 5)}
+    for delta in (played, drawn):
+        client_hand = apply_hand_delta(client_hand, delta["data"])
+    assert client_hand == hand(1, 3, 4, 5)
+
+
+@pytest.mark.asyncio
+async def test_divergent_hand_version_gets_the_full_hand():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    websocket = await connect(manager, sessions, token, table_id)
+    await manager.send_to_player({"type": "your_hand", "data": hand(1, 2)}, player_id)
+    await manager.drain()
+    websocket.sent.clear()
+
+    assert await manager.acknowledge_hand(websocket, 12345)
+    await manager.send_to_player({"type": "your_hand", "data": hand(7, 8, 9)}, player_id)
+    await manager.drain()
+
+    resync, new_deal = websocket.sent
+    assert resync == {"type": "your_hand", "version": resync["version"], "data": hand(1, 2)}
+    assert new_deal == {"type": "your_hand", "version": new_deal["version"], "data": hand(7, 8, 9)}
+    assert manager.hand_stream.bases[websocket] == new_deal["version"]
+
+
+@pytest.mark.asyncio
+async def test_table_resync_is_sent_in_full():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    websocket = await connect(manager, sessions, token, table_id)
+    await manager.send_state_snapshot(websocket, table_id, public_state(0, [3, 3]))
+    await manager.send_hand_snapshot(websocket, player_id, hand(1, 2, 3))
+    await manager.drain()
+    state_snapshot, hand_snapshot = websocket.sent
+    assert await manager.acknowledge_state(websocket, table_id, state_snapshot["seq"])
+    assert await manager.acknowledge_hand(websocket, hand_snapshot["version"])
+    websocket.sent.clear()
+
+    await manager.resync_table(table_id, public_state(1, [3, 4]), {player_id: hand(1, 2, 3, 4)})
+    await manager.drain()
+
+    [frame] = websocket.sent
+    state, own_hand = frame["data"]
+    assert state == {"type": "game_state", "seq": state["seq"], "data": public_state(1, [3, 4])}
+    assert own_hand == {"type": "your_hand", "version": own_hand["version"], "data": hand(1, 2, 3, 4)}
+    assert websocket not in manager.state_stream.bases and websocket not in manager.hand_stream.bases
+
+def test_compact_cards_replaces_card_dicts_with_codes():
+    wild = Card(color=CardColor.WILD, type=CardType.WILD)
+    message = {"type": "your_hand", "data": [wild.to_dict(), {"color": "red", "type": "number", "value": 7}]}
+
+    assert compact_cards(message) == {"type": "your_hand", "data": [52, 7]}
+
+
+@pytest.mark.asyncio
+async def test_clients_get_json_unless_they_offer_the_binary_protocol():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = await connect(manager, sessions, sessions.add(table_id), table_id, ["some.other.protocol"])
+
+    await manager.broadcast_to_table({"type": "uno_declared"}, table_id)
+    await manager.drain()
+
+    assert websocket.subprotocol is None
+    assert websocket.sent == [{"type": "uno_declared"}]
+    with pytest.raises(FrameDecodeError):
+        decode_frame("{not json")
+
+
+@needs_msgpack
+@pytest.mark.asyncio
+async def test_binary_clients_get_msgpack_with_card_codes():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    binary = await connect(manager, sessions, token, table_id, [MSGPACK_PROTOCOL])
+    text = await connect(manager, sessions, sessions.add(table_id), table_id)
+    card = {"color": "blue", "type": "skip", "value": None}
+
+    await manager.send_batch(table_id, [
+        (None, {"type": "card_played", "data": {"card": card}}),
+        (player_id, {"type": "your_hand", "data": [card]}),
+    ])
+    await manager.drain()
+
+    assert binary.subprotocol == MSGPACK_PROTOCOL
+    played, hand = binary.sent[0]["data"]
+    assert played == {"type": "card_played", "data": {"card": 49}}
+    assert hand["data"] == [49]
+    assert text.sent == [{"type": "card_played", "data": {"card": card}}]
+    assert decode_frame(msgpack.packb({"type": "ping"}), MSGPACK_PROTOCOL) == {"type": "ping"}
+
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_client_gets_only_the_missed_events():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token, other_token = sessions.add(table_id), sessions.add(table_id)
+    other = await connect(manager, sessions, other_token, table_id)
+    websocket = await connect(manager, sessions, token, table_id)
+    await manager.broadcast_to_table({"type": "card_played", "data": {"n": 1}}, table_id)
+    await manager.drain()
+
+    await manager.disconnect(websocket, sessions)
+    await manager.broadcast_to_table({"type": "card_played", "data": {"n": 2}}, table_id)
+    await manager.send_batch(table_id, [
+        (None, {"type": "turn_changed"}),
+        (str(sessions.sessions[other_token].player_id), {"type": "your_hand", "data": []}),
+    ])
+    reconnected = FakeWebSocket()
+    replayed = await manager.connect(reconnected, token, table_id, sessions, last_seq=websocket.event_seqs[-1])
+    await manager.drain()
+
+    assert replayed
+    assert reconnected.sent == [{"type": "batch", "data": [
+        {"type": "card_played", "data": {"n": 2}}, {"type": "turn_changed"}
+    ]}]
+    assert reconnected.event_seqs == other.event_seqs[1:3]
+
+
+@pytest.mark.asyncio
+async def test_replay_includes_the_players_own_messages():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    watcher = await connect(manager, sessions, sessions.add(table_id), table_id)
+    await manager.broadcast_to_table({"type": "game_started"}, table_id)
+    await manager.drain()
+
+    await manager.send_batch(table_id, [(player_id, {"type": "player_hand", "data": [1]})])
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, token, table_id, sessions, last_seq=watcher.event_seqs[-1])
+    await manager.drain()
+
+    assert watcher.sent == [{"type": "game_started"}]
+    assert websocket.sent == [{"type": "player_hand", "data": [1]}]
+
+
+@pytest.mark.asyncio
+async def test_gap_beyond_the_buffer_needs_a_snapshot():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    manager.event_log.size = 4
+    table_id = str(uuid.uuid4())
+    watcher = await connect(manager, sessions, sessions.add(table_id), table_id)
+    await manager.broadcast_to_table({"type": "card_played"}, table_id)
+    await manager.drain()
+    last_seq = watcher.event_seqs[-1]
+
+    for n in range(4):
+        await manager.broadcast_to_table({"type": "card_played", "data": {"n": n}}, table_id)
+    websocket = FakeWebSocket()
+    replayed = await manager.connect(websocket, sessions.add(table_id), table_id, sessions, last_seq=last_seq)
+    await manager.drain()
+
+    assert not replayed
+    assert websocket.sent == []
+
+
+
+@pytest.mark.asyncio
+async def test_connection_churn_does_not_leak():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    tables = [str(uuid.uuid4()) for _ in range(10)]
+    tokens = [(sessions.add(table_id), table_id) for table_id in tables for _ in range(10)]
+
+    async def churn(count):
+        for n in range(count):
+            token, table_id = tokens[n % len(tokens)]
+            websocket = FakeWebSocket()
+            await manager.connect(websocket, token, table_id, sessions)
+            if n % 7 == 0:
+                await manager.broadcast_to_table({"type": "card_played"}, table_id)
+            await manager.disconnect(websocket, sessions)
+            if n % 100 == 0:
+                await asyncio.sleep(0)  # let the cancelled writers finish
+        for _ in range(3):
+            await asyncio.sleep(0)
+        gc.collect()
+        return len(gc.get_objects())
+
+    # Warm up until every table's replay buffer is full
+    baseline = await churn(20_000)
+    after = await churn(100_000)
+
+    assert manager.connections == {} and manager.active_connections == {}
+    assert after - baseline < 100
+
+
+@pytest.mark.asyncio
+async def test_failed_connect_leaves_nothing_behind():
+    class BrokenSessions(FakeSessionManager):
+        async def get_session(self, session_token):
+            raise ConnectionError("database is down")
+
+    manager, sessions = ConnectionManager(), BrokenSessions()
+    table_id = str(uuid.uuid4())
+
+    with pytest.raises(ConnectionError):
+        await connect(manager, sessions, sessions.add(table_id), table_id)
+
+    assert manager.connections == {}
+    assert manager.active_connections == manager.player_connections == manager.session_connections == {}
+
+
+@pytest.mark.asyncio
+async def test_spectators_get_conflated_updates_at_a_limited_rate():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    manager.spectator_feed.interval = 0.05
+    table_id = str(uuid.uuid4())
+    player = await connect(manager, sessions, sessions.add(table_id), table_id)
+    spectators = [
+        await connect(manager, sessions, sessions.add(table_id, PlayerRole.SPECTATOR), table_id) for _ in range(3)
+    ]
+    assert table_id in manager.spectator_connections and len(manager.active_connections[table_id]) == 1
+
+    for n in range(10):
+        await manager.broadcast_to_table({"type": "card_played", "n": n}, table_id)
+    await manager.send_to_player({"type": "your_hand", "data": []}, str(next(iter(manager.player_connections))))
+    await manager.drain()
+
+    # The first update goes out right away, the rest wait for the interval
+    assert len(player.sent) == 11
+    assert all(ws.sent == [{"type": "card_played", "n": 0}] for ws in spectators)
+
+    await asyncio.sleep(0.1)
+    await manager.drain()
+    assert all(ws.sent[1:] == [{"type": "card_played", "n": 9}] for ws in spectators)
+    # With the event_seq of each message, as players get it
+    assert all(ws.event_seqs == [player.event_seqs[0], player.event_seqs[9]] for ws in spectators)
+
+    for ws in spectators:
+        await manager.disconnect(ws)
+    assert manager.spectator_connections == {}
+    assert manager.spectator_feed._latest == manager.spectator_feed._timers == {}
+    assert table_id in manager.active_connections
+
+
+def test_public_state_summarizes_spectators():
+    table = Table(name="busy")
+    table.spectators = [Player(username=f"watcher-{n}", role=PlayerRole.SPECTATOR) for n in range(50)]
+
+    state = GameState(table_id=table.id).to_public_dict(table)
+
+    assert state["spectator_count"] == 50
+    assert len(state["spectators"]) == SPECTATOR_SAMPLE_SIZE
+
+
+def test_spectator_summary_is_a_count_and_a_sample():
+    summary = summarize_spectators(list(range(50)), lambda n: {"n": n})
+
+    assert summary == {"spectators": [{"n": n} for n in range(SPECTATOR_SAMPLE_SIZE)], "spectator_count": 50}
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_spectator_replays_from_its_last_event_seq():
+    manager, sessions = ConnectionManager(), FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id, PlayerRole.SPECTATOR)
+    player = await connect(manager, sessions, sessions.add(table_id), table_id)
+    spectator = await connect(manager, sessions, token, table_id)
+    await manager.broadcast_to_table({"type": "card_played", "data": {"n": 1}}, table_id)
+    await manager.drain()
+
+    await manager.disconnect(spectator, sessions)
+    await manager.broadcast_to_table({"type": "card_played", "data": {"n": 2}}, table_id)
+    reconnected = FakeWebSocket()
+    replayed = await manager.connect(reconnected, token, table_id, sessions, last_seq=spectator.event_seqs[-1])
+    await manager.drain()
+
+    assert replayed
+    assert reconnected.sent == [{"type": "card_played", "data": {"n": 2}}]
+    assert reconnected.event_seqs == player.event_seqs[1:]
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.event_bus import InMemoryBroker, InMemoryEventBus, RedisEventBus, table_channel
+from test_connection_manager import FakeSessionManager, connect
+
+
+async def workers(count, broker=None):
+    broker = broker or InMemoryBroker()
+    managers = [ConnectionManager() for _ in range(count)]
+    for manager in managers:
+        await manager.use_bus(InMemoryEventBus(broker))
+    return managers, broker
+
+
+async def drain(managers):
+    for manager in managers:
+        await manager.drain()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_sockets_of_other_workers_once():
+    (first, second), _ = await workers(2)
+    sessions = FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    local = await connect(first, sessions, sessions.add(table_id), table_id)
+    remote = await connect(second, sessions, sessions.add(table_id), table_id)
+
+    await first.broadcast_to_table({"type": "card_played"}, table_id)
+    await drain([first, second])
+
+    assert local.sent == remote.sent == [{"type": "card_played"}]
+
+
+@pytest.mark.asyncio
+async def test_personal_messages_follow_the_player_to_its_worker():
+    (first, second), _ = await workers(2)
+    sessions = FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    token = sessions.add(table_id)
+    player_id = str(sessions.sessions[token].player_id)
+    other = await connect(first, sessions, sessions.add(table_id), table_id)
+    target = await connect(second, sessions, token, table_id)
+
+    await first.send_batch(table_id, [(None, {"type": "card_played"}), (player_id, {"type": "your_hand", "data": []})])
+    await first.send_to_player({"type": "error"}, player_id)
+    await drain([first, second])
+
+    assert other.sent == [{"type": "card_played"}]
+    assert target.sent[0]["type"] == "batch"
+    assert [message["type"] for message in target.sent[0]["data"]] == ["card_played", "your_hand"]
+    assert target.sent[1] == {"type": "error"}
+
+
+@pytest.mark.asyncio
+async def test_workers_only_subscribe_to_tables_they_hold_sockets_for():
+    (first, second), broker = await workers(2)
+    sessions = FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    websocket = await connect(second, sessions, sessions.add(table_id), table_id)
+
+    assert broker.subscribers[table_channel(table_id)] == {second.bus}
+
+    await second.disconnect(websocket, sessions)
+    assert broker.subscribers == {}
+
+
+@pytest.mark.asyncio
+async def test_redis_bus():
+    # A real server if TEST_REDIS_URL names one, else fakeredis in process
+    url = os.getenv("TEST_REDIS_URL")
+    prefix = f"test-{uuid.uuid4().hex}:"
+    buses = [RedisEventBus(url or "redis://localhost", prefix=prefix) for _ in range(2)]
+    if url is None:
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        for bus in buses:
+            bus._redis = fakeredis.FakeAsyncRedis(server=server)
+            bus._pubsub = bus._redis.pubsub(ignore_subscribe_messages=True)
+    await buses[0]._redis.ping()
+    managers = [ConnectionManager(), ConnectionManager()]
+    for manager, bus in zip(managers, buses):
+        await manager.use_bus(bus)
+    sessions = FakeSessionManager()
+    table_id = str(uuid.uuid4())
+    remote = await connect(managers[1], sessions, sessions.add(table_id), table_id)
+
+    await managers[0].broadcast_to_table({"type": "card_played"}, table_id)
+    for _ in range(100):
+        await drain(managers)
+        if remote.sent:
+            break
+        await asyncio.sleep(0.01)
+
+    assert remote.sent == [{"type": "card_played"}]
+    for manager in managers:
+        await manager.use_bus(None)
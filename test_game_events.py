@@ -0,0 +1,131 @@
+import uuid
+
+import pytest
+
+from app.database.models import GameStateModel
+from app.game_logic.game_actions import GameActionHandler
+from app.game_logic.game_events import apply_event, capture_game, diff_game
+from app.models import GameState, Player, Table
+from app.repositories.game_event_repository import GameEventRepository
+from app.repositories.game_state_repository import GameStateRepository
+from app.repositories.table_repository import TableRepository
+from app.schemas import CardColor, UnoDeclarationState
+from test_table_repository import create_table_with_players
+
+
+def started_game(table):
+    game_state = GameState(table_id=table.id)
+    game_state.initialize_game(table)
+    return game_state
+
+
+def copy_game(table, game_state):
+    return table.model_copy(deep=True), game_state.model_copy(deep=True)
+
+
+def test_diff_and_apply_reproduce_the_action():
+    table = Table(name="t", players=[Player(username="a"), Player(username="b"), Player(username="c")])
+    game_state = started_game(table)
+    replica_table, replica_state = copy_game(table, game_state)
+
+    before = capture_game(table, game_state)
+    played = table.players[0].play_card(0).model_copy(update={"color": CardColor.BLUE})
+    game_state.discard_pile.append(played)
+    game_state.draw_cards_for_player(table.players[1], 2)
+    table.players[2].uno_declaration = UnoDeclarationState.PENDING
+    game_state.reverse_direction()
+    game_state.next_turn(table)
+    game_state.last_action = {"type": "card_played"}
+    payload = diff_game(before, capture_game(table, game_state))
+
+    apply_event(replica_table, replica_state, payload)
+
+    assert payload["draw_taken"] == 2
+    assert set(payload["hands"]) == {str(table.players[0].id), str(table.players[1].id)}
+    assert capture_game(replica_table, replica_state) == capture_game(table, game_state)
+
+
+def test_reshuffle_stores_the_new_draw_pile():
+    table = Table(name="t", players=[Player(username="a"), Player(username="b")])
+    game_state = started_game(table)
+    game_state.discard_pile = game_state.draw_pile[:30]
+    game_state.draw_pile = []
+    replica_table, replica_state = copy_game(table, game_state)
+
+    before = capture_game(table, game_state)
+    game_state.draw_cards_for_player(table.players[0], 1)
+    payload = diff_game(before, capture_game(table, game_state))
+
+    apply_event(replica_table, replica_state, payload)
+
+    assert "draw_pile" in payload
+    assert "discard_pile" in payload
+    assert capture_game(replica_table, replica_state) == capture_game(table, game_state)
+
+
+async def start_game(db, player_count=3):
+    created = await create_table_with_players(db, player_count=player_count)
+    table, game_state = await TableRepository(db).get_table_with_game_state(created.id)
+    before = capture_game(table, game_state)
+    game_state.initialize_game(table)
+    await GameActionHandler._save_action(db, table, game_state, before, "start_game", table.players[0].id)
+    return table, game_state
+
+
+async def draw_for_current_player(db, table, game_state):
+    before = capture_game(table, game_state)
+    player = game_state.get_current_player(table)
+    game_state.draw_cards_for_player(player, 1)
+    game_state.next_turn(table)
+    await GameActionHandler._save_action(db, table, game_state, before, "draw_card", player.id)
+
+
+@pytest.mark.asyncio
+async def test_each_move_is_one_insert(db, statement_counter):
+    table, game_state = await start_game(db)
+
+    statement_counter.clear()
+    await draw_for_current_player(db, table, game_state)
+
+    assert len(statement_counter) == 1
+    assert statement_counter[0].startswith("INSERT INTO game_events")
+
+
+@pytest.mark.asyncio
+async def test_state_is_rebuilt_from_snapshot_and_events(db, monkeypatch):
+    monkeypatch.setattr("app.game_logic.game_actions.GAME_SNAPSHOT_INTERVAL", 4)
+    table, game_state = await start_game(db)
+
+    for _ in range(6):
+        await draw_for_current_player(db, table, game_state)
+
+    # Start wrote a snapshot at seq 1, the interval another at seq 5
+    stored = await db.get(GameStateModel, table.id, populate_existing=True)
+    assert stored.event_seq == 5
+    events = await GameEventRepository(db).get_events_after(table.id, 0)
+    assert [event.seq for event in events] == list(range(1, 8))
+
+    loaded_table, loaded_state = await TableRepository(db).get_table_with_game_state(table.id)
+    assert loaded_state.event_seq == 7
+    assert capture_game(loaded_table, loaded_state) == capture_game(table, game_state)
+
+    standalone_state = await GameStateRepository(db).get_game_state(table.id)
+    assert standalone_state.draw_pile == game_state.draw_pile
+    assert standalone_state.current_player_index == game_state.current_player_index
+
+
+@pytest.mark.asyncio
+async def test_load_query_count_is_constant_during_a_game(db, statement_counter):
+    small, small_state = await start_game(db, player_count=2)
+    large, large_state = await start_game(db, player_count=10)
+    await draw_for_current_player(db, small, small_state)
+    await draw_for_current_player(db, large, large_state)
+
+    counts = []
+    for table in (small, large):
+        statement_counter.clear()
+        await TableRepository(db).get_table_with_game_state(table.id)
+        counts.append(len(statement_counter))
+
+    assert counts == [2, 2]
+
@@ -0,0 +1,100 @@
+import pytest
+from sqlalchemy import update
+
+from app.database.models import GameStateModel
+from app.database.unit_of_work import ConcurrentUpdateError
+from app.game_logic.game_actions import GameActionHandler
+from app.repositories.game_event_repository import GameEventRepository
+from app.repositories.game_state_repository import GameStateRepository
+from app.repositories.table_repository import TableRepository
+from test_game_events import start_game
+from test_table_repository import create_table_with_players
+
+
+@pytest.mark.asyncio
+async def test_stale_snapshot_write_is_rejected(db):
+    table, game_state = await start_game(db)
+    stale = game_state.model_copy(deep=True)
+
+    await GameStateRepository(db).update_game_state(game_state)
+    assert game_state.version == stale.version + 1
+
+    stale.current_player_index = 2
+    with pytest.raises(ConcurrentUpdateError):
+        await GameStateRepository(db).update_game_state(stale)
+
+    row = await db.get(GameStateModel, table.id, populate_existing=True)
+    assert row.version == game_state.version
+    assert row.current_player_index == game_state.current_player_index
+
+
+@pytest.mark.asyncio
+async def test_reused_event_seq_is_a_conflict(db):
+    table, game_state = await start_game(db)
+
+    with pytest.raises(ConcurrentUpdateError):
+        await GameEventRepository(db).append_event(table.id, game_state.event_seq, "draw_card", None, {})
+
+
+@pytest.mark.asyncio
+async def test_action_is_retried_after_a_conflict(db, commits, sent, monkeypatch):
+    table, game_state = await start_game(db)
+    player = game_state.get_current_player(table)
+    append_event = GameEventRepository.append_event
+    calls = []
+
+    async def racing_append_event(self, table_id, seq, *args):
+        calls.append(seq)
+        if len(calls) == 1:
+            # Another action takes this sequence number first
+            await append_event(self, table_id, seq, "declare_uno", None, {})
+        await append_event(self, table_id, seq, *args)
+
+    monkeypatch.setattr(GameEventRepository, "append_event", racing_append_event)
+    commits.clear()
+    result = await GameActionHandler.handle_draw_card(str(table.id), player, db)
+
+    assert result["success"]
+    assert calls == [game_state.event_seq + 1] * 2
+    assert len(commits) == 1
+    events = await GameEventRepository(db).get_events_after(table.id, game_state.event_seq)
+    assert [event.type for event in events] == ["draw_card"]
+
+
+@pytest.mark.asyncio
+async def test_action_gives_up_after_repeated_conflicts(db, sent, monkeypatch):
+    table, game_state = await start_game(db)
+    player = game_state.get_current_player(table)
+
+    async def always_conflicting(self, *args):
+        raise ConcurrentUpdateError("taken")
+
+    monkeypatch.setattr(GameEventRepository, "append_event", always_conflicting)
+    result = await GameActionHandler.handle_draw_card(str(table.id), player, db)
+
+    assert not result["success"]
+    assert sent == []
+    reloaded, reloaded_state = await TableRepository(db).get_table_with_game_state(table.id)
+    assert reloaded_state.event_seq == game_state.event_seq
+
+
+@pytest.mark.asyncio
+async def test_conflicting_game_start_is_rolled_back_and_retried(db, sent, monkeypatch):
+    created = await create_table_with_players(db, player_count=3)
+    table = await TableRepository(db).get_table(created.id)
+    update_game_state = GameStateRepository.update_game_state
+    calls = []
+
+    async def racing_update_game_state(self, game_state):
+        calls.append(game_state.event_seq)
+        if len(calls) == 1:
+            raise ConcurrentUpdateError("another start won")
+        await update_game_state(self, game_state)
+
+    monkeypatch.setattr(GameStateRepository, "update_game_state", racing_update_game_state)
+    result = await GameActionHandler.handle_start_game(str(table.id), table.players[0], db)
+
+    assert result["success"]
+    assert len(calls) == 2
+    events = await GameEventRepository(db).get_events_after(table.id, 0)
+    assert [event.type for event in events] == ["start_game"]
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import PlayerModel
+from app.game_logic.game_actions import GameActionHandler
+from app.repositories.table_repository import TableRepository
+from app.websocket.presence import PresenceTracker
+from test_game_events import start_game
+from test_table_repository import create_table_with_players
+
+
+@pytest.fixture
+def presence(db_engine):
+    return PresenceTracker(
+        debounce=0.05, session_factory=sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+
+
+async def seated_players(db, count):
+    created = await create_table_with_players(db, player_count=count)
+    return (await TableRepository(db).get_table(created.id)).players
+
+
+async def online_status(db, players):
+    result = await db.execute(select(PlayerModel.id, PlayerModel.is_online).execution_options(populate_existing=True))
+    status = dict(result.all())
+    return [status[player.id] for player in players]
+
+
+@pytest.mark.asyncio
+async def test_changes_are_written_once_settled(db, presence):
+    first, second = await seated_players(db, 2)
+
+    presence.set(first.id, False)
+    assert await presence.flush() == 0
+    await asyncio.sleep(0.06)
+    presence.set(second.id, False)
+
+    assert await presence.flush() == 1
+    assert await online_status(db, [first, second]) == [False, True]
+    assert presence.pending() == {str(second.id): False}
+
+
+@pytest.mark.asyncio
+async def test_flapping_connection_writes_nothing(db, presence, statement_counter):
+    [player] = await seated_players(db, 1)
+    presence.set(player.id, True)
+    await presence.flush(force=True)
+
+    statement_counter.clear()
+    for _ in range(10):
+        presence.set(player.id, False)
+        presence.set(player.id, True)
+    await asyncio.sleep(0.06)
+
+    assert await presence.flush() == 0
+    assert statement_counter == []
+
+
+@pytest.mark.asyncio
+async def test_one_update_of_is_online_per_status(db, presence, statement_counter):
+    players = await seated_players(db, 5)
+    for player in players[:3]:
+        presence.set(player.id, False)
+    for player in players[3:]:
+        presence.set(player.id, True)
+
+    statement_counter.clear()
+    assert await presence.flush(force=True) == 5
+
+    updates = [statement for statement in statement_counter if statement.startswith("UPDATE")]
+    assert len(updates) == 2
+    assert all(update.startswith("UPDATE players SET is_online=?") for update in updates)
+    assert await online_status(db, players) == [False, False, False, True, True]
+
+
+@pytest.mark.asyncio
+async def test_written_status_reaches_tables_held_in_memory(db, presence, table_actors, sent):
+    table, game_state = await start_game(db)
+    table_id = str(table.id)
+    await GameActionHandler.handle_draw_card(table_id, game_state.get_current_player(table), db)
+    presence.on_written = table_actors.set_online
+    leaving = table.players[1]
+
+    presence.set(leaving.id, False)
+    await presence.flush(force=True)
+
+    hot_table, hot_state = table_actors.hot_state(table_id)
+    public = {p["id"]: p["is_online"] for p in hot_state.to_public_dict(hot_table)["players"]}
+    assert public[str(leaving.id)] is False
+    assert list(public.values()).count(True) == len(table.players) - 1
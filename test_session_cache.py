@@ -0,0 +1,105 @@
+import uuid
+
+import pytest
+
+from app.repositories.session_repository import SessionRepository
+from app.repositories.table_repository import TableRepository
+from app.schemas import PlayerRole
+from app.utils import session_cache as session_cache_module
+from app.utils.session_cache import CachedSession, SessionCache, session_cache
+from test_table_repository import create_table_with_players
+
+
+def cached_session(player_id=None):
+    return CachedSession(player_id or uuid.uuid4(), uuid.uuid4(), PlayerRole.PLAYER)
+
+
+def test_cache_counts_hits_and_misses():
+    cache = SessionCache(max_size=10, ttl=60)
+    cache.put("a", cached_session())
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_cache_drops_least_recently_used():
+    cache = SessionCache(max_size=2, ttl=60)
+    cache.put("a", cached_session())
+    cache.put("b", cached_session())
+    cache.get("a")
+    cache.put("c", cached_session())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_cache_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(session_cache_module.time, "monotonic", lambda: now[0])
+    cache = SessionCache(max_size=10, ttl=5)
+    cache.put("a", cached_session())
+
+    now[0] += 4
+    assert cache.get("a") is not None
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_player_drops_all_their_tokens():
+    cache = SessionCache(max_size=10, ttl=60)
+    player_id = uuid.uuid4()
+    cache.put("a", cached_session(player_id))
+    cache.put("b", cached_session(player_id))
+    cache.put("c", cached_session())
+
+    cache.invalidate_player(player_id)
+
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+async def create_session(db):
+    created = await create_table_with_players(db, player_count=1)
+    table = await TableRepository(db).get_table(created.id)
+    token = await SessionRepository(db).create_session(table.players[0], str(table.id))
+    return table, token
+
+
+@pytest.mark.asyncio
+async def test_repository_resolves_sessions_without_queries(db, statement_counter):
+    table, token = await create_session(db)
+    session_cache.invalidate(token)
+
+    statement_counter.clear()
+    first = await SessionRepository(db).get_session(token)
+    second = await SessionRepository(db).get_session(token)
+
+    assert len(statement_counter) == 1
+    assert first == second == CachedSession(table.players[0].id, table.id, PlayerRole.PLAYER)
+
+
+@pytest.mark.asyncio
+async def test_removed_session_is_not_served_from_the_cache(db):
+    table, token = await create_session(db)
+    assert await SessionRepository(db).get_session(token) is not None
+
+    await SessionRepository(db).remove_session(token)
+
+    assert session_cache.get(token) is None
+    assert await SessionRepository(db).get_session(token) is None
+
+
+@pytest.mark.asyncio
+async def test_role_change_invalidates_the_players_sessions(db):
+    table, token = await create_session(db)
+    player = table.players[0]
+    assert session_cache.get(token).role == PlayerRole.PLAYER
+
+    player.role = PlayerRole.SPECTATOR
+    await TableRepository(db).update_table(table)
+
+    assert session_cache.get(token) is None
+    assert (await SessionRepository(db).get_session(token)).role == PlayerRole.SPECTATOR
@@ -0,0 +1,41 @@
+import pytest
+
+from app.repositories.session_repository import SessionRepository
+from app.schemas import PlayerRole
+from test_game_events import start_game
+
+
+@pytest.mark.asyncio
+async def test_session_resolves_in_one_query(db, statement_counter):
+    table, game_state = await start_game(db)
+    expected = table.players[0]
+    token = await SessionRepository(db).create_session(expected, str(table.id))
+
+    statement_counter.clear()
+    player = await SessionRepository(db).get_player_from_session(token)
+
+    assert len(statement_counter) == 1
+    assert player.id == expected.id
+    assert player.user_id == expected.user_id
+    assert player.username == expected.username
+    assert player.role == PlayerRole.PLAYER
+    assert player.hand == expected.hand and len(player.hand) == 7
+
+
+@pytest.mark.asyncio
+async def test_session_can_skip_the_hand(db, statement_counter):
+    table, game_state = await start_game(db)
+    token = await SessionRepository(db).create_session(table.players[1], str(table.id))
+
+    statement_counter.clear()
+    player = await SessionRepository(db).get_player_from_session(token, include_hand=False)
+
+    assert len(statement_counter) == 1
+    assert "hand" not in statement_counter[0].split("FROM")[0]
+    assert player.id == table.players[1].id
+    assert player.hand == []
+
+
+@pytest.mark.asyncio
+async def test_unknown_session_has_no_player(db):
+    assert await SessionRepository(db).get_player_from_session("missing") is None
@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.models import Player
+from app.schemas import CardColor
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.event_bus import InMemoryBroker, InMemoryEventBus
+from app.websocket.sharding import HashRing, TableRouter
+
+
+def test_removing_a_node_only_moves_its_keys():
+    ring = HashRing(["a", "b", "c"])
+    keys = [str(uuid.uuid4()) for _ in range(3000)]
+    before = {key: ring.owner(key) for key in keys}
+
+    ring.remove("b")
+
+    assert {before[key] for key in keys} == {"a", "b", "c"}
+    assert min(list(before.values()).count(node) for node in "abc") > 600
+    assert all(ring.owner(key) == before[key] for key in keys if before[key] != "b")
+
+
+async def routers(count, **kwargs):
+    broker = InMemoryBroker()
+    result = []
+    for _ in range(count):
+        manager = ConnectionManager()
+        await manager.use_bus(InMemoryEventBus(broker))
+        router = TableRouter(manager, **kwargs)
+        router.register_types(Player, CardColor)
+        ran = []
+
+        async def executor(action, args, ran=ran):
+            ran.append((action, args))
+            return {"success": True}
+
+        router.executor = executor
+        router.ran = ran
+        await router.start()
+        result.append(router)
+    return result
+
+
+def table_owned_by(router):
+    return next(table_id for table_id in (str(uuid.uuid4()) for _ in range(1000)) if router.owner(table_id) == router.worker_id)
+
+
+@pytest.mark.asyncio
+async def test_actions_are_forwarded_to_the_owner():
+    first, second = await routers(2)
+    table_id = table_owned_by(second)
+    player = Player(username="alice")
+
+    assert first.ring.nodes == second.ring.nodes == {first.worker_id, second.worker_id}
+    assert not first.owns(table_id) and second.owns(table_id)
+
+    result = await first.forward(table_id, "_play_card", [table_id, player, 2, CardColor.RED])
+
+    assert result == {"success": True}
+    assert first.ran == []
+    [(action, args)] = second.ran
+    assert action == "_play_card"
+    assert args == [table_id, player, 2, CardColor.RED]
+    assert isinstance(args[1], Player) and isinstance(args[3], CardColor)
+    for router in (first, second):
+        await router.stop()
+
+
+@pytest.mark.asyncio
+async def test_tables_move_when_the_owner_shuts_down():
+    first, second, third = await routers(3)
+    table_id = table_owned_by(second)
+
+    await second.stop()
+
+    assert first.ring.nodes == third.ring.nodes == {first.worker_id, third.worker_id}
+    assert first.owner(table_id) == third.owner(table_id) != second.worker_id
+    for router in (first, third):
+        await router.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_owner_is_not_bypassed():
+    first, second = await routers(2, forward_timeout=0.05)
+    table_id = table_owned_by(second)
+    second.executor = lambda action, args: asyncio.sleep(1)
+
+    result = await first.forward(table_id, "_draw_card", [table_id])
+
+    assert not result["success"]
+    assert first.ran == []
+    assert not first.owns(table_id)
+    for router in (first, second):
+        router._heartbeat_task.cancel()
+        for task in list(router._in_flight):
+            task.cancel()
@@ -0,0 +1,198 @@
+import asyncio
+
+import pytest
+
+from app.database.unit_of_work import ConcurrentUpdateError
+from app.game_logic import game_actions
+from app.game_logic.game_actions import GameActionHandler
+from app.repositories.game_event_repository import GameEventRepository
+from app.websocket.sharding import table_router
+from test_game_events import start_game
+
+
+@pytest.mark.asyncio
+async def test_actions_on_one_table_run_one_at_a_time(db, table_actors):
+    running, overlaps = set(), []
+
+    async def action(uow, table_id, name):
+        overlaps.append(set(running))
+        running.add(name)
+        await asyncio.sleep(0.01)
+        running.discard(name)
+        return {"success": True, "name": name}
+
+    results = await asyncio.gather(*(table_actors.submit(db, "t1", action, "t1", n) for n in range(5)))
+    other = await asyncio.gather(
+        table_actors.submit(db, "t1", action, "t1", "a"), table_actors.submit(db, "t2", action, "t2", "b")
+    )
+
+    assert [result["name"] for result in results] == list(range(5))
+    assert overlaps[:5] == [set()] * 5
+    assert overlaps[5:] in ([set(), {"a"}], [set(), {"b"}])
+    assert all(result["success"] for result in other)
+
+
+@pytest.mark.asyncio
+async def test_second_action_uses_the_table_in_memory(db, table_actors, sent, statement_counter):
+    table, game_state = await start_game(db)
+    player = game_state.get_current_player(table)
+    await GameActionHandler.handle_draw_card(str(table.id), player, db)
+    hot_table, hot_state = table_actors.hot_state(str(table.id))
+    next_player = hot_state.get_current_player(hot_table)
+
+    statement_counter.clear()
+    result = await GameActionHandler.handle_draw_card(str(table.id), next_player, db)
+
+    assert result["success"]
+    assert not any(statement.startswith("SELECT") for statement in statement_counter)
+
+
+@pytest.mark.asyncio
+async def test_write_behind_broadcasts_first_and_commits_within_the_lag(db, table_actors, commits, sent):
+    table, game_state = await start_game(db)
+    player = game_state.get_current_player(table)
+    table_actors.write_behind_lag = 0.05
+
+    commits.clear()
+    result = await GameActionHandler.handle_draw_card(str(table.id), player, db)
+
+    assert result["success"]
+    assert sent and all(commit_count == 0 for _, commit_count in sent)
+    await asyncio.sleep(0.1)
+    assert len(commits) == 1
+    events = await GameEventRepository(db).get_events_after(table.id, game_state.event_seq)
+    assert [event.type for event in events] == ["draw_card"]
+
+
+@pytest.mark.asyncio
+async def test_idle_tables_leave_memory(db, table_actors, sent):
+    table, game_state = await start_game(db)
+    table_actors.idle_timeout = 0.05
+
+    await GameActionHandler.handle_draw_card(str(table.id), game_state.get_current_player(table), db)
+    assert table_actors.hot_state(str(table.id)) is not None
+    await asyncio.sleep(0.1)
+
+    assert table_actors.actors == {}
+    assert table_actors.hot_state(str(table.id)) is None
+
+
+@pytest.mark.asyncio
+async def test_queue_metrics(db, table_actors):
+    async def action(uow, table_id):
+        await asyncio.sleep(0.01)
+        return {"success": True}
+
+    await asyncio.gather(*(table_actors.submit(db, "t1", action, "t1") for _ in range(3)))
+
+    stats = table_actors.stats()["t1"]
+    assert stats["jobs"] == 3
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] >= 2
+    assert stats["max_wait_ms"] >= 10
+
+
+@pytest.mark.asyncio
+async def test_bot_turn_and_human_move_do_not_interleave(db, table_actors, sent):
+    table, game_state = await start_game(db)
+    table_id = str(table.id)
+    current = game_state.get_current_player(table)
+
+    # The same seat tries to move while the bot is taking its turn
+    _, human_result = await asyncio.gather(
+        GameActionHandler.handle_bot_turn(table_id, str(current.id), db),
+        GameActionHandler.handle_draw_card(table_id, current, db),
+    )
+
+    hot_table, hot_state = table_actors.hot_state(table_id)
+    assert human_result == {"success": False, "error": "Not your turn"}
+    assert hot_state.event_seq == game_state.event_seq + 1
+    assert hot_state.get_current_player(hot_table).id != current.id
+
+
+@pytest.mark.asyncio
+async def test_bot_turn_is_retried_after_a_conflict(db, table_actors, sent, monkeypatch):
+    table, game_state = await start_game(db)
+    table_id = str(table.id)
+    current = game_state.get_current_player(table)
+    append_event = GameEventRepository.append_event
+    conflicts = []
+
+    async def racing_append_event(self, *args):
+        if not conflicts:
+            conflicts.append(args[1])
+            raise ConcurrentUpdateError("taken")
+        await append_event(self, *args)
+
+    monkeypatch.setattr(GameEventRepository, "append_event", racing_append_event)
+    result = await GameActionHandler.handle_bot_turn(table_id, str(current.id), db)
+
+    hot_table, hot_state = table_actors.hot_state(table_id)
+    assert result["success"]
+    assert conflicts == [game_state.event_seq + 1]
+    assert hot_state.event_seq > game_state.event_seq
+    assert hot_state.get_current_player(hot_table).id != current.id
+
+
+@pytest.mark.asyncio
+async def test_bot_turn_goes_to_the_tables_owner(db, table_actors, sent, monkeypatch):
+    table, game_state = await start_game(db)
+    table_id = str(table.id)
+    current = game_state.get_current_player(table)
+    forwarded = []
+
+    async def forward(table_id, action_name, args):
+        forwarded.append((action_name, args))
+        return {"success": True}
+
+    monkeypatch.setattr(table_router, "owns", lambda table_id: False)
+    monkeypatch.setattr(table_router, "forward", forward)
+    result = await GameActionHandler.handle_bot_turn(table_id, str(current.id), db)
+
+    assert result == {"success": True}
+    assert forwarded == [("_bot_turn", [table_id, str(current.id)])]
+    assert table_actors.actors == {}
+
+
+@pytest.mark.asyncio
+async def test_failed_write_behind_commit_resyncs_the_table(db, table_actors, commits, sent, monkeypatch):
+    table, game_state = await start_game(db)
+    table_id = str(table.id)
+    player = game_state.get_current_player(table)
+    table_actors.write_behind_lag = 0.05
+    await GameActionHandler.handle_draw_card(table_id, player, db)
+    actor = table_actors.actors[table_id]
+    _, uncommitted = table_actors.hot_state(table_id)
+
+    async def failing_commit():
+        raise ConnectionError("database went away")
+
+    monkeypatch.setattr(actor.db, "commit", failing_commit)
+    sent.clear()
+    await asyncio.sleep(0.1)
+
+    assert [message_type for message_type, _ in sent] == ["game_state"] + ["your_hand"] * len(table.players)
+    # The resync was loaded from the database, not from the dropped objects
+    assert table_actors.hot_state(table_id)[1] is not uncommitted
+
+
+@pytest.mark.asyncio
+async def test_bot_check_does_not_hold_up_the_table_queue(db, table_actors, monkeypatch):
+    checked = []
+
+    async def check_and_handle_bot_turn(table_id):
+        checked.append(table_id)
+
+    monkeypatch.setattr(game_actions, "check_and_handle_bot_turn", check_and_handle_bot_turn)
+
+    async def action(uow, table_id):
+        uow.after_commit(GameActionHandler._trigger_bot_if_needed, table_id)
+        return {"success": True}
+
+    await table_actors.submit(db, "t1", action, "t1")
+    await table_actors.submit(db, "t1", action, "t1")
+
+    assert table_actors.stats()["t1"]["max_wait_ms"] < 50
+    assert checked == []
+    await asyncio.sleep(0.15)
+    assert checked == ["t1", "t1"]
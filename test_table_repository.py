@@ -0,0 +1,227 @@
+import uuid
+import time
+
+import pytest
+from sqlalchemy import insert
+
+from app.database.migrations import run_migrations
+from app.database.models import PlayerModel, UserModel
+from app.models import Card, Player
+from app.repositories.player_repository import PlayerRepository
+from app.repositories.table_repository import TableRepository
+from app.schemas import CardColor, CardType, GameStatus, PlayerRole, UnoDeclarationState
+
+
+async def create_table_with_players(db, player_count: int, spectator_count: int = 0):
+    table_repo = TableRepository(db)
+    player_repo = PlayerRepository(db)
+    table = await table_repo.create_table(f"table-{uuid.uuid4()}", max_players=10)
+
+    roles = [PlayerRole.PLAYER] * player_count + [PlayerRole.SPECTATOR] * spectator_count
+    for role in roles:
+        name = f"user-{uuid.uuid4()}"
+        user = UserModel(id=uuid.uuid4(), username=name, email=f"{name}@test.uno", created_at=int(time.time()))
+        db.add(user)
+        await db.commit()
+        await player_repo.create_player(Player(username=name, role=role), table.id, user.id)
+    return table
+
+
+async def count_load_statements(db, statement_counter, table_id) -> int:
+    statement_counter.clear()
+    await TableRepository(db).get_table_with_game_state(table_id)
+    return len(statement_counter)
+
+
+@pytest.mark.asyncio
+async def test_get_table_with_game_state_loads_everything(db):
+    created = await create_table_with_players(db, player_count=3, spectator_count=2)
+
+    table, game_state = await TableRepository(db).get_table_with_game_state(created.id)
+
+    assert table.name == created.name
+    assert len(table.players) == 3
+    assert len(table.spectators) == 2
+    assert all(p.username.startswith("user-") for p in table.players + table.spectators)
+    assert game_state is not None
+    assert game_state.status == GameStatus.WAITING
+
+
+@pytest.mark.asyncio
+async def test_get_table_query_count_does_not_grow_with_players(db, statement_counter):
+    small = await create_table_with_players(db, player_count=2)
+    large = await create_table_with_players(db, player_count=10, spectator_count=15)
+
+    small_count = await count_load_statements(db, statement_counter, small.id)
+    large_count = await count_load_statements(db, statement_counter, large.id)
+
+    assert small_count == large_count
+    assert small_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_table_missing_returns_none(db):
+    table, game_state = await TableRepository(db).get_table_with_game_state(uuid.uuid4())
+    assert table is None
+    assert game_state is None
+
+
+@pytest.mark.asyncio
+async def test_get_table_sees_players_added_after_first_load(db):
+    created = await create_table_with_players(db, player_count=1)
+    table_repo = TableRepository(db)
+    assert len((await table_repo.get_table(created.id)).players) == 1
+
+    name = f"user-{uuid.uuid4()}"
+    user = UserModel(id=uuid.uuid4(), username=name, email=f"{name}@test.uno", created_at=int(time.time()))
+    db.add(user)
+    await db.commit()
+    await PlayerRepository(db).create_player(Player(username=name), created.id, user.id)
+
+    assert len((await table_repo.get_table(created.id)).players) == 2
+
+
+@pytest.mark.asyncio
+async def test_list_tables_counts_players_and_spectators(db, statement_counter):
+    created = await create_table_with_players(db, player_count=3, spectator_count=4)
+    await create_table_with_players(db, player_count=0)
+
+    statement_counter.clear()
+    tables, next_cursor = await TableRepository(db).list_tables()
+
+    assert len(statement_counter) == 1
+    assert next_cursor is None
+    assert len(tables) == 2
+    listed = next(t for t in tables if t["id"] == str(created.id))
+    assert listed["player_count"] == 3
+    assert listed["spectator_count"] == 4
+    assert listed["status"] == "waiting"
+
+
+@pytest.mark.asyncio
+async def test_list_tables_filters_by_status_and_hides_completed(db):
+    table_repo = TableRepository(db)
+    waiting = await create_table_with_players(db, player_count=1)
+    in_progress = await create_table_with_players(db, player_count=2)
+    completed = await create_table_with_players(db, player_count=2)
+    for table_id, status in ((in_progress.id, GameStatus.IN_PROGRESS), (completed.id, GameStatus.COMPLETED)):
+        table = await table_repo.get_table(table_id)
+        table.status = status
+        await table_repo.update_table(table)
+
+    default_ids = {t["id"] for t in (await table_repo.list_tables())[0]}
+    assert default_ids == {str(waiting.id), str(in_progress.id)}
+
+    all_ids = {t["id"] for t in (await table_repo.list_tables(include_completed=True))[0]}
+    assert all_ids == {str(waiting.id), str(in_progress.id), str(completed.id)}
+
+    in_progress_tables, _ = await table_repo.list_tables(status=GameStatus.IN_PROGRESS)
+    assert [t["id"] for t in in_progress_tables] == [str(in_progress.id)]
+
+
+@pytest.mark.asyncio
+async def test_list_tables_cursor_pagination(db):
+    table_repo = TableRepository(db)
+    for _ in range(5):
+        await create_table_with_players(db, player_count=0)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = await table_repo.list_tables(cursor=cursor, limit=2)
+        assert len(page) <= 2
+        seen.extend(t["id"] for t in page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+@pytest.mark.asyncio
+async def test_list_tables_rejects_malformed_cursor(db):
+    with pytest.raises(ValueError):
+        await TableRepository(db).list_tables(cursor="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_update_table_writes_nothing_when_unchanged(db, statement_counter):
+    created = await create_table_with_players(db, player_count=3, spectator_count=5)
+    table_repo = TableRepository(db)
+    table = await table_repo.get_table(created.id)
+
+    statement_counter.clear()
+    await table_repo.update_table(table)
+
+    assert statement_counter == []
+
+
+@pytest.mark.asyncio
+async def test_update_table_batches_dirty_players_only(db, statement_counter):
+    created = await create_table_with_players(db, player_count=4, spectator_count=30)
+    table_repo = TableRepository(db)
+    table = await table_repo.get_table(created.id)
+
+    table.players[1].add_cards([Card(color=CardColor.RED, type=CardType.NUMBER, value=3)])
+    table.players[2].uno_declaration = UnoDeclarationState.PENDING
+    table.players[3].is_online = False  # written by the presence tracker, not here
+
+    statement_counter.clear()
+    await table_repo.update_table(table)
+
+    assert len(statement_counter) == 1
+    assert statement_counter[0].startswith("UPDATE players")
+    assert "is_online" not in statement_counter[0]
+    assert table.dirty_players() == []
+
+    reloaded = await table_repo.get_table(created.id)
+    assert len(reloaded.players[1].hand) == 1
+    assert reloaded.players[2].uno_declaration == UnoDeclarationState.PENDING
+    assert reloaded.players[3].is_online is True
+
+
+async def add_users(db, count):
+    users = []
+    for _ in range(count):
+        name = f"user-{uuid.uuid4()}"
+        users.append(UserModel(id=uuid.uuid4(), username=name, email=f"{name}@test.uno", created_at=int(time.time())))
+    db.add_all(users)
+    await db.commit()
+    return users
+
+
+@pytest.mark.asyncio
+async def test_players_are_seated_in_join_order(db):
+    table = await TableRepository(db).create_table(f"table-{uuid.uuid4()}", max_players=10)
+    users = await add_users(db, 6)
+    # Ids that sort the other way round from joining
+    ids = sorted((uuid.uuid4() for _ in users), reverse=True)
+    for player_id, user in zip(ids, users):
+        await PlayerRepository(db).create_player(Player(id=player_id, username=user.username), table.id, user.id)
+
+    loaded = await TableRepository(db).get_table(table.id)
+
+    assert [p.id for p in loaded.players] == ids
+
+
+@pytest.mark.asyncio
+async def test_migration_seats_existing_players_in_their_old_order(db_engine, db):
+    table = await TableRepository(db).create_table(f"table-{uuid.uuid4()}", max_players=10)
+    users = await add_users(db, 5)
+    newcomer = users.pop()
+    ids = [uuid.uuid4() for _ in users]
+    async with db_engine.begin() as conn:
+        # Players from before joined_at existed
+        await conn.execute(insert(PlayerModel.__table__), [
+            {"id": player_id, "user_id": user.id, "table_id": table.id, "joined_at": None}
+            for player_id, user in zip(ids, users)
+        ])
+        await run_migrations(conn)
+        await run_migrations(conn)
+    # Joining after the migration takes the next seat, whatever its id
+    newcomer_id = uuid.UUID("00000000-0000-4000-a000-000000000000")
+    await PlayerRepository(db).create_player(Player(id=newcomer_id, username=newcomer.username), table.id, newcomer.id)
+
+    loaded = await TableRepository(db).get_table(table.id)
+
+    assert [p.id for p in loaded.players] == sorted(ids) + [newcomer_id]
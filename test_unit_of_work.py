@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.database.models import GameEventModel
+from app.database.unit_of_work import UnitOfWork
+from app.game_logic.game_actions import GameActionHandler
+from app.repositories.table_repository import TableRepository
+from app.schemas import GameStatus
+from app.websocket.connection_manager import manager
+from test_game_events import start_game
+
+
+@pytest.mark.asyncio
+async def test_action_commits_once_and_broadcasts_afterwards(db, commits, sent):
+    table, game_state = await start_game(db)
+    player = game_state.get_current_player(table)
+
+    commits.clear()
+    result = await GameActionHandler.handle_draw_card(str(table.id), player, db)
+
+    assert result["success"]
+    assert len(commits) == 1
+    assert sent and all(commit_count == 1 for _, commit_count in sent)
+
+
+@pytest.mark.asyncio
+async def test_failed_action_rolls_back_and_sends_nothing(db, commits, sent):
+    table, game_state = await start_game(db)
+
+    commits.clear()
+    with pytest.raises(RuntimeError):
+        async with UnitOfWork(db) as uow:
+            loaded, _ = await TableRepository(db).get_table_with_game_state(table.id)
+            loaded.status = GameStatus.COMPLETED
+            await TableRepository(db).update_table(loaded)
+            uow.after_commit(manager.broadcast_to_table, {"type": "game_state"}, str(table.id))
+            raise RuntimeError("boom")
+
+    reloaded, _ = await TableRepository(db).get_table_with_game_state(table.id)
+    assert reloaded.status == table.status
+    assert commits == []
+    assert sent == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("deferred", [False, True])
+async def test_failed_commit_rolls_back_and_leaves_the_session_usable(db, sent, deferred):
+    table, game_state = await start_game(db)
+
+    with pytest.raises(IntegrityError):
+        async with UnitOfWork(db, deferred=deferred) as uow:
+            # Taken sequence number, only noticed when the commit flushes it
+            db.add(GameEventModel(
+                table_id=table.id, seq=game_state.event_seq, type="draw_card", payload={}, created_at=0
+            ))
+            uow.after_commit(manager.broadcast_to_table, {"type": "game_state"}, str(table.id))
+
+    assert sent == []
+    async with UnitOfWork(db) as uow:
+        reloaded = await TableRepository(db).get_table(table.id)
+    assert reloaded.id == table.id
+
+@pytest.mark.asyncio
+async def test_nested_unit_joins_the_outer_one(db, commits, sent):
+    async with UnitOfWork(db) as outer:
+        async with UnitOfWork(db) as inner:
+            inner.after_commit(manager.broadcast_to_table, {"type": "inner"}, "t")
+        assert sent == []
+        outer.after_commit(manager.broadcast_to_table, {"type": "outer"}, "t")
+
+    assert [message_type for message_type, _ in sent] == ["inner", "outer"]
+
+
+@pytest.mark.asyncio
+async def test_action_messages_go_out_as_one_batch(db, sent, monkeypatch):
+    table, game_state = await start_game(db)
+    player = game_state.get_current_player(table)
+    batches = []
+
+    async def record_batch(table_id, entries):
+        batches.append([(target, message["type"]) for target, message in entries])
+
+    monkeypatch.setattr(manager, "send_batch", record_batch)
+    await GameActionHandler.handle_draw_card(str(table.id), player, db)
+
+    assert batches == [[
+        (None, "card_drawn"),
+        (str(player.id), "card_drawn"),
+        (None, "turn_changed"),
+        (None, "game_state"),
+    ]]
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.database.models import Base
+from app.repositories.session_repository import SessionRepository
+from test_game_events import start_game
+
+
+@pytest.fixture
+def app_db(tmp_path, monkeypatch):
+    """The app's sessions on a fresh sqlite file, with a started game and a player's session token"""
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("httpx")
+    import app.main
+
+    # NullPool: the test client runs the app on its own event loop
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'uno.db'}", poolclass=NullPool)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            table, _ = await start_game(db)
+            return table, await SessionRepository(db).create_session(table.players[0], str(table.id))
+
+    table, token = asyncio.run(setup())
+    monkeypatch.setattr(app.main, "AsyncSessionLocal", session_factory)
+    yield engine, table, token
+    asyncio.run(engine.dispose())
+
+
+def test_idle_socket_holds_no_database_connection(app_db):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    engine, table, token = app_db
+    checked_out = []
+    event.listen(engine.sync_engine, "checkout", lambda *args: checked_out.append(1))
+    event.listen(engine.sync_engine, "checkin", lambda *args: checked_out.pop())
+
+    with TestClient(app).websocket_connect(f"/ws/table/{table.id}?session_token={token}") as websocket:
+        assert websocket.receive_json()["type"] == "role_assigned"
+        websocket.send_json({"type": "ping"})
+        while websocket.receive_json()["type"] != "pong":
+            pass
+
+        assert checked_out == []